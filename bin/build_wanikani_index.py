@@ -4,7 +4,12 @@ import os
 
 from wanikani_api.client import Client
 
-from kanji_deck_creator.data.appdata import character_images_dir, character_data_dir
+from kanji_deck_creator.data.appdata import character_images_dir, character_data_dir, media_manifest_path, \
+    subject_store_path, janome_user_dictionary_path
+from kanji_deck_creator.data.dependency_index import build_dependency_index
+from kanji_deck_creator.data.media_manifest import build_media_manifest
+from kanji_deck_creator.data.subject_store import write_subject_store
+from kanji_deck_creator.parser.user_dictionary import compile_user_dictionary
 
 
 def _download_image(url: str, output_folder: str, name: str):
@@ -63,9 +68,23 @@ if __name__ == '__main__':
             downloaded_image_name = _download_image(image_url, images_folder, str(subject['id']))
             subject['data']['character_images'] = [downloaded_image_name]
 
+    print("Precomputing subject dependencies...")
+    indexed_json["dependency_index"] = build_dependency_index(indexed_json["subjects"])
+
+    print("Hashing images...")
+    media_manifest = build_media_manifest(indexed_json["subjects"], images_folder)
+
     print("Saving to app resources...")
     with open(subjects_indexed_file_path, "wt", encoding='utf-8') as fp:
         json.dump(indexed_json, fp, indent=2)
+    with open(media_manifest_path(), "wt", encoding='utf-8') as fp:
+        json.dump(media_manifest, fp, indent=2)
+    # Written after the index, so it is never older than the index it was made from.
+    write_subject_store(indexed_json, subject_store_path())
+
+    print("Compiling the Janome user dictionary...")
+    num_entries = compile_user_dictionary(indexed_json, janome_user_dictionary_path())
+    print("Added {} WaniKani words Janome does not know".format(num_entries))
 
     print("Done!")
 
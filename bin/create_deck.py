@@ -1,40 +1,310 @@
 import os
 import argparse
+import itertools
+import json
 
-from kanji_deck_creator.deckbuilder.deck_builder import AnkiPackageBuilder
+from kanji_deck_creator.deckbuilder.apkg_writer import ApkgWriter
+from kanji_deck_creator.deckbuilder.deck_builder import AnkiPackageBuilder, KANJI_DECK_CREATOR_MODEL, write_packages
+from kanji_deck_creator.deckbuilder.known_items import KnownItems
+from kanji_deck_creator.deckbuilder.text_export import TextDeckWriter
+from kanji_deck_creator.deckbuilder.watch import DeckWatcher
+from kanji_deck_creator.data.appdata import up_to_date_janome_user_dictionary_path
+from kanji_deck_creator.data.frequency_store import FrequencyStore, SourceDocument, file_document_id
+from kanji_deck_creator.data.lookup_budget import LookupBudget
 from kanji_deck_creator.data.kanji_data import KANJI_DATA
+from kanji_deck_creator.kanjigraph.graph_export import GRAPH_FORMATS, GraphSelection, export_graph
 from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
-from kanji_deck_creator.parser.tokenizer import JanomeTokenizer
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+from kanji_deck_creator.kanjigraph.sqlite_kanji_graph import SqliteKanjiGraph
+from kanji_deck_creator.parser.document_reader import iter_source_chapters, iter_source_chunks
+from kanji_deck_creator.parser.tokenization_cache import CachingTokenizer
+from kanji_deck_creator.parser.tokenizer import JanomeTokenizer, WaniKaniTokenizer
+
+
+def deck_source_chunks(args):
+    """
+    :return: the chunks of all source files. With --frequency-db, every file is a SourceDocument of its own, so it
+        is counted once in the store whatever other files it is built together with.
+    """
+    if not args.frequency_db:
+        return itertools.chain.from_iterable(iter_source_chunks(source_file) for source_file in args.source_file)
+    return [SourceDocument(file_document_id(source_file), iter_source_chunks(source_file))
+            for source_file in args.source_file]
+
+
+def deck_source_chapters(args):
+    """
+    Same as deck_source_chunks, for the chapters of the source files. The chapters of a file share its document.
+    """
+    for source_file in args.source_file:
+        document_id = file_document_id(source_file) if args.frequency_db else None
+        for chapter_name, chunks in iter_source_chapters(source_file):
+            yield chapter_name, chunks if document_id is None else SourceDocument(document_id, chunks)
+
+
+def lookup_budget(args):
+    """
+    :return: a LookupBudget for a build that starts now, None without --time-budget
+    """
+    if args.time_budget is None:
+        return None
+    return LookupBudget(args.time_budget, lookup_timeout=args.lookup_timeout,
+                        placeholders=not args.skip_degraded)
+
+
+def report_degraded(args, budget):
+    if budget is None:
+        return
+    degraded = budget.degraded
+    if degraded:
+        print('{} words could not be looked up within --time-budget and {}: {}'.format(
+            len(degraded), 'were left out' if args.skip_degraded else 'have placeholder notes',
+            ', '.join(characters for characters, _ in degraded)))
+    if args.degraded_file:
+        with open(args.degraded_file, 'wt', encoding='utf-8') as fp:
+            json.dump(budget.to_dict(), fp, indent=2, ensure_ascii=False)
+
+
+def write_deck(package_builder, args, output_path, source_text=None):
+    """
+    :param source_text: the text to make the deck from, or None to make it out of what is already in the graph
+    """
+    budget = lookup_budget(args) if source_text is not None else None
+    if args.output_format == 'apkg' and args.apkg_writer != 'native':
+        if source_text is None:
+            package = package_builder.build_from_graph(args.deck_name, mode=args.deck_order, workers=args.workers)
+        else:
+            package = package_builder.build(source_text, args.deck_name, mode=args.deck_order,
+                                            min_count=args.min_count, top_k=args.top_k, workers=args.workers,
+                                            example_sentences=args.example_sentences, budget=budget)
+        package.write_to_file(output_path)
+        report_degraded(args, budget)
+        return
+
+    if args.output_format == 'apkg':
+        deck_id = AnkiPackageBuilder.deck_id(args.deck_name)
+        writer = ApkgWriter(output_path, deck_id, args.deck_name, KANJI_DECK_CREATOR_MODEL)
+    else:
+        writer = TextDeckWriter(output_path, delimiter='\t' if args.output_format == 'tsv' else ',')
+
+    with writer:
+        if source_text is None:
+            package_builder.export_from_graph(writer, mode=args.deck_order, workers=args.workers)
+        else:
+            package_builder.export(source_text, writer, mode=args.deck_order,
+                                   min_count=args.min_count, top_k=args.top_k, workers=args.workers,
+                                   example_sentences=args.example_sentences, budget=budget)
+    report_degraded(args, budget)
+
+
+def write_deck_shards(package_builder, args, output_path):
+    """
+    Writes the deck as one .apkg per shard, next to output_path and numbered in order.
+    """
+    budget = lookup_budget(args)
+    packages = package_builder.build_shards(deck_source_chapters(args), args.deck_name, mode=args.deck_order,
+                                            max_notes=args.shard_size, by_chapter=args.shard_by_chapter,
+                                            min_count=args.min_count, top_k=args.top_k, workers=args.workers,
+                                            example_sentences=args.example_sentences, budget=budget)
+    output_base = output_path[:-len('.apkg')]
+    output_paths = ['{}.{:02d}.apkg'.format(output_base, index + 1) for index in range(len(packages))]
+    write_packages(packages, output_paths, max_workers=args.workers)
+    report_degraded(args, budget)
+    return output_paths
 
 
 if __name__ == '__main__':
     argparser = argparse.ArgumentParser()
 
-    argparser.add_argument('--source-file', action='store', required=True,
-                           help='The source (utf-8 encoded) file to extract vocab from.')
+    argparser.add_argument('--source-file', action='append', required=True,
+                           help='The source file to extract vocab from: an .epub, an .html file or utf-8 encoded '
+                                'text. Ruby readings (furigana) in epub/html are left out. Can be passed more than '
+                                'once to make one deck out of several files.')
     argparser.add_argument('--deck-name', action='store', required=True,
                            help='The name of the Anki deck that will be created.')
     argparser.add_argument('--output-folder', action='store', required=False,
                            help='The folder to create the deck in')
     argparser.add_argument('--deck-order', action='store', required=False,
-                           choices=('riffled', 'layered'), default='riffled',
+                           choices=('riffled', 'layered', 'budgeted'), default='riffled',
                            help='What order the deck should be in. Defaults to riffled, which will show you vocab '
                                 'words as soon as you know the words. You can pass in "layered" to have a system '
-                                'similar to WaniKani, which is all radicals first, then all kanji, then all vocab.')
+                                'similar to WaniKani, which is all radicals first, then all kanji, then all vocab. '
+                                '"budgeted" plans for --new-cards-per-day new notes a day: the most frequent vocab '
+                                'comes first, and radicals and kanji never take up more than half of a day while '
+                                'there is vocab to learn.')
+    argparser.add_argument('--new-cards-per-day', action='store', required=False, type=int, default=20,
+                           help='How many new notes a day the budgeted deck order plans for. Defaults to 20, '
+                                'Anki\'s default.')
+    argparser.add_argument('--tokenizer', action='store', required=False,
+                           choices=('janome', 'wanikani'), default='janome',
+                           help='How words are found in the source file. Defaults to janome, which does a full '
+                                'morphological analysis. "wanikani" only looks for WaniKani vocab and kanji, which '
+                                'is much faster on large files but will not find words WaniKani does not have.')
+    argparser.add_argument('--tokenization-cache', action='store', required=False,
+                           help='Cache the words of every paragraph in an SQLite database at this path, so building '
+                                'the deck again after editing the source file only tokenizes the changed paragraphs.')
+    argparser.add_argument('--watch', action='store_true', required=False,
+                           help='Keep running and write the deck again every time a source file changes. Only the '
+                                'changed paragraphs are processed again. Stop with Ctrl+C.')
+    argparser.add_argument('--min-count', action='store', required=False, type=int, default=1,
+                           help='Only include vocab that occurs at least this many times in the source file.')
+    argparser.add_argument('--top-k', action='store', required=False, type=int, default=None,
+                           help='Only include the K most frequent vocab words (and the kanji/radicals they need).')
+    argparser.add_argument('--example-sentences', action='store', required=False, type=int, default=0,
+                           help='Show up to this many sentences of the source file on the back of every vocab note. '
+                                'Not available with --watch.')
+    argparser.add_argument('--frequency-db', action='store', required=False,
+                           help='Keep word counts across every source file decks are made from in an SQLite '
+                                'database at this path. --top-k and the budgeted deck order then go by how frequent '
+                                'words are in all of them. The counts of a source file are only added once.')
+    argparser.add_argument('--time-budget', action='store', required=False, type=float, default=None,
+                           help='Seconds the Jisho lookups of the build may take. Words that could not be looked up '
+                                'in time get a placeholder note that is filled in when the deck is built again.')
+    argparser.add_argument('--lookup-timeout', action='store', required=False, type=float, default=5.0,
+                           help='With --time-budget, the seconds a single Jisho lookup may take. Defaults to 5.')
+    argparser.add_argument('--skip-degraded', action='store_true', required=False,
+                           help='With --time-budget, leave words that could not be looked up in time out of the '
+                                'deck instead of making placeholder notes for them.')
+    argparser.add_argument('--degraded-file', action='store', required=False,
+                           help='With --time-budget, write the words that could not be looked up in time to this '
+                                '.json file, for looking them up later.')
+    argparser.add_argument('--known-items', action='append', required=False, default=[],
+                           help='Radicals/kanji/vocab to leave out of the deck because you already know them. Can be '
+                                'a previously generated .apkg, a .json file written by --save-known-items or a '
+                                'plain text file with one item per line. Can be passed more than once.')
+    argparser.add_argument('--save-known-items', action='store', required=False,
+                           help='Store everything that is known after this deck (the --known-items plus the new '
+                                'deck) to this .json file, to pass into --known-items next time.')
+    argparser.add_argument('--graph-db', action='store', required=False,
+                           help='Keep the kanji graph in an SQLite database at this path instead of in memory. Use '
+                                'this for very large inputs that would not fit in memory. The database is cleared '
+                                'at the start of the build.')
+    argparser.add_argument('--workers', action='store', required=False, type=int, default=None,
+                           help='Render notes in this many worker processes. Helps for very large decks.')
+    argparser.add_argument('--shard-size', action='store', required=False, type=int, default=None,
+                           help='Split the deck up into sub-decks of at most this many notes, written to one .apkg '
+                                'each. Notes never end up in an earlier sub-deck than the kanji and radicals they '
+                                'need.')
+    argparser.add_argument('--shard-by-chapter', action='store_true', required=False,
+                           help='Split the deck up into one sub-deck per chapter of an epub (or per source file), '
+                                'written to one .apkg each. Can be combined with --shard-size.')
+    argparser.add_argument('--analyze', action='store_true', required=False,
+                           help='Only print how many radicals, kanji and vocab the deck would have, how many words '
+                                'would be looked up on Jisho and how complex the notes are, without building the '
+                                'deck. Much faster than a build, nothing is looked up on Jisho.')
+    argparser.add_argument('--stats-file', action='store', required=False,
+                           help='With --analyze, also write the statistics to this .json file.')
+    argparser.add_argument('--export-graph', action='store', required=False,
+                           help='Write the kanji graph of the source file to this .jsonl, .dot or .graphml file '
+                                'instead of building a deck. Nodes are written as they are read from the graph.')
+    argparser.add_argument('--export-graph-types', action='store', required=False, nargs='+',
+                           choices=[kanji_type.value for kanji_type in KanjiType],
+                           help='Only export the nodes of these types.')
+    argparser.add_argument('--export-graph-around', action='append', required=False,
+                           help='Only export the vocab with these characters and the nodes around it. Can be '
+                                'passed more than once.')
+    argparser.add_argument('--export-graph-radius', action='store', required=False, type=int, default=1,
+                           help='With --export-graph-around, how many edges away from the vocab nodes can be. '
+                                'Defaults to 1.')
+    argparser.add_argument('--output-format', action='store', required=False,
+                           choices=('apkg', 'tsv', 'csv'), default='apkg',
+                           help='Defaults to apkg, an Anki package. tsv and csv write a text file for Anki\'s (or '
+                                'another SRS tool\'s) text import plus a folder with the images, and use much less '
+                                'memory for very large decks.')
+    argparser.add_argument('--apkg-writer', action='store', required=False,
+                           choices=('genanki', 'native'), default='genanki',
+                           help='How apkg files are written. "native" writes the Anki collection directly, which is '
+                                'faster and uses less memory for very large decks.')
 
     args = argparser.parse_args()
+    if args.watch and args.graph_db:
+        argparser.error('--watch keeps the kanji graph in memory and cannot be combined with --graph-db')
+    if args.watch and args.example_sentences > 0:
+        argparser.error('--watch does not collect example sentences and cannot be combined with --example-sentences')
+    if args.analyze and (args.watch or args.save_known_items):
+        argparser.error('--analyze does not build a deck and cannot be combined with --watch or --save-known-items')
+    if args.export_graph and (args.analyze or args.watch or args.save_known_items):
+        argparser.error('--export-graph does not build a deck and cannot be combined with --analyze, --watch or '
+                        '--save-known-items')
+    if args.export_graph and os.path.splitext(args.export_graph)[1].lstrip('.').lower() not in GRAPH_FORMATS:
+        argparser.error('--export-graph must end in one of .{}'.format(', .'.join(GRAPH_FORMATS)))
+    sharded = args.shard_size is not None or args.shard_by_chapter
+    if sharded and (args.watch or args.output_format != 'apkg' or args.apkg_writer != 'genanki'):
+        argparser.error('--shard-size and --shard-by-chapter only work with the genanki apkg writer and without '
+                        '--watch')
 
     output_folder = args.output_folder or '.'
     output_path = os.path.join(output_folder, args.deck_name)
-    if not output_path.endswith('.apkg'):
-        output_path += '.apkg'
+    if not output_path.endswith('.' + args.output_format):
+        output_path += '.' + args.output_format
+
+    known_items = None
+    if args.known_items:
+        known_items = KnownItems()
+        for known_items_path in args.known_items:
+            known_items.update(KnownItems.load(known_items_path))
+
+    if args.tokenizer == 'wanikani':
+        tokenizer = WaniKaniTokenizer(KANJI_DATA)
+    else:
+        tokenizer = JanomeTokenizer(user_dictionary_path=up_to_date_janome_user_dictionary_path())
+    if args.tokenization_cache:
+        tokenizer = CachingTokenizer(tokenizer, args.tokenization_cache)
+    graph_factory = None
+    if args.graph_db:
+        def graph_factory():
+            # Every build starts from an empty graph, so building again does not add to the counts of the last one.
+            return SqliteKanjiGraph(KANJI_DATA, database_path=args.graph_db, known_items=known_items, clear=True)
+    frequency_store = FrequencyStore(args.frequency_db) if args.frequency_db else None
+    kanji_graph = KanjiGraph(KANJI_DATA, known_items=known_items)
+    package_builder = AnkiPackageBuilder(tokenizer=tokenizer, kanji_graph=kanji_graph, graph_factory=graph_factory,
+                                         new_cards_per_day=args.new_cards_per_day, frequency_store=frequency_store)
 
-    with open(args.source_file, 'rt', encoding='utf-8') as fp:
-        input_text = fp.read()
+    output_paths = [output_path]
+    if args.analyze:
+        source_chunks = itertools.chain.from_iterable(iter_source_chunks(source_file)
+                                                      for source_file in args.source_file)
+        deck_stats = package_builder.analyze(source_chunks, min_count=args.min_count, top_k=args.top_k)
+        print(deck_stats.format())
+        if args.stats_file:
+            with open(args.stats_file, 'wt', encoding='utf-8') as fp:
+                json.dump(deck_stats.to_dict(), fp, indent=2, ensure_ascii=False)
+    elif args.export_graph:
+        source_chunks = itertools.chain.from_iterable(iter_source_chunks(source_file)
+                                                      for source_file in args.source_file)
+        export_kanji_graph = package_builder.build_graph(source_chunks, min_count=args.min_count, top_k=args.top_k)
+        around = None
+        if args.export_graph_around:
+            around = [(characters, KanjiType.VOCABULARY) for characters in args.export_graph_around]
+        kanji_types = None
+        if args.export_graph_types:
+            kanji_types = [KanjiType.from_string(kanji_type) for kanji_type in args.export_graph_types]
+        export_graph(GraphSelection(export_kanji_graph, kanji_types=kanji_types, around=around,
+                                    radius=args.export_graph_radius), args.export_graph)
+        if hasattr(export_kanji_graph, 'close'):
+            export_kanji_graph.close()
+    elif args.watch:
+        watcher = DeckWatcher(package_builder, args.source_file,
+                              lambda: write_deck(package_builder, args, output_path),
+                              min_count=args.min_count, top_k=args.top_k)
+        try:
+            watcher.watch()
+        except KeyboardInterrupt:
+            pass
+    elif sharded:
+        output_paths = write_deck_shards(package_builder, args, output_path)
+    else:
+        write_deck(package_builder, args, output_path, source_text=deck_source_chunks(args))
 
-    tokenizer = JanomeTokenizer()
-    kanji_graph = KanjiGraph(KANJI_DATA)
-    package_builder = AnkiPackageBuilder(tokenizer=tokenizer, kanji_graph=kanji_graph)
+    if args.tokenization_cache:
+        tokenizer.close()
+    if frequency_store is not None:
+        frequency_store.close()
 
-    package = package_builder.build(input_text, args.deck_name, mode=args.deck_order)
-    package.write_to_file(output_path)
+    if args.save_known_items:
+        all_known_items = KnownItems()
+        for deck_path in output_paths:
+            all_known_items.update(KnownItems.load(deck_path))
+        if known_items is not None:
+            all_known_items.update(known_items)
+        all_known_items.save(args.save_known_items)
@@ -0,0 +1,47 @@
+import argparse
+
+from kanji_deck_creator.data.kanji_data import KANJI_DATA
+from kanji_deck_creator.loadtest.harness import format_report, run_load_test
+from kanji_deck_creator.loadtest.jisho_stub import JishoStubConfig
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(
+        description='Builds decks out of generated corpora with Jisho lookups going to a local stand-in server, and '
+                    'reports build throughput and lookup latency. Nothing goes to the network.')
+
+    argparser.add_argument('--words', action='store', type=int, default=1000,
+                           help='How many words every generated corpus has.')
+    argparser.add_argument('--miss-rates', action='store', type=float, nargs='+', default=[0.0, 0.1, 0.5],
+                           help='Fractions of the words that are not in WaniKani and have to be looked up on Jisho. '
+                                'One corpus is built per miss rate.')
+    argparser.add_argument('--workers', action='store', type=int, nargs='+', default=[1],
+                           help='Numbers of worker processes to render notes with. Every miss rate is run with '
+                                'every number of workers.')
+    argparser.add_argument('--latency-ms', action='store', type=float, default=50,
+                           help='Average delay of a Jisho response.')
+    argparser.add_argument('--jitter-ms', action='store', type=float, default=20,
+                           help='The delay is spread uniformly by this much around the average.')
+    argparser.add_argument('--error-rate', action='store', type=float, default=0.0,
+                           help='Fraction of Jisho requests that fail with a server error.')
+    argparser.add_argument('--not-found-rate', action='store', type=float, default=0.0,
+                           help='Fraction of Jisho requests that find nothing.')
+    argparser.add_argument('--rate-limit', action='store', type=float, default=None,
+                           help='Requests per second the stand-in server allows before answering with 429.')
+    argparser.add_argument('--seed', action='store', type=int, default=0,
+                           help='Seed for the corpora and the server, so runs can be compared.')
+
+    args = argparser.parse_args()
+
+    config = JishoStubConfig(latency=args.latency_ms / 1000, latency_jitter=args.jitter_ms / 1000,
+                             error_rate=args.error_rate, not_found_rate=args.not_found_rate,
+                             requests_per_second=args.rate_limit, seed=args.seed)
+
+    results = []
+    for miss_rate in args.miss_rates:
+        for workers in args.workers:
+            results.append(run_load_test(KANJI_DATA, config, num_words=args.words, miss_rate=miss_rate,
+                                         workers=workers, seed=args.seed))
+
+    print(format_report(results, title='{} words, {}ms +/- {}ms Jisho latency'.format(
+        args.words, args.latency_ms, args.jitter_ms)))
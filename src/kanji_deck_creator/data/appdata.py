@@ -1,13 +1,39 @@
 import json
 import pkg_resources
 
+from os import path
+
+
+def wanikani_subjects_indexed_path():
+    return pkg_resources.resource_filename(__name__, 'wanikani/wanikani_subjects_indexed.json')
+
 
 def wanikani_subjects_indexed():
-    file_path = pkg_resources.resource_filename(__name__, 'wanikani/wanikani_subjects_indexed.json')
-    with open(file_path, 'rt', encoding='utf-8') as fp:
+    with open(wanikani_subjects_indexed_path(), 'rt', encoding='utf-8') as fp:
         return json.load(fp)
 
 
+def subject_store_path():
+    return pkg_resources.resource_filename(__name__, 'wanikani/wanikani_subjects.store')
+
+
+def up_to_date_subject_store_path():
+    """
+    :return: the path of the subject store written by build_wanikani_index.py, or None if there is none or the
+        index was changed after it was written.
+    """
+    return _written_after_index(subject_store_path())
+
+
+def _written_after_index(file_path):
+    if not path.exists(file_path):
+        return None
+    index_path = wanikani_subjects_indexed_path()
+    if path.isfile(index_path) and path.getmtime(index_path) > path.getmtime(file_path):
+        return None
+    return file_path
+
+
 def character_images_dir():
     if pkg_resources.resource_isdir(__name__, 'images'):
         return pkg_resources.resource_filename(__name__, 'images')
@@ -20,3 +46,38 @@ def character_data_dir():
         return pkg_resources.resource_filename(__name__, 'wanikani')
     else:
         raise EnvironmentError('Package is not set up properly. Missing character data folder "wanikani"')
+
+
+def wanikani_automaton_cache_path():
+    return path.join(character_data_dir(), 'wanikani_automaton.pickle')
+
+
+def media_manifest_path():
+    return path.join(character_data_dir(), 'wanikani_media_manifest.json')
+
+
+def wanikani_media_manifest():
+    """
+    :return: the media manifest written by build_wanikani_index.py, or None if the index was built without one
+    """
+    file_path = media_manifest_path()
+    if not path.isfile(file_path):
+        return None
+    with open(file_path, 'rt', encoding='utf-8') as fp:
+        return json.load(fp)
+
+
+def janome_user_dictionary_path():
+    return path.join(character_data_dir(), 'janome_user_dictionary')
+
+
+def up_to_date_janome_user_dictionary_path():
+    """
+    :return: the folder of the Janome user dictionary written by build_wanikani_index.py, or None if there is none
+        or the index was changed after it was written.
+    """
+    dictionary_path = janome_user_dictionary_path()
+    # Compiling writes the files in the folder, which does not always change the modification time of the folder.
+    if _written_after_index(path.join(dictionary_path, 'user_entries.data')) is None:
+        return None
+    return dictionary_path
@@ -0,0 +1,56 @@
+from typing import Dict
+
+
+def build_dependency_index(subjects: Dict) -> Dict:
+    """
+    Precomputes the complexity of every WaniKani subject. The component relations are fixed between index rebuilds,
+    so this only needs to happen in build_wanikani_index.py.
+
+    :param subjects: the "subjects" section of the WaniKani index, keyed by subject id
+    :return: json serializable index, see DependencyIndex
+    """
+    # The index is keyed by str after a json round trip but by int while it is being built.
+    subjects = {str(subject_id): subject for subject_id, subject in subjects.items()}
+    components = {
+        int(subject_id): sorted(set(int(i) for i in subject['data'].get('component_subject_ids', [])
+                                    if str(i) in subjects) - {int(subject_id)})
+        for subject_id, subject in subjects.items()
+    }
+
+    complexity = {}
+
+    def visit(subject_id):
+        # The component graph is only a few levels deep (vocabulary -> kanji -> radical) so recursion is fine.
+        if subject_id in complexity:
+            return
+        total = 0
+        for component_id in components[subject_id]:
+            visit(component_id)
+            total += complexity[component_id] + 1
+        complexity[subject_id] = total
+
+    for subject_id in components:
+        visit(subject_id)
+
+    return {
+        'complexity': {str(subject_id): total for subject_id, total in complexity.items()},
+    }
+
+
+class DependencyIndex(object):
+    """
+    Complexity of every WaniKani subject: the same number KanjiGraph computes for total_num_dependencies when all
+    of a subject's dependencies are in the graph (dependencies reachable through more than one path are counted
+    once per path).
+    """
+    _complexity: Dict[str, int]
+
+    def __init__(self, index: Dict):
+        self._complexity = index['complexity']
+
+    @classmethod
+    def from_subjects(cls, subjects: Dict):
+        return cls(build_dependency_index(subjects))
+
+    def complexity(self, subject_id) -> int:
+        return self._complexity[str(subject_id)]
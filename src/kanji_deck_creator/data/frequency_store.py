@@ -0,0 +1,133 @@
+import hashlib
+import sqlite3
+import threading
+
+from typing import Any, Dict, Iterable, List, Mapping, Tuple
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS words (
+    word TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS words_by_count ON words (count DESC, word);
+
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    num_tokens INTEGER NOT NULL
+) WITHOUT ROWID;
+'''
+
+
+def file_document_id(file_path) -> str:
+    """
+    :return: an id for a source file that stays the same when the file is renamed and changes when it is edited
+    """
+    sha = hashlib.sha1()
+    with open(file_path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class SourceDocument(object):
+    """
+    Text that is counted as one document of a FrequencyStore when a deck is made from it. Builders take these in
+    place of a chunk of their source text, see AnkiPackageBuilder.build.
+    """
+    def __init__(self, document_id: str, text: Any):
+        """
+        :param document_id: the id of the document in the store, like file_document_id of its source file. Texts
+            with the same id are counted as one document.
+        :param text: the text, or an iterable of chunks of it
+        """
+        self.document_id = document_id
+        self.text = text
+
+
+class FrequencyStore(object):
+    """
+    How often every word occurs across all the documents that were added, kept in an SQLite database so it grows
+    from book to book. Adding a document only touches the words of that document, and every document is only
+    counted once however many times it is added.
+
+    Used as the frequency source of KanjiGraph.sort_by_frequency and AnkiPackageBuilder, so
+    frequency decisions are based on the whole corpus instead of the one text a deck is made from.
+    """
+    def __init__(self, database_path: str):
+        # Concurrent builds can share the store, the lock serializes the use of the connection.
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+
+    def add_document(self, document_id: str, counts: Mapping[str, int]) -> bool:
+        """
+        Adds the word counts of a document, unless a document with the same id was added before.
+
+        :return: whether the counts were added
+        """
+        with self._lock, self._connection:
+            inserted = self._connection.execute(
+                'INSERT OR IGNORE INTO documents VALUES (?, ?)', (document_id, sum(counts.values()))).rowcount
+            if not inserted:
+                return False
+            # Not an upsert (INSERT ... ON CONFLICT), which needs SQLite 3.24 and Python 3.6 often comes with an older
+            # one. New words are inserted with a count of 0, so the update adds every count once.
+            self._connection.executemany('INSERT OR IGNORE INTO words VALUES (?, 0)', ((word,) for word in counts))
+            self._connection.executemany('UPDATE words SET count = count + ? WHERE word = ?',
+                                         ((count, word) for word, count in counts.items()))
+            return True
+
+    def has_document(self, document_id: str) -> bool:
+        with self._lock:
+            return self._connection.execute('SELECT 1 FROM documents WHERE document_id = ?',
+                                            (document_id,)).fetchone() is not None
+
+    def count(self, word: str) -> int:
+        """
+        :return: how often the word occurs in all the documents, 0 if it never does
+        """
+        return self.counts([word]).get(word, 0)
+
+    def counts(self, words: Iterable[str]) -> Dict[str, int]:
+        """
+        Looks up a batch of words.
+
+        :return: word -> count of the words that occur in any of the documents
+        """
+        found = {}
+        unique_words = list(set(words))
+        with self._lock:
+            # Stay well below SQLite's limit on the number of query parameters.
+            for i in range(0, len(unique_words), 500):
+                batch = unique_words[i:i + 500]
+                found.update(self._connection.execute(
+                    'SELECT word, count FROM words WHERE word IN ({})'.format(', '.join('?' * len(batch))), batch))
+        return found
+
+    def top_k(self, k: int) -> List[Tuple[str, int]]:
+        """
+        :return: the k most frequent (word, count), most frequent first. Read straight off the count index.
+        """
+        with self._lock:
+            return self._connection.execute('SELECT word, count FROM words ORDER BY count DESC, word LIMIT ?',
+                                            (k,)).fetchall()
+
+    @property
+    def num_documents(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM words').fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,11 +1,19 @@
+import copy
 import logging
+import threading
 
-from typing import Union, Dict
-from os import path
+from typing import Union, Dict, Iterable, List, Optional, Tuple
 
-from jisho import Client as JishoClient
+import requests
 
-from kanji_deck_creator.data.appdata import wanikani_subjects_indexed, character_images_dir
+from jisho import APIException, Client as JishoClient
+
+from kanji_deck_creator.data.appdata import wanikani_subjects_indexed, character_images_dir, wanikani_media_manifest, \
+    up_to_date_subject_store_path
+from kanji_deck_creator.data.dependency_index import DependencyIndex
+from kanji_deck_creator.data.lookup_budget import BudgetedJishoClient, LookupBudget
+from kanji_deck_creator.data.media_manifest import MediaManifest
+from kanji_deck_creator.data.subject_store import SubjectStore
 from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
 
 
@@ -17,10 +25,63 @@ class KanjiData(object):
     subjects: Dict[str, Dict]
     character_lookup: Dict[str, Dict[str, Union[int, str]]]
 
-    def __init__(self, data_by_characters):
+    def __init__(self, data_by_characters, jisho_client: Optional[JishoClient] = None):
+        """
+        :param jisho_client: used to look up words WaniKani does not have, defaults to the real Jisho api
+        """
         self.data = data_by_characters
+        self.jisho_client = jisho_client if jisho_client is not None else JishoClient()
+        # Whether words WaniKani does not have are looked up on Jisho, see without_jisho
+        self.use_jisho = True
+        # Bounds the Jisho lookups, see with_budget
+        self.budget = None
         self.character_lookup = self.data['character_lookup']
         self.subjects = self.data['subjects']
+        self._dependency_index = None
+        self._media_manifest = None
+
+    @property
+    def dependency_index(self) -> DependencyIndex:
+        """
+        The transitive dependencies of all subjects. Indexes built by build_wanikani_index.py have them precomputed,
+        older ones get them computed on first use.
+        """
+        if self._dependency_index is None:
+            if 'dependency_index' in self.data:
+                self._dependency_index = DependencyIndex(self.data['dependency_index'])
+            else:
+                self._dependency_index = DependencyIndex.from_subjects(self.subjects)
+        return self._dependency_index
+
+    @property
+    def media_manifest(self) -> MediaManifest:
+        """
+        Where the image of every subject is, loaded once on first use.
+        """
+        if self._media_manifest is None:
+            self._media_manifest = MediaManifest.load(self.subjects, wanikani_media_manifest(), character_images_dir())
+        return self._media_manifest
+
+    def without_jisho(self) -> 'KanjiData':
+        """
+        :return: the same subject data, but words WaniKani does not have are not found instead of being looked up
+            on Jisho. For when the network round trips cost more than the answer is worth, like deck statistics.
+        """
+        local_data = copy.copy(self)
+        local_data.use_jisho = False
+        return local_data
+
+    def with_budget(self, budget: LookupBudget) -> 'KanjiData':
+        """
+        :return: the same subject data, but Jisho lookups time out within the budget and none are made once it is
+            spent. Words that could not be looked up in time get a PlaceholderSubject (or None if the budget has no
+            placeholders) and are recorded in budget.degraded. Jisho responses that are already cached are still
+            used after the budget is spent.
+        """
+        budgeted_data = copy.copy(self)
+        budgeted_data.budget = budget
+        budgeted_data.jisho_client = BudgetedJishoClient(budget, base_url=getattr(self.jisho_client, '_base_url', None))
+        return budgeted_data
 
     def get_subject(self, characters: str, kanji_type: KanjiType):
         if characters is None:
@@ -33,14 +94,74 @@ class KanjiData(object):
             subject_id = self.character_lookup[kanji_type.value].get(characters)
 
         if subject_id is None:
+            if not self.use_jisho:
+                return None
             try:
                 return JishoSubject(query=characters, kanji_type=kanji_type,
-                                    jisho_client=JishoClient(), kanji_data=self)
+                                    jisho_client=self.jisho_client, kanji_data=self)
             except RuntimeError:
                 log.warning('Could not find data for [{}] using Jisho'.format(characters))
                 return None
+            except (APIException, requests.RequestException) as e:
+                # Rate limits and outages should not take the whole build down, the note is just left out.
+                log.warning('Jisho lookup for [{}] failed: {}'.format(characters, getattr(e, 'message', e)))
+                if self.budget is None:
+                    return None
+                # With a budget the word can be looked up again later, instead of being dropped for good.
+                self.budget.degrade(characters, kanji_type)
+                return PlaceholderSubject(characters, kanji_type) if self.budget.placeholders else None
         return WaniKaniSubject(subject_id, self)
 
+    def get_subjects(self, queries: Iterable[Tuple[str, KanjiType]]) -> List[Optional['Subject']]:
+        """
+        Looks up a batch of (characters, KanjiType). Each distinct query is only looked up once, so repeated
+        misses do not go to Jisho more than once.
+
+        :return: the subjects in the same order as the queries, None for the ones that could not be found
+        """
+        queries = list(queries)
+        subjects = {}
+        for query in queries:
+            if query not in subjects:
+                subjects[query] = self.get_subject(*query)
+        return [subjects[query] for query in queries]
+
+
+class SharedKanjiData(KanjiData):
+    """
+    KanjiData backed by a memory mapped subject store (see subject_store.write_subject_store) instead of the decoded
+    json index. Opening it takes milliseconds and decodes nothing, subjects are decoded when they are used, and all
+    processes that open the same store share its memory, so worker processes stay small.
+    """
+    def __init__(self, store_path, jisho_client: Optional[JishoClient] = None):
+        self.store = SubjectStore(store_path)
+        super().__init__({'character_lookup': self.store.character_lookup, 'subjects': self.store.subjects},
+                         jisho_client=jisho_client)
+
+    @property
+    def store_path(self):
+        return self.store.file_path
+
+    @property
+    def dependency_index(self) -> DependencyIndex:
+        if self._dependency_index is None:
+            extra = self.store.extra()
+            if 'dependency_index' in extra:
+                self._dependency_index = DependencyIndex(extra['dependency_index'])
+            else:
+                self._dependency_index = DependencyIndex.from_subjects(self.subjects)
+        return self._dependency_index
+
+
+def load_kanji_data() -> KanjiData:
+    """
+    Loads the WaniKani index, from the subject store if build_wanikani_index.py wrote one.
+    """
+    store_path = up_to_date_subject_store_path()
+    if store_path is not None:
+        return SharedKanjiData(store_path)
+    return KanjiData(wanikani_subjects_indexed())
+
 
 class Subject(object):
     @property
@@ -88,18 +209,64 @@ class Subject(object):
         return []
 
 
+class PlaceholderSubject(Subject):
+    """
+    Stands in for a word that could not be looked up within the LookupBudget of a build. Its note has the same guid
+    as the note of the real subject, so building the deck again once the word can be looked up updates the note.
+    """
+    def __init__(self, characters: str, kanji_type: KanjiType):
+        self._characters = characters
+        self._kanji_type = kanji_type
+
+    @property
+    def subject_type(self) -> KanjiType:
+        return self._kanji_type
+
+    @property
+    def characters(self):
+        return self._characters
+
+
 class JishoSubject(object):
     _JISCHO_CACHE = {}
+    _JISHO_CACHE_LOCK = threading.Lock()
     _JISHO_ID = 2**31  # not reachable by wanikani
 
+    @classmethod
+    def clear_cache(cls):
+        """
+        Forgets all Jisho responses, so the next lookups go to Jisho again.
+        """
+        with cls._JISHO_CACHE_LOCK:
+            cls._JISCHO_CACHE.clear()
+
+    @classmethod
+    def cached_responses(cls) -> Dict[str, Dict]:
+        """
+        :return: a copy of all the Jisho responses so far, to hand to another process
+        """
+        with cls._JISHO_CACHE_LOCK:
+            return dict(cls._JISCHO_CACHE)
+
+    @classmethod
+    def add_cached_responses(cls, responses: Dict[str, Dict]):
+        with cls._JISHO_CACHE_LOCK:
+            cls._JISCHO_CACHE.update(responses)
+
     def __init__(self, query, kanji_type: KanjiType, jisho_client, kanji_data: KanjiData):
+        # The word that was looked up. characters is what Jisho answered with, which can be another spelling or have
+        # a suffix (上-1).
+        self.query = query
         self._kanji_data = kanji_data
         self._kanji_type = kanji_type
-        if query in self._JISCHO_CACHE:
-            response = self._JISCHO_CACHE[query]
-        else:
+        with self._JISHO_CACHE_LOCK:
+            response = self._JISCHO_CACHE.get(query)
+        if response is None:
+            # The lock is not held during the request so concurrent builds do not wait on each other's lookups.
+            # Two builds looking up the same word at the same time both go to Jisho, which is harmless.
             response = jisho_client.search(query)
-            self._JISCHO_CACHE[query] = response
+            with self._JISHO_CACHE_LOCK:
+                self._JISCHO_CACHE[query] = response
 
         if 'data' not in response or not response['data']:
             raise RuntimeError('Jisho returned invalid response for {}'.format(query))
@@ -189,12 +356,7 @@ class WaniKaniSubject(object):
 
     @property
     def image_path(self):
-        image_folder = character_images_dir()
-        image_name = self._subject['data'].get('character_images', [''])[0]
-        if not image_name:
-            return ''
-
-        return path.join(image_folder, image_name)
+        return self._kanji_data.media_manifest.image_path(self._subject_id)
 
     @property
     def reading(self):
@@ -231,4 +393,4 @@ class WaniKaniSubject(object):
                 for component_id in self._subject['data'].get('component_subject_ids', [])]
 
 
-KANJI_DATA = KanjiData(wanikani_subjects_indexed())
+KANJI_DATA = load_kanji_data()
@@ -0,0 +1,118 @@
+import queue
+import threading
+import time
+
+from json import JSONDecodeError
+from typing import List, Optional, Tuple
+
+import requests
+
+from jisho import APIException, Client as JishoClient
+
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+
+
+class LookupBudget(object):
+    """
+    How long the Jisho lookups of a build may take, see KanjiData.with_budget. Every lookup gets at most
+    lookup_timeout seconds, and none start once the budget is spent. Words that could not be looked up in time are
+    degraded: the deck gets a placeholder note for them (or leaves them out), and they are recorded in degraded so
+    they can be looked up later.
+
+    The clock starts when the budget is made.
+    """
+    def __init__(self, seconds: float, lookup_timeout: Optional[float] = 5.0, placeholders=True):
+        """
+        :param seconds: the time all lookups have to be done in
+        :param lookup_timeout: the longest a single lookup may take, None for only the total
+        :param placeholders: whether degraded words get a placeholder note, instead of being left out of the deck
+        """
+        self.deadline = time.monotonic() + seconds
+        self.lookup_timeout = lookup_timeout
+        self.placeholders = placeholders
+        self._degraded = []
+        self._lock = threading.Lock()
+
+    def remaining(self) -> float:
+        """
+        :return: seconds left for lookups, 0 once the budget is spent
+        """
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def spent(self) -> bool:
+        return self.remaining() <= 0
+
+    def call_timeout(self) -> float:
+        """
+        :return: the timeout of the next lookup
+        """
+        if self.lookup_timeout is None:
+            return self.remaining()
+        return min(self.lookup_timeout, self.remaining())
+
+    def degrade(self, characters: str, kanji_type: KanjiType):
+        with self._lock:
+            if (characters, kanji_type) not in self._degraded:
+                self._degraded.append((characters, kanji_type))
+
+    @property
+    def degraded(self) -> List[Tuple[str, KanjiType]]:
+        """
+        :return: (characters, KanjiType) of the words that were degraded, in the order it happened
+        """
+        with self._lock:
+            return list(self._degraded)
+
+    def to_dict(self):
+        return {'degraded': [{'characters': characters, 'type': kanji_type.value}
+                             for characters, kanji_type in self.degraded]}
+
+
+class BudgetedJishoClient(JishoClient):
+    """
+    A pyjisho client whose requests time out within the lookup budget. Once the budget is spent it does not go to
+    the network at all, searches fail with requests.Timeout straight away.
+
+    The timeout is for the whole request. requests only limits connecting and every single read, so a server that
+    sends its response slowly could hold a request up for much longer. Requests are made in a background thread
+    instead, which is left behind to finish on its own when the search gives up on it.
+    """
+    def __init__(self, budget: LookupBudget, base_url: Optional[str] = None):
+        """
+        :param base_url: where the Jisho api is, like the base url of the client this one stands in for
+        """
+        super().__init__()
+        if base_url is not None:
+            self._base_url = base_url
+        self.budget = budget
+
+    def _get(self, url, params=None):
+        timeout = self.budget.call_timeout()
+        if timeout <= 0:
+            raise requests.Timeout('lookup budget spent')
+
+        responses = queue.Queue()
+
+        def get():
+            try:
+                responses.put((requests.get(url, params=self.clean_params(params or {}), timeout=timeout), None))
+            except Exception as e:
+                responses.put((None, e))
+
+        threading.Thread(target=get, daemon=True).start()
+        try:
+            response, error = responses.get(timeout=timeout)
+        except queue.Empty:
+            raise requests.Timeout('lookup took longer than {:.1f}s'.format(timeout))
+        if error is not None:
+            raise error
+
+        # Same as JishoClient._get, which does not take a timeout.
+        try:
+            json = response.json()
+            if response.status_code != 200:
+                raise APIException(response.status_code, response.content.decode())
+            return json
+        except JSONDecodeError:
+            return response.content.decode()
@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import os
+
+from typing import Dict, Iterable, List, Optional
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+def build_media_manifest(subjects: Dict, images_dir: str, hash_files=True) -> Dict[str, Dict]:
+    """
+    Lists the image of every subject that has one.
+
+    :param subjects: the "subjects" section of the WaniKani index, keyed by subject id
+    :param hash_files: whether to hash the images so identical ones can be deduplicated. Done at index time, skipped
+        when the manifest has to be built at runtime for an index that does not have one.
+    :return: json serializable manifest of subject id -> {"file": name, "size": bytes, "sha1": hash}
+    """
+    manifest = {}
+    for subject_id, subject in subjects.items():
+        image_name = (subject['data'].get('character_images') or [''])[0]
+        if not image_name or not isinstance(image_name, str):
+            continue
+
+        image_path = os.path.join(images_dir, image_name)
+        entry = {'file': image_name, 'size': None, 'sha1': None}
+        if hash_files and os.path.isfile(image_path):
+            with open(image_path, 'rb') as fp:
+                content = fp.read()
+            entry['size'] = len(content)
+            entry['sha1'] = hashlib.sha1(content).hexdigest()
+        manifest[str(subject_id)] = entry
+    return manifest
+
+
+class MediaManifest(object):
+    """
+    Answers "does this subject have an image and where is it" from memory.
+
+    Images with the same content are deduplicated: every subject whose image has the same hash gets the path of
+    the first one, so a deck only ever ships one copy.
+    """
+    def __init__(self, manifest: Dict[str, Dict], images_dir: str):
+        self.images_dir = images_dir
+        self._paths = {}
+
+        path_by_hash = {}
+        for subject_id, entry in manifest.items():
+            image_path = os.path.join(images_dir, entry['file'])
+            if entry.get('sha1'):
+                image_path = path_by_hash.setdefault(entry['sha1'], image_path)
+            self._paths[str(subject_id)] = image_path
+
+    def image_path(self, subject_id) -> str:
+        """
+        :return: the path of the subject's image, or '' if it does not have one
+        """
+        return self._paths.get(str(subject_id), '')
+
+    def validate(self, subject_ids: Iterable) -> List[str]:
+        """
+        Checks that the images of all the subjects exist, listing the images folder once instead of checking every
+        file on its own.
+
+        :return: the ids of the subjects whose image is missing
+        """
+        try:
+            existing_files = set(os.listdir(self.images_dir))
+        except OSError:
+            existing_files = set()
+
+        missing = []
+        for subject_id in subject_ids:
+            image_path = self.image_path(subject_id)
+            if image_path and os.path.basename(image_path) not in existing_files:
+                missing.append(str(subject_id))
+        return missing
+
+    @classmethod
+    def load(cls, subjects: Dict, manifest: Optional[Dict], images_dir: str):
+        """
+        :param manifest: the manifest written by build_wanikani_index.py, or None for older indexes, in which
+            case it is built from the subjects.
+        """
+        if manifest is None:
+            log.info('No media manifest found, rebuild the WaniKani index to have duplicate images removed')
+            manifest = build_media_manifest(subjects, images_dir, hash_files=False)
+        return cls(manifest, images_dir)
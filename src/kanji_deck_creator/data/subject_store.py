@@ -0,0 +1,196 @@
+import functools
+import json
+import mmap
+import struct
+
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional
+
+
+# The subject store is the WaniKani index laid out so it can be used straight out of a read-only memory map:
+#
+#   header
+#   subject records     (subject id, payload offset, payload length), sorted by subject id
+#   table directory     (table name, record count, records offset), one per character_lookup table
+#   table records       (key offset, key length, subject id), sorted by utf-8 key, one run per table
+#   blob                json payloads of the subjects, utf-8 keys, json of the other top-level sections
+#
+# Opening it only reads the header. Subjects are decoded one at a time when they are used, and lookups are
+# binary searches over the fixed size records. Every process that opens the same file shares the same pages of the
+# OS page cache, instead of holding its own copy of the decoded index.
+_MAGIC = b'KDCSTOR1'
+_HEADER = struct.Struct('<8sIIQQ')
+_SUBJECT_RECORD = struct.Struct('<qQQ')
+_TABLE_ENTRY = struct.Struct('<16sIQ')
+_TABLE_RECORD = struct.Struct('<QIq')
+
+
+def write_subject_store(data: Dict, file_path):
+    """
+    :param data: the WaniKani index as loaded from wanikani_subjects_indexed.json
+    """
+    subjects = sorted((int(subject_id), subject) for subject_id, subject in data['subjects'].items())
+    tables = sorted(data['character_lookup'].items())
+    extra = {key: value for key, value in data.items() if key not in ('subjects', 'character_lookup')}
+
+    subject_records_offset = _HEADER.size
+    table_entries_offset = subject_records_offset + len(subjects) * _SUBJECT_RECORD.size
+    table_records_offset = table_entries_offset + len(tables) * _TABLE_ENTRY.size
+    blob_offset = table_records_offset + sum(len(lookup) for _, lookup in tables) * _TABLE_RECORD.size
+
+    blob = bytearray()
+
+    def add_to_blob(content: bytes):
+        offset = blob_offset + len(blob)
+        blob.extend(content)
+        return offset
+
+    subject_records = bytearray()
+    for subject_id, subject in subjects:
+        payload = json.dumps(subject, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        subject_records += _SUBJECT_RECORD.pack(subject_id, add_to_blob(payload), len(payload))
+
+    table_entries = bytearray()
+    table_records = bytearray()
+    for name, lookup in tables:
+        table_entries += _TABLE_ENTRY.pack(name.encode('utf-8'), len(lookup),
+                                           table_records_offset + len(table_records))
+        for key, subject_id in sorted((key.encode('utf-8'), int(subject_id)) for key, subject_id in lookup.items()):
+            table_records += _TABLE_RECORD.pack(add_to_blob(key), len(key), subject_id)
+
+    extra_payload = json.dumps(extra, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    extra_offset = add_to_blob(extra_payload)
+
+    with open(file_path, 'wb') as fp:
+        fp.write(_HEADER.pack(_MAGIC, len(subjects), len(tables), extra_offset, len(extra_payload)))
+        fp.write(subject_records)
+        fp.write(table_entries)
+        fp.write(table_records)
+        fp.write(blob)
+
+
+class _SubjectsView(Mapping):
+    """
+    Read-only view of the subjects in a SubjectStore, keyed by str subject id like the json index.
+    """
+    def __init__(self, store, count: int, decoded_cache_size: int):
+        self._store = store
+        self._count = count
+        # Notes look the same subjects up over and over (kanji shared by many vocab), keep the decoded ones around.
+        self._decode = functools.lru_cache(maxsize=decoded_cache_size)(self._decode_uncached)
+
+    def _record(self, index):
+        return _SUBJECT_RECORD.unpack_from(self._store.buffer, _HEADER.size + index * _SUBJECT_RECORD.size)
+
+    def _find(self, subject_id: int) -> Optional[int]:
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] < subject_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count and self._record(low)[0] == subject_id:
+            return low
+        return None
+
+    def _decode_uncached(self, index):
+        _, offset, length = self._record(index)
+        return json.loads(bytes(self._store.buffer[offset:offset + length]).decode('utf-8'))
+
+    def __getitem__(self, key):
+        try:
+            index = self._find(int(key))
+        except ValueError:
+            index = None
+        if index is None:
+            raise KeyError(key)
+        return self._decode(index)
+
+    def __contains__(self, key):
+        try:
+            return self._find(int(key)) is not None
+        except ValueError:
+            return False
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._count):
+            yield str(self._record(index)[0])
+
+
+class _LookupView(Mapping):
+    """
+    Read-only view of one character_lookup table in a SubjectStore: characters -> subject id
+    """
+    def __init__(self, store, count: int, records_offset: int):
+        self._store = store
+        self._count = count
+        self._records_offset = records_offset
+
+    def _record(self, index):
+        key_offset, key_length, subject_id = _TABLE_RECORD.unpack_from(
+            self._store.buffer, self._records_offset + index * _TABLE_RECORD.size)
+        return bytes(self._store.buffer[key_offset:key_offset + key_length]), subject_id
+
+    def __getitem__(self, key):
+        if not isinstance(key, str):
+            raise KeyError(key)
+        encoded_key = key.encode('utf-8')
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._record(middle)[0] < encoded_key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count:
+            record_key, subject_id = self._record(low)
+            if record_key == encoded_key:
+                return subject_id
+        raise KeyError(key)
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(self._count):
+            yield self._record(index)[0].decode('utf-8')
+
+
+class SubjectStore(object):
+    """
+    A subject store file written by write_subject_store, memory mapped read-only.
+    """
+    def __init__(self, file_path, decoded_cache_size=4096):
+        self.file_path = file_path
+        with open(file_path, 'rb') as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self._mmap)
+
+        magic, num_subjects, num_tables, self._extra_offset, self._extra_length = _HEADER.unpack_from(self.buffer)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError('{} is not a subject store'.format(file_path))
+
+        self.subjects = _SubjectsView(self, num_subjects, decoded_cache_size)
+
+        tables_offset = _HEADER.size + num_subjects * _SUBJECT_RECORD.size
+        self.character_lookup = {}
+        for index in range(num_tables):
+            name, count, records_offset = _TABLE_ENTRY.unpack_from(self.buffer,
+                                                                   tables_offset + index * _TABLE_ENTRY.size)
+            self.character_lookup[name.rstrip(b'\0').decode('utf-8')] = _LookupView(self, count, records_offset)
+
+    def extra(self) -> Dict:
+        """
+        Decodes the other top-level sections of the index (like the dependency index).
+        """
+        return json.loads(bytes(self.buffer[self._extra_offset:self._extra_offset + self._extra_length])
+                          .decode('utf-8'))
+
+    def close(self):
+        self.buffer.release()
+        self._mmap.close()
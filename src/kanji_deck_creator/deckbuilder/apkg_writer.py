@@ -0,0 +1,117 @@
+import itertools
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from typing import List, Optional
+
+import genanki
+from genanki.apkg_col import APKG_COL
+from genanki.apkg_schema import APKG_SCHEMA
+
+
+class ApkgWriter(object):
+    """
+    Writes an .apkg directly, without building genanki Note objects first. Notes are inserted into the collection
+    database in batches inside a single transaction, and the database and media are streamed into the zip when the
+    writer is closed.
+
+    The collection is set up the same way genanki does it (same schema, collection row, deck and model json) and
+    notes get the same fields, tags and guids, so the result imports into Anki the same way.
+    Only models with a single card template (like KANJI_DECK_CREATOR_MODEL) are supported.
+    """
+    def __init__(self, output_path, deck_id: int, deck_name: str, model: genanki.Model, batch_size=1000,
+                 timestamp: Optional[float] = None):
+        if len(model.templates) != 1:
+            raise ValueError('ApkgWriter only supports models with a single card template')
+
+        self.output_path = output_path
+        self._deck_id = deck_id
+        self._model = model
+        self._batch_size = batch_size
+        self._timestamp = time.time() if timestamp is None else timestamp
+        # Notes and cards share one id sequence, same as genanki.
+        self._ids = itertools.count(int(self._timestamp * 1000))
+
+        self._notes = []
+        self._cards = []
+        self._media_files = []
+        self._seen_media_files = set()
+
+        database_file, self._database_path = tempfile.mkstemp(suffix='.anki2')
+        os.close(database_file)
+        self._connection = sqlite3.connect(self._database_path)
+        # Nothing reads the database before it is zipped, so there is no point in syncing it to disk.
+        self._connection.execute('PRAGMA synchronous = OFF')
+        self._connection.execute('PRAGMA journal_mode = MEMORY')
+        self._connection.executescript(APKG_SCHEMA)
+        self._connection.executescript(APKG_COL)
+
+        self._write_deck_and_model(deck_name)
+
+    def _write_deck_and_model(self, deck_name):
+        decks = json.loads(self._connection.execute('SELECT decks FROM col').fetchone()[0])
+        decks[str(self._deck_id)] = genanki.Deck(deck_id=self._deck_id, name=deck_name).to_json()
+
+        models = json.loads(self._connection.execute('SELECT models FROM col').fetchone()[0])
+        models[str(self._model.model_id)] = self._model.to_json(self._timestamp, self._deck_id)
+
+        self._connection.execute('UPDATE col SET decks = ?, models = ?', (json.dumps(decks), json.dumps(models)))
+
+    def add_note(self, front: str, back: str, guid: str, tags: List[str], media_path=''):
+        modified = int(self._timestamp)
+        note_id = next(self._ids)
+        fields = [front, back]
+        self._notes.append((
+            note_id, guid, self._model.model_id, modified, -1, ' ' + ' '.join(tags) + ' ', '\x1f'.join(fields),
+            fields[0], 0, 0, ''
+        ))
+        self._cards.append((
+            next(self._ids), note_id, self._deck_id, 0, modified, -1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, ''
+        ))
+
+        if media_path and media_path not in self._seen_media_files:
+            self._seen_media_files.add(media_path)
+            self._media_files.append(media_path)
+
+        if len(self._notes) >= self._batch_size:
+            self._flush()
+
+    def _flush(self):
+        self._connection.executemany('INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self._notes)
+        self._connection.executemany('INSERT INTO cards VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                     self._cards)
+        self._notes = []
+        self._cards = []
+
+    def close(self):
+        """
+        Writes the .apkg
+        """
+        try:
+            self._flush()
+            self._connection.commit()
+            self._connection.close()
+
+            with zipfile.ZipFile(self.output_path, 'w') as apkg:
+                apkg.write(self._database_path, 'collection.anki2')
+                apkg.writestr('media', json.dumps({str(index): os.path.basename(media_path)
+                                                   for index, media_path in enumerate(self._media_files)}))
+                for index, media_path in enumerate(self._media_files):
+                    apkg.write(media_path, str(index))
+        finally:
+            os.remove(self._database_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Don't leave a half written deck behind.
+            self._connection.close()
+            os.remove(self._database_path)
@@ -1,11 +1,34 @@
 import genanki
+import heapq
 import html
+import itertools
+import logging
+import math
+import multiprocessing
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from os import path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
-from kanji_deck_creator.data.kanji_data import KANJI_DATA, Subject, WaniKaniSubject, JishoSubject
+from kanji_deck_creator.data.frequency_store import FrequencyStore, SourceDocument
+from kanji_deck_creator.data.kanji_data import Subject, WaniKaniSubject, JishoSubject, PlaceholderSubject, \
+    SharedKanjiData
+from kanji_deck_creator.data.lookup_budget import LookupBudget
+from kanji_deck_creator.deckbuilder.deck_stats import DeckStats
+from kanji_deck_creator.deckbuilder.known_items import note_guid
 from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
 from kanji_deck_creator.kanjigraph.kanji_node import KanjiNode
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+from kanji_deck_creator.parser.sentence_index import SentenceIndex
 from kanji_deck_creator.parser.tokenizer import Tokenizer
+from kanji_deck_creator.unicode.util import is_all_kana, kanji_runs
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
 
 
 KANJI_DECK_CREATOR_MODEL = genanki.Model(
@@ -24,41 +47,402 @@ KANJI_DECK_CREATOR_MODEL = genanki.Model(
   ])
 
 
+NOTE_TAGS = ['kanji_deck_creator']
+
+# Set in the parent right before the worker processes are forked, so workers share the parent's subject data
+# (copy-on-write) instead of loading their own. Spawned workers attach to the subject store instead.
+_worker_kanji_data = None
+_fork_lock = threading.Lock()
+
+
+def _attach_subject_store(store_path, jisho_responses):
+    """
+    Sets up a spawned worker process, see AnkiPackageBuilder._render_in_parallel
+    """
+    global _worker_kanji_data
+    _worker_kanji_data = SharedKanjiData(store_path)
+    JishoSubject.add_cached_responses(jisho_responses)
+
+
+def _render_chunk(chunk):
+    """
+    Renders the note fields of a chunk of nodes in a worker process.
+
+    :param chunk: list of ((characters, KanjiType), example sentences, whether it is a placeholder) of nodes that
+        were already resolved in the parent. Jisho responses are cached in the parent before forking, so looking them
+        up again does not go to the network. Placeholders are not looked up again at all, the worker would not
+        necessarily get the same answer as the parent.
+    """
+    subjects = iter(_worker_kanji_data.get_subjects(key for key, _, placeholder in chunk if not placeholder))
+    return [AnkiPackageBuilder._render_note_fields(PlaceholderSubject(*key) if placeholder else next(subjects),
+                                                   examples)
+            for key, examples, placeholder in chunk]
+
+
 class AnkiPackageBuilder(object):
     tokenizer: Tokenizer
 
-    def __init__(self, tokenizer: Tokenizer, kanji_graph: KanjiGraph):
+    def __init__(self, tokenizer: Tokenizer, kanji_graph: KanjiGraph,
+                 graph_factory: Optional[Callable[[], KanjiGraph]] = None, new_cards_per_day=20,
+                 frequency_store: Optional[FrequencyStore] = None):
+        """
+        :param kanji_graph: the graph build_from_graph and export_from_graph work on. build and export leave it
+            alone, every call gets a new graph from graph_factory so concurrent builds never share state.
+        :param graph_factory: makes the graph of every build/export call, defaults to an empty KanjiGraph with the
+            same subject data and known items as kanji_graph. Every call has to return an empty graph of its own,
+            like a SqliteKanjiGraph with a database path of its own or clear=True for builds that never overlap.
+            Graphs with a close() method are closed after the build.
+        :param new_cards_per_day: the daily budget of new notes the budgeted deck order plans for
+        :param frequency_store: word frequencies across a whole corpus. If set, top_k picks the vocab that is most
+            frequent in the corpus and the budgeted order prefers it, instead of going by the counts in the one
+            source text. The counts of the SourceDocuments builds are given are added to it.
+        """
         self.tokenizer = tokenizer
         self.kanji_graph = kanji_graph
+        self.graph_factory = graph_factory
+        self.new_cards_per_day = new_cards_per_day
+        self.frequency_store = frequency_store
+        # Example sentences of the source text this builder's graph was filled from, if they were asked for.
+        self.sentence_index = None
+        # document id -> token counts of the SourceDocuments that are being tokenized for the frequency store
+        self._document_counts: Dict[str, Counter] = {}
 
-    def build(self, source_text, name, mode='riffled') -> genanki.Package:
+    def _with_new_graph(self, budget: Optional[LookupBudget] = None):
+        """
+        :param budget: bounds the Jisho lookups of the new graph, see KanjiData.with_budget
+        :return: a builder for a single build, with the same tokenizer and a graph of its own
+        :rtype: AnkiPackageBuilder
+        """
+        if self.graph_factory is not None:
+            kanji_graph = self.graph_factory()
+        else:
+            kanji_graph = KanjiGraph(self.kanji_graph.kanji_data, known_items=self.kanji_graph.known_items)
+        if budget is not None:
+            kanji_graph.kanji_data = kanji_graph.kanji_data.with_budget(budget)
+        return AnkiPackageBuilder(self.tokenizer, kanji_graph, graph_factory=self.graph_factory,
+                                  new_cards_per_day=self.new_cards_per_day, frequency_store=self.frequency_store)
+
+    def _close_graph(self):
+        close = getattr(self.kanji_graph, 'close', None)
+        if close is not None:
+            close()
+
+    def build(self, source_text, name, mode='riffled', min_count=1, top_k=None, workers=None,
+              example_sentences=0,
+              budget: Optional[LookupBudget] = None) -> genanki.Package:
         """
         Builds the anki deck in the chosen mode
+
+        :param source_text: the text to make the deck from, or an iterable of chunks of it. A SourceDocument (or
+            chunks that are SourceDocuments) has its counts added to the frequency store, once per document id.
+        :param min_count: vocab that occurs fewer times than this in the source text is left out of the deck.
+        :param top_k: if set, only the top_k most frequent vocab (and what they depend on) make it into the deck.
+        :param workers: if more than 1, notes are rendered in this many worker processes. The deck is the same as
+            when rendering in this process.
+        :param example_sentences: how many sentences of the source text every vocab note shows as examples.
+        :param budget: if set, Jisho lookups that do not fit in it are skipped instead of holding the build up. The
+            words that were skipped are in budget.degraded afterwards, see data.lookup_budget.LookupBudget
         """
-        if not mode or mode not in ('riffled', 'layered'):
-            raise ValueError('mode must be one of riffled or layered')
+        builder = self._with_new_graph(budget)
+        try:
+            builder._add_vocab(source_text, min_count=min_count, top_k=top_k, example_sentences=example_sentences)
+            return builder.build_from_graph(name, mode=mode, workers=workers)
+        finally:
+            builder._close_graph()
 
-        tokens = self.tokenizer.tokenize(source_text)
-        for token in tokens:
-            self.kanji_graph.add(token)
+    def build_from_graph(self, name, mode='riffled', workers=None) -> genanki.Package:
+        """
+        Builds the anki deck out of what is already in the graph, without tokenizing anything. For callers that
+        keep the graph up to date themselves, like watch.DeckWatcher
+        """
+        nodes = self._get_ordered_nodes(mode)
 
-        deck = genanki.Deck(deck_id=hash(name), name=name)
+        deck = genanki.Deck(deck_id=self.deck_id(name), name=name)
         package = genanki.Package(deck)
+        self._build_deck(package, deck, nodes, workers=workers)
+
+        return package
+
+    @staticmethod
+    def deck_id(name) -> int:
+        """
+        The same for the same name in every process (unlike hash(), which is salted per process), so rebuilding a
+        deck updates the deck in Anki instead of making a new one.
+        """
+        return zlib.crc32(name.encode('utf-8')) & 0x7fffffff
+
+    def build_graph(self, source_text, min_count=1, top_k=None) -> KanjiGraph:
+        """
+        Fills a new graph (see graph_factory) with the vocab of the source text, for when the graph itself is
+        wanted instead of a deck, like kanjigraph.graph_export. The caller closes it if it has a close() method.
+        """
+        builder = self._with_new_graph()
+        builder._add_vocab(source_text, min_count=min_count, top_k=top_k)
+        return builder.kanji_graph
+
+    def analyze(self, source_text, min_count=1, top_k=None) -> DeckStats:
+        """
+        Works out what the deck for the source text would have in it without building it. Only the tokenizer and
+        the local WaniKani data are used: words WaniKani does not have are counted instead of looked up on Jisho,
+        and nothing is rendered or written.
+
+        :param source_text: the text, or an iterable of chunks of it
+        """
+        kanji_graph = KanjiGraph(self.kanji_graph.kanji_data.without_jisho(), known_items=self.kanji_graph.known_items)
+        builder = AnkiPackageBuilder(self.tokenizer, kanji_graph)
+
+        counts = self._count_vocab(builder._tokenize_source(source_text))
+        for token, count in self._select_counts(counts, min_count=min_count, top_k=top_k,
+                                                frequency_source=self.frequency_store):
+            kanji_graph.add(token, count=count)
+        return DeckStats.from_graph(kanji_graph, num_tokens=sum(counts.values()), num_words=len(counts))
+
+    def build_shards(self, source_chapters: Iterable[Tuple[str, Any]], name, mode='riffled', max_notes=None,
+                     by_chapter=False, min_count=1, top_k=None, workers=None, example_sentences=0,
+                     budget: Optional[LookupBudget] = None) -> List[genanki.Package]:
+        """
+        Same as build, but the deck is split up into sub-decks of name, one package each, so they can be written
+        concurrently (see write_packages) and imported one at a time. The notes keep their order, and every note
+        is in the same shard as its dependencies or in a later one.
+
+        :param source_chapters: (chapter name, text or iterable of chunks of it) of every chapter of the source,
+            like document_reader.iter_source_chapters
+        :param max_notes: if set, no shard has more notes than this
+        :param by_chapter: start a new shard for every chapter. Vocab goes in the shard of the chapter it first
+            occurs in, kanji and radicals in the shard of the first vocab that needs them.
+        """
+        builder = self._with_new_graph(budget)
+        try:
+            chapter_names, first_chapters = builder._add_chapters(source_chapters, min_count=min_count, top_k=top_k,
+                                                                  example_sentences=example_sentences)
+            return builder.build_shards_from_graph(name, mode=mode, max_notes=max_notes,
+                                                   chapters=(chapter_names, first_chapters) if by_chapter else None,
+                                                   workers=workers)
+        finally:
+            builder._close_graph()
+
+    def build_shards_from_graph(self, name, mode='riffled', max_notes=None,
+                                chapters: Optional[Tuple[List[str], Dict[str, int]]] = None,
+                                workers=None) -> List[genanki.Package]:
+        """
+        Same as build_shards, out of what is already in the graph.
+
+        :param chapters: the chapter names, and the index of the chapter every word first occurs in
+        """
+        nodes = self._get_ordered_nodes(mode)
+        self.kanji_graph.resolve_subjects(nodes)
+        nodes = [node for node in nodes if node.subject]
+        shards = self._shard_nodes(nodes, max_notes=max_notes, first_chapters=chapters[1] if chapters else None)
+        # Shards by chapter are not in deck order, the notes are rendered in the order of the shards they go in.
+        notes = self._render_notes([node for _, shard in shards for node in shard], workers=workers)
+
+        packages = []
+        for chapter, shard in shards:
+            shard_name = '{}::{:02d}'.format(name, len(packages) + 1)
+            if chapters:
+                shard_name += ' ' + chapters[0][chapter]
+            deck = genanki.Deck(deck_id=self.deck_id(shard_name), name=shard_name)
+            package = genanki.Package(deck)
+            self._add_notes(package, deck, itertools.islice(notes, len(shard)))
+            packages.append(package)
+        return packages
+
+    @staticmethod
+    def _shard_nodes(nodes: List[KanjiNode], max_notes=None,
+                     first_chapters: Optional[Dict[str, int]] = None) -> List[Tuple[int, List[KanjiNode]]]:
+        """
+        Splits nodes that are in deck order (dependencies first) into consecutive shards.
+
+        :return: list of (chapter index, nodes) of the shards, in order
+        """
+        if max_notes is not None and max_notes < 1:
+            raise ValueError('max_notes must be at least 1')
+
+        node_chapters = {}
+        if first_chapters is not None:
+            # Going backwards, every node is reached after everything that depends on it, so it can be moved
+            # forward to the earliest chapter that needs it before its own dependencies are.
+            for node in reversed(nodes):
+                chapter = min(first_chapters.get(node.value, math.inf), node_chapters.get(node, math.inf))
+                chapter = 0 if chapter == math.inf else chapter
+                node_chapters[node] = chapter
+                for dependency in node.dependencies:
+                    node_chapters[dependency] = min(node_chapters.get(dependency, math.inf), chapter)
+
+        chapter_nodes = {}
+        for node in nodes:
+            chapter_nodes.setdefault(node_chapters.get(node, 0), []).append(node)
+
+        shards = []
+        for chapter in sorted(chapter_nodes):
+            shard_nodes = chapter_nodes[chapter]
+            # Any cut of an order that has dependencies first keeps them in the same or an earlier shard.
+            shard_size = max_notes or len(shard_nodes)
+            shards += [(chapter, shard_nodes[i:i + shard_size]) for i in range(0, len(shard_nodes), shard_size)]
+        return shards
+
+    def export(self, source_text, writer, mode='riffled', min_count=1, top_k=None, workers=None,
+               example_sentences=0, budget: Optional[LookupBudget] = None):
+        """
+        Same as build, but every note is handed to the writer as soon as it is rendered instead of being collected
+        in a package, so memory use does not grow with the size of the deck.
+
+        :param writer: something with an add_note(front, back, guid, tags, media_path) method, like a
+            text_export.TextDeckWriter or an apkg_writer.ApkgWriter
+        """
+        builder = self._with_new_graph(budget)
+        try:
+            builder._add_vocab(source_text, min_count=min_count, top_k=top_k, example_sentences=example_sentences)
+            builder.export_from_graph(writer, mode=mode, workers=workers)
+        finally:
+            builder._close_graph()
+
+    def export_from_graph(self, writer, mode='riffled', workers=None):
+        """
+        Same as build_from_graph, but hands the notes to the writer like export does.
+        """
+        nodes = self._get_ordered_nodes(mode)
+        for front, back, guid, image_path in self._render_notes(nodes, workers=workers):
+            writer.add_note(front, back, guid, NOTE_TAGS, image_path)
+
+    def _add_vocab(self, source_text, min_count=1, top_k=None, example_sentences=0):
+        """
+        Adds the vocab of the source text to the graph. Example sentences are collected in the same pass.
+
+        :param source_text: the text, or an iterable of chunks of it (see parser.document_reader) which are
+            tokenized one at a time so the whole text is never in memory.
+        """
+        self.sentence_index = SentenceIndex(example_sentences) if example_sentences > 0 else None
+        self._add_tokens(self._tokenize_source(source_text), min_count=min_count, top_k=top_k)
+
+    def _add_chapters(self, source_chapters: Iterable[Tuple[str, Any]], min_count=1, top_k=None,
+                      example_sentences=0) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Same as _add_vocab for a source that is split up into chapters.
+
+        :return: the chapter names, and the index of the chapter every word first occurs in
+        """
+        self.sentence_index = SentenceIndex(example_sentences) if example_sentences > 0 else None
+        chapter_names = []
+        first_chapters = {}
+
+        def tokens():
+            for chapter_name, chapter_text in source_chapters:
+                chapter = len(chapter_names)
+                chapter_names.append(chapter_name)
+                for token in self._tokenize_source(chapter_text):
+                    first_chapters.setdefault(token, chapter)
+                    yield token
+
+        self._add_tokens(tokens(), min_count=min_count, top_k=top_k)
+        return chapter_names, first_chapters
+
+    def _tokenize_source(self, source_text) -> Iterator[str]:
+        """
+        Only the lines with kanji in them go to the tokenizer, the others would only give kana words, which never
+        make it into the graph. Compound nouns are not joined across the lines that are left out.
+
+        The tokens of SourceDocuments are counted per document id, see _add_documents.
+        """
+        chunks = [source_text] if isinstance(source_text, (str, SourceDocument)) else source_text
+        for chunk in chunks:
+            if isinstance(chunk, SourceDocument):
+                if self.frequency_store is None:
+                    yield from self._tokenize_source(chunk.text)
+                    continue
+                counts = self._document_counts.setdefault(chunk.document_id, Counter())
+                for token in self._tokenize_source(chunk.text):
+                    counts[token] += 1
+                    yield token
+            else:
+                for run in kanji_runs(chunk):
+                    yield from self.tokenizer.tokenize(run, sentence_index=self.sentence_index)
+
+    def _add_documents(self):
+        """
+        Adds the counts of the SourceDocuments that were tokenized to the frequency store. Documents the store
+        already has are left alone, so a source file is only ever counted once, whatever it is built together with.
+        """
+        for document_id, counts in self._document_counts.items():
+            self.frequency_store.add_document(document_id, {word: count for word, count in counts.items()
+                                                            if not is_all_kana(word)})
+        self._document_counts = {}
+
+    @staticmethod
+    def _count_vocab(tokens: Iterable[str]) -> Counter:
+        """
+        Counts the tokens that have kanji in them, in order of first occurrence. Every distinct word is only checked
+        for kanji once, instead of every time it occurs.
+        """
+        counts = Counter(tokens)
+        for word in [word for word in counts if is_all_kana(word)]:
+            del counts[word]
+        return counts
+
+    def _add_tokens(self, tokens: Iterable[str], min_count=1, top_k=None):
+        counts = self._count_vocab(tokens)
+        if self._document_counts:
+            self._add_documents()
+
+        # Vocab is selected before it goes into the graph so that words which are cut never get their
+        # subjects resolved or rendered.
+        for token, count in self._select_counts(counts, min_count=min_count, top_k=top_k,
+                                                frequency_source=self.frequency_store):
+            self.kanji_graph.add(token, count=count)
+
+    def _get_ordered_nodes(self, mode) -> List[KanjiNode]:
+        """
+        :return: the nodes in the graph in the order they go in the deck.
+        """
+        if not mode or mode not in ('riffled', 'layered', 'budgeted'):
+            raise ValueError('mode must be one of riffled, layered or budgeted')
 
         if mode.strip().lower() == 'riffled':
-            vocabs = self.kanji_graph.sort_by_complexity(self.kanji_graph.vocabs)
+            vocabs = self.kanji_graph.ordered_by_complexity(KanjiType.VOCABULARY)
             vocabs_with_dependencies = []
             vocabs_with_dependencies_set = set()
             for node in vocabs:
                 self._get_riffled_nodes(node, result=vocabs_with_dependencies, seen_nodes=vocabs_with_dependencies_set)
+            return vocabs_with_dependencies
 
-            self._build_deck(package, deck, vocabs_with_dependencies)
+        elif mode == 'budgeted':
+            return self._get_budgeted_nodes(self.new_cards_per_day)
 
         else:
-            nodes = self._get_layered_nodes()
-            self._build_deck(package, deck, nodes)
+            return self._get_layered_nodes()
 
-        return package
+    @staticmethod
+    def _select_vocab(tokens: Iterable[str], min_count=1, top_k: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        Counts the tokens and keeps the ones that pass the frequency thresholds.
+
+        :return: list of (word, count) in order of first occurrence
+        """
+        return AnkiPackageBuilder._select_counts(AnkiPackageBuilder._count_vocab(tokens),
+                                                 min_count=min_count, top_k=top_k)
+
+    @staticmethod
+    def _select_counts(counts: Dict[str, int], min_count=1, top_k: Optional[int] = None,
+                       frequency_source=None) -> List[Tuple[str, int]]:
+        """
+        Same as _select_vocab for tokens that were already counted.
+
+        :param frequency_source: if set, top_k goes by the frequencies in it (see KanjiGraph.sort_by_frequency)
+            and by the counts for words with the same frequency.
+        """
+        selected = [(word, count) for word, count in counts.items() if count >= min_count]
+
+        if top_k is not None and len(selected) > top_k:
+            if frequency_source is None:
+                key = lambda i: i[1]
+            else:
+                frequencies = frequency_source.counts(word for word, _ in selected)
+                key = lambda i: (frequencies.get(i[0], 0), i[1])
+            # nlargest is stable, so ties are broken by first occurrence.
+            top_words = set(word for word, _ in heapq.nlargest(top_k, selected, key=key))
+            selected = [(word, count) for word, count in selected if word in top_words]
+
+        return selected
 
     def _get_dependencies_as_list(self, node: KanjiNode):
         nodes = []
@@ -78,36 +462,220 @@ class AnkiPackageBuilder(object):
 
         result.append(node)
 
+    def _get_budgeted_nodes(self, new_cards_per_day: int) -> List[KanjiNode]:
+        """
+        Plans the deck as days of new_cards_per_day notes. Every note comes after its dependencies, and the next
+        note is always the one that leads to the most frequent vocab soonest: a radical or kanji is worth as much
+        as the most frequent vocab that needs it (going by the frequency store, if the builder has one). At most
+        half of every day goes to radicals and kanji while there is vocab to learn, so a vocab with many new
+        dependencies does not turn into days without any vocab.
+
+        Runs in O(n log n) over the graph: nodes are placed off heaps as their dependencies are placed, nothing is
+        sorted as a whole.
+        """
+        if new_cards_per_day < 1:
+            raise ValueError('new_cards_per_day must be at least 1')
+
+        nodes = list(self.kanji_graph.nodes.values())
+        in_graph = set(nodes)
+        dependents = {node: [] for node in nodes}
+        num_unplaced_dependencies = {}
+        for node in nodes:
+            dependencies = [dependency for dependency in node.dependencies
+                            if dependency in in_graph and dependency != node]
+            num_unplaced_dependencies[node] = len(dependencies)
+            for dependency in dependencies:
+                dependents[dependency].append(node)
+
+        # How much every node is worth, pushed down from the vocab to its dependencies in reverse topological order.
+        topological_order = [node for node in nodes if not num_unplaced_dependencies[node]]
+        num_dependencies_left = dict(num_unplaced_dependencies)
+        for node in topological_order:
+            for dependent in dependents[node]:
+                num_dependencies_left[dependent] -= 1
+                if not num_dependencies_left[dependent]:
+                    topological_order.append(dependent)
+        frequencies = None
+        if self.frequency_store is not None:
+            frequencies = self.frequency_store.counts(node.value for node in nodes
+                                                      if node.type == KanjiType.VOCABULARY)
+        demand = {}
+        for node in reversed(topological_order):
+            own_demand = 0
+            if node.type == KanjiType.VOCABULARY:
+                own_demand = node.count if frequencies is None else frequencies.get(node.value, 0)
+            demand[node] = max([own_demand] + [demand[dependent] for dependent in dependents[node]])
+
+        # Separate heaps so the daily share of radicals and kanji can be enforced without searching.
+        ready_vocab = []
+        ready_prerequisites = []
+
+        def make_ready(node):
+            entry = (-demand[node], -node.count, node.value, node.type.value, node)
+            heapq.heappush(ready_vocab if node.type == KanjiType.VOCABULARY else ready_prerequisites, entry)
+
+        for node in nodes:
+            if not num_unplaced_dependencies[node]:
+                make_ready(node)
+
+        max_prerequisites_per_day = max(1, new_cards_per_day // 2)
+        result = []
+        prerequisites_today = 0
+        while ready_vocab or ready_prerequisites:
+            if len(result) % new_cards_per_day == 0:
+                prerequisites_today = 0
+
+            take_prerequisite = bool(ready_prerequisites) and (
+                not ready_vocab or
+                (prerequisites_today < max_prerequisites_per_day and ready_prerequisites[0] < ready_vocab[0]))
+            if take_prerequisite:
+                node = heapq.heappop(ready_prerequisites)[-1]
+                prerequisites_today += 1
+            else:
+                node = heapq.heappop(ready_vocab)[-1]
+            result.append(node)
+
+            for dependent in dependents[node]:
+                num_unplaced_dependencies[dependent] -= 1
+                if not num_unplaced_dependencies[dependent]:
+                    make_ready(dependent)
+        return result
+
     def _get_layered_nodes(self):
-        return self.kanji_graph.sort_by_complexity(self.kanji_graph.nodes.values())
+        return list(self.kanji_graph.ordered_by_complexity())
 
-    def _build_deck(self, package: genanki.Package, deck: genanki.Deck, nodes):
+    def _build_deck(self, package: genanki.Package, deck: genanki.Deck, nodes, workers=None):
         """
         Builds the anki deck ordering all nodes by complexity, resultsing in a layered stack:
         radicals notes, then kanji notes, then vocab notes.
         """
-        subjects = [KANJI_DATA.get_subject(node.value, node.type) for node in nodes]
-
-        for subject in subjects:
-            # subjects can be None if they are not found in the dataset.
-            # TODO: Use jisho in those cases, but that can still return None if jisho can't find anything either.
-            if not subject:
-                continue
+        self._add_notes(package, deck, self._render_notes(nodes, workers=workers))
 
-            if subject.image_path:
-                package.media_files.append(subject.image_path)
+    @staticmethod
+    def _add_notes(package: genanki.Package, deck: genanki.Deck, notes: Iterable[Tuple[str, str, str, str]]):
+        """
+        Adds the rendered notes to the deck, and their images to the media of the package.
+        """
+        media_files = set()
+        for front, back, guid, image_path in notes:
+            # Subjects with identical images share one path in the media manifest, ship it only once.
+            if image_path and image_path not in media_files:
+                media_files.add(image_path)
+                package.media_files.append(image_path)
 
-            front = self._get_front(subject)
-            back = self._get_back(subject)
-            guid = genanki.guid_for(subject.characters or subject.subject_id, subject.subject_type)
             note = genanki.Note(
                 model=KANJI_DECK_CREATOR_MODEL,
                 fields=[front, back],
-                tags=['kanji_deck_creator'],
+                tags=NOTE_TAGS,
                 guid=guid
             )
             deck.add_note(note)
 
+    def _render_notes(self, nodes: List[KanjiNode], workers=None) -> Iterator[Tuple[str, str, str, str]]:
+        """
+        :return: iterator of (front, back, guid, image path) of the notes for the nodes, in the same order as the nodes
+        """
+        # Most nodes were resolved while the graph was built, this only looks up the rest (like compound words).
+        self.kanji_graph.resolve_subjects(nodes)
+
+        # subjects can be None if they are not found in the dataset.
+        # TODO: Use jisho in those cases, but that can still return None if jisho can't find anything either.
+        nodes = [node for node in nodes if node.subject]
+        missing_images = self._find_missing_images(nodes)
+
+        examples = [self._examples(node) for node in nodes]
+        if workers and workers > 1:
+            notes = self._render_in_parallel(nodes, examples, workers)
+        else:
+            notes = (self._render_note_fields(node.subject, node_examples)
+                     for node, node_examples in zip(nodes, examples))
+
+        if not missing_images:
+            return notes
+        return ((front, back, guid, '' if image_path in missing_images else image_path)
+                for front, back, guid, image_path in notes)
+
+    def _examples(self, node: KanjiNode) -> List[str]:
+        if self.sentence_index is None or node.type != KanjiType.VOCABULARY:
+            return []
+        return self.sentence_index.examples(node.value)
+
+    def _find_missing_images(self, nodes: List[KanjiNode]) -> Set[str]:
+        """
+        Checks all the images of the deck against the media manifest up front, so a missing file is reported once
+        instead of failing the package when it is written.
+
+        :return: image paths of the nodes that do not exist on disk
+        """
+        subject_ids = [node.subject.subject_id for node in nodes if isinstance(node.subject, WaniKaniSubject)]
+        if not subject_ids:
+            return set()
+
+        media_manifest = self.kanji_graph.kanji_data.media_manifest
+        missing_ids = media_manifest.validate(subject_ids)
+        if missing_ids:
+            log.warning('{} images are missing from {}, rebuild the WaniKani index to download them. '
+                        'Subjects: {}'.format(len(missing_ids), media_manifest.images_dir, ', '.join(missing_ids)))
+        return set(media_manifest.image_path(subject_id) for subject_id in missing_ids)
+
+    def _render_in_parallel(self, nodes: List[KanjiNode], examples: List[List[str]],
+                            workers: int) -> Iterator[Tuple[str, str, str, str]]:
+        """
+        Renders the note fields of the nodes in worker processes, in the same order as the nodes.
+        """
+        kanji_data = self.kanji_graph.kanji_data
+        store_path = getattr(kanji_data, 'store_path', None)
+        can_fork = 'fork' in multiprocessing.get_all_start_methods()
+        if not can_fork and store_path is None:
+            # Without fork every worker would have to load the subject data on its own, which costs more than
+            # rendering serially.
+            log.warning('Parallel rendering needs the fork start method or a subject store, '
+                        'rendering in this process instead')
+            yield from (self._render_note_fields(node.subject, node_examples)
+                        for node, node_examples in zip(nodes, examples))
+            return
+
+        items = [((node.value, node.type), node_examples, type(node.subject) is PlaceholderSubject)
+                 for node, node_examples in zip(nodes, examples)]
+        # A few chunks per worker keeps the workers busy when some chunks take longer (long mnemonics).
+        chunk_size = max(1, math.ceil(len(items) / (workers * 4)))
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+
+        if can_fork:
+            global _worker_kanji_data
+            # Concurrent builds must not fork while another build has its subject data in the global.
+            with _fork_lock:
+                _worker_kanji_data = kanji_data
+                try:
+                    pool = multiprocessing.get_context('fork').Pool(workers)
+                finally:
+                    # The workers have their own copy once they are forked.
+                    _worker_kanji_data = None
+        else:
+            # Workers attach to the memory mapped subject store, and get the Jisho responses of the nodes so they
+            # do not look them up again.
+            pool = multiprocessing.get_context('spawn').Pool(
+                workers, initializer=_attach_subject_store, initargs=(store_path, JishoSubject.cached_responses()))
+
+        with pool:
+            for chunk in pool.imap(_render_chunk, chunks):
+                yield from chunk
+
+    @classmethod
+    def _render_note_fields(cls, subject: Subject, examples: Iterable[str] = ()) -> Tuple[str, str, str, str]:
+        """
+        :param examples: sentences from the source text to show on the back
+        :return: (front, back, guid, image path) of the note for the subject
+        """
+        front = cls._get_front(subject)
+        back = cls._get_back(subject, examples)
+        if type(subject) is JishoSubject:
+            # Keyed by the word that was looked up, like its placeholder and the graph node, not by Jisho's answer.
+            guid = note_guid(subject.query, subject.subject_type)
+        else:
+            guid = note_guid(subject.characters or subject.subject_id, subject.subject_type)
+        return front, back, guid, subject.image_path
+
     @staticmethod
     def _get_character_visual(subject):
         if subject.characters:
@@ -149,8 +717,27 @@ class AnkiPackageBuilder(object):
             .replace('&lt;ja&gt;', '<b>')\
             .replace('&lt;/ja&gt;', '</b>')
 
+    @staticmethod
+    def _format_example(sentence: str, word: str):
+        """
+        :return: html of the sentence with the word in bold, if it is written the same way as in the sentence
+        """
+        sentence = html.escape(sentence)
+        if word:
+            word = html.escape(word)
+            sentence = sentence.replace(word, '<b>{}</b>'.format(word))
+        return sentence
+
+    @staticmethod
+    def _source_name(subject: Subject):
+        if type(subject) is WaniKaniSubject:
+            return 'WaniKani'
+        if type(subject) is PlaceholderSubject:
+            return 'not looked up yet'
+        return 'Jisho'
+
     @classmethod
-    def _get_back(cls, subject: Subject):
+    def _get_back(cls, subject: Subject, examples: Iterable[str] = ()):
         meaning_mnemonic = AnkiPackageBuilder._wanikani_parse(subject.meaning_mnemonic)
         reading_mnemonic = AnkiPackageBuilder._wanikani_parse(subject.reading_mnemonic)
 
@@ -163,6 +750,27 @@ class AnkiPackageBuilder(object):
             section.format('parts of speech') + html.escape(subject.parts_of_speech),
             section.format('meaning mnemonic') + meaning_mnemonic,
             section.format('reading mnemonic') + reading_mnemonic,
-            section.format('source') + ('WaniKani' if type(subject) is WaniKaniSubject else 'Jisho')
+            section.format('source') + cls._source_name(subject),
+            section.format('examples') + '<br>'.join(cls._format_example(example, subject.characters)
+                                                     for example in examples)
         ]
         return '<br>'.join(line for line in lines if not line.endswith(': </b></font>'))
+
+
+def write_packages(packages: List[genanki.Package], output_paths: List[str], max_workers=None,
+                   timestamp: Optional[float] = None):
+    """
+    Writes the packages of AnkiPackageBuilder.build_shards to their files concurrently. Most of the time is spent
+    in SQLite and writing the zip files, which do not hold the GIL, so threads are enough.
+    """
+    if timestamp is None:
+        timestamp = time.time()
+
+    # genanki numbers the notes and cards of a package from the timestamp in milliseconds. Every package starts
+    # after the ids of the previous one, so they do not clash when the packages are imported into one collection.
+    first_ids = [0] + list(itertools.accumulate(2 * len(package.decks[0].notes) + 1 for package in packages))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(package.write_to_file, output_path, timestamp=timestamp + first_id / 1000)
+                   for package, output_path, first_id in zip(packages, output_paths, first_ids)]
+        for future in futures:
+            future.result()
@@ -0,0 +1,98 @@
+import statistics
+
+from typing import Dict, List
+
+from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+
+
+_TYPE_NAMES = {
+    KanjiType.PRIMITIVE: 'radicals',
+    KanjiType.KANJI: 'kanji',
+    KanjiType.VOCABULARY: 'vocab',
+}
+
+
+def _complexity_bucket(num_dependencies: int) -> str:
+    """
+    :return: the power of two range the number falls in: 0, 1, 2-3, 4-7, 8-15...
+    """
+    if num_dependencies < 2:
+        return str(num_dependencies)
+    low = 1 << (num_dependencies.bit_length() - 1)
+    return '{}-{}'.format(low, 2 * low - 1)
+
+
+class DeckStats(object):
+    """
+    What the deck for a source text would have in it, see AnkiPackageBuilder.analyze
+    """
+    def __init__(self, num_tokens: int, num_words: int, notes: Dict[str, int], jisho_lookups: Dict[str, int],
+                 complexity: Dict[str, List[int]]):
+        """
+        :param num_tokens: words with kanji in the source text, every occurrence counted
+        :param num_words: distinct words with kanji in the source text, before min_count/top_k
+        :param notes: number of notes per type ('radicals', 'kanji', 'vocab') with WaniKani data
+        :param jisho_lookups: number of words per type WaniKani does not have, which a build looks up on Jisho
+        :param complexity: the total number of dependencies of every node per type, ascending
+        """
+        self.num_tokens = num_tokens
+        self.num_words = num_words
+        self.notes = notes
+        self.jisho_lookups = jisho_lookups
+        self.complexity = complexity
+
+    @classmethod
+    def from_graph(cls, kanji_graph: KanjiGraph, num_tokens: int, num_words: int) -> 'DeckStats':
+        notes = {}
+        jisho_lookups = {}
+        complexity = {}
+        for kanji_type, type_name in _TYPE_NAMES.items():
+            nodes = list(kanji_graph.ordered_by_complexity(kanji_type))
+            notes[type_name] = sum(1 for node in nodes if node.subject)
+            jisho_lookups[type_name] = len(nodes) - notes[type_name]
+            complexity[type_name] = [node.total_num_dependencies for node in nodes]
+        return cls(num_tokens, num_words, notes, jisho_lookups, complexity)
+
+    def complexity_histogram(self, type_name) -> Dict[str, int]:
+        """
+        :return: how many nodes of the type have 0, 1, 2-3, 4-7... dependencies, in that order
+        """
+        histogram = {}
+        for num_dependencies in self.complexity[type_name]:
+            bucket = _complexity_bucket(num_dependencies)
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+        return histogram
+
+    def to_dict(self) -> Dict:
+        return {
+            'tokens': self.num_tokens,
+            'words': self.num_words,
+            'notes': self.notes,
+            'jisho_lookups': self.jisho_lookups,
+            'complexity': {
+                type_name: {
+                    'median': statistics.median(values) if values else 0,
+                    'max': max(values, default=0),
+                    'histogram': self.complexity_histogram(type_name),
+                }
+                for type_name, values in self.complexity.items()
+            },
+        }
+
+    def format(self) -> str:
+        lines = [
+            'words with kanji: {} ({} distinct)'.format(self.num_tokens, self.num_words),
+            'notes: {} ({})'.format(sum(self.notes.values()), ', '.join(
+                '{} {}'.format(count, type_name) for type_name, count in self.notes.items())),
+            'not in WaniKani, looked up on Jisho when building: {}'.format(', '.join(
+                '{} {}'.format(count, type_name) for type_name, count in self.jisho_lookups.items())),
+            'dependencies per note:',
+        ]
+        for type_name, values in self.complexity.items():
+            if not values:
+                continue
+            lines.append('  {}: median {}, max {}, {}'.format(
+                type_name, statistics.median(values), max(values), ', '.join(
+                    '{}: {}'.format(bucket, count) for bucket, count in self.complexity_histogram(type_name).items())))
+        return '\n'.join(lines)
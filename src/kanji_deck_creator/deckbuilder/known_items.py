@@ -0,0 +1,134 @@
+import csv
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+
+from typing import Iterable, Set, Tuple
+
+import genanki
+
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+
+
+def note_guid(characters, kanji_type: KanjiType) -> str:
+    """
+    The guid used for the note of a subject. Notes for subjects without characters use the subject id instead.
+    """
+    return genanki.guid_for(characters, kanji_type)
+
+
+class KnownItems(object):
+    """
+    Radicals, kanji and vocab the learner already knows, so they can be left out of new decks.
+
+    Items are stored as note guids (which is how previously generated decks identify them) and as plain
+    characters (which is how people write lists by hand). Both are sets, a few thousand short strings is
+    small enough that a probabilistic filter would only add false positives.
+    """
+    guids: Set[str]
+    characters: Set[str]
+
+    def __init__(self, guids: Iterable[str] = (), characters: Iterable[str] = ()):
+        self.guids = set(guids)
+        self.characters = set(characters)
+
+    def __contains__(self, item: Tuple[str, KanjiType]):
+        """
+        :param item: (characters, KanjiType) the same way nodes are keyed in the KanjiGraph
+        """
+        characters, kanji_type = item
+        return characters in self.characters or note_guid(characters, kanji_type) in self.guids
+
+    def __len__(self):
+        return len(self.guids) + len(self.characters)
+
+    def update(self, other):
+        """
+        :type other: KnownItems
+        """
+        self.guids |= other.guids
+        self.characters |= other.characters
+
+    @classmethod
+    def from_list(cls, file_path):
+        """
+        Reads a utf-8 file with one word/kanji/radical per line. Empty lines and lines starting with # are ignored.
+        """
+        with open(file_path, 'rt', encoding='utf-8') as fp:
+            lines = (line.strip() for line in fp)
+            return cls(characters=(line for line in lines if line and not line.startswith('#')))
+
+    @classmethod
+    def from_apkg(cls, file_path):
+        """
+        Reads the note guids out of the collection database embedded in a previously generated .apkg
+        """
+        with zipfile.ZipFile(file_path) as apkg:
+            names = apkg.namelist()
+            collection_names = [name for name in ('collection.anki21', 'collection.anki2') if name in names]
+            if not collection_names:
+                raise ValueError('{} does not contain an anki collection'.format(file_path))
+
+            temp_dir = tempfile.mkdtemp()
+            try:
+                # sqlite can only open real files, so the collection has to be extracted first.
+                collection_path = apkg.extract(collection_names[0], temp_dir)
+                connection = sqlite3.connect(collection_path)
+                try:
+                    guids = [row[0] for row in connection.execute('SELECT guid FROM notes')]
+                finally:
+                    connection.close()
+            finally:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+
+        return cls(guids=guids)
+
+    @classmethod
+    def from_text_export(cls, file_path):
+        """
+        Reads the note guids out of a TSV/CSV file written by text_export.TextDeckWriter
+        """
+        delimiter = ',' if file_path.lower().endswith('.csv') else '\t'
+        with open(file_path, 'rt', encoding='utf-8', newline='') as fp:
+            rows = csv.reader((line for line in fp if not line.startswith('#')), delimiter=delimiter)
+            return cls(guids=[row[2] for row in rows if len(row) > 2])
+
+    @classmethod
+    def from_state(cls, file_path):
+        """
+        Reads known items that were stored with save()
+        """
+        with open(file_path, 'rt', encoding='utf-8') as fp:
+            state = json.load(fp)
+        return cls(guids=state.get('guids', []), characters=state.get('characters', []))
+
+    @classmethod
+    def from_package(cls, package: genanki.Package):
+        """
+        Everything in a package that was just built, so it can be stored and excluded from the next deck.
+        """
+        return cls(guids=(note.guid for deck in package.decks for note in deck.notes))
+
+    @classmethod
+    def load(cls, file_path):
+        """
+        Picks the right reader based on the file extension: .apkg, .tsv/.csv (text export), .json (saved state) or
+        a plain list.
+        """
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension == '.apkg':
+            return cls.from_apkg(file_path)
+        elif extension in ('.tsv', '.csv'):
+            return cls.from_text_export(file_path)
+        elif extension == '.json':
+            return cls.from_state(file_path)
+        else:
+            return cls.from_list(file_path)
+
+    def save(self, file_path):
+        with open(file_path, 'wt', encoding='utf-8') as fp:
+            json.dump({'guids': sorted(self.guids), 'characters': sorted(self.characters)}, fp,
+                      ensure_ascii=False, indent=2)
@@ -0,0 +1,47 @@
+import csv
+import os
+import shutil
+
+from typing import List
+
+
+class TextDeckWriter(object):
+    """
+    Writes notes to a TSV/CSV file that can be imported into Anki (File > Import) or other SRS tools, one row per
+    note as they come in. Images are copied into a media folder next to the file, which has to be copied into
+    Anki's collection.media folder by hand.
+
+    The header lines tell Anki (2.1.55+) which columns hold the guid and the tags, so re-importing an updated deck
+    updates the existing notes instead of duplicating them.
+    """
+    def __init__(self, output_path, delimiter='\t'):
+        """
+        :param delimiter: '\t' for TSV or ',' for CSV
+        """
+        self.output_path = output_path
+        self.media_folder = os.path.splitext(output_path)[0] + '.media'
+        self._copied_media = set()
+
+        self._fp = open(output_path, 'wt', encoding='utf-8', newline='')
+        self._fp.write('#separator:{}\n'.format('tab' if delimiter == '\t' else 'comma'))
+        self._fp.write('#html:true\n')
+        self._fp.write('#guid column:3\n')
+        self._fp.write('#tags column:4\n')
+        self._writer = csv.writer(self._fp, delimiter=delimiter, lineterminator='\n')
+
+    def add_note(self, front: str, back: str, guid: str, tags: List[str], media_path=''):
+        self._writer.writerow([front, back, guid, ' '.join(tags)])
+
+        if media_path and media_path not in self._copied_media:
+            os.makedirs(self.media_folder, exist_ok=True)
+            shutil.copy(media_path, self.media_folder)
+            self._copied_media.add(media_path)
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
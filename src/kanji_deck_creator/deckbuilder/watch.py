@@ -0,0 +1,134 @@
+import logging
+import os
+import time
+
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from kanji_deck_creator.deckbuilder.deck_builder import AnkiPackageBuilder
+from kanji_deck_creator.parser.document_reader import iter_source_chunks
+from kanji_deck_creator.parser.tokenization_cache import split_paragraphs
+from kanji_deck_creator.unicode.util import has_kanji
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+class _SourceFile(object):
+    """
+    What is known about a watched file as of the last time it was read.
+    """
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.stat = None
+        # Tokens of every paragraph in the file, so only new paragraphs have to be tokenized after an edit.
+        self.paragraph_tokens: Dict[str, List[str]] = {}
+        self.counts = Counter()
+
+    def current_stat(self):
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            # Editors that save by replacing the file remove it for a moment.
+            return self.stat
+        return stat.st_mtime_ns, stat.st_size
+
+
+class DeckWatcher(object):
+    """
+    Keeps a deck up to date while its source files are being edited.
+
+    The tokenizer, the subject data and the builder's graph stay loaded between changes. When a file changes only
+    the paragraphs that were not in it before are tokenized, and the graph is updated with the difference in
+    counts (words that disappeared are removed from it) instead of being built again. Files are polled, which works
+    the same on every platform and is cheap for the handful of files a deck is made from.
+    """
+    def __init__(self, builder: AnkiPackageBuilder, source_paths: List[str], write_deck: Callable[[], None],
+                 min_count=1, top_k: Optional[int] = None, poll_interval=0.25):
+        """
+        :param builder: the words are added to and removed from its kanji_graph, whatever type of graph that is
+        :param write_deck: called after the graph was updated, writes the deck out of the builder's graph with
+            AnkiPackageBuilder.build_from_graph or export_from_graph.
+        :param poll_interval: seconds between checks for changes
+        """
+        self.builder = builder
+        self.write_deck = write_deck
+        self.min_count = min_count
+        self.top_k = top_k
+        self.poll_interval = poll_interval
+
+        self._sources = [_SourceFile(file_path) for file_path in source_paths]
+        # The (word, count) that are in the graph right now.
+        self._in_graph: Dict[str, int] = {}
+
+    def _read(self, source: _SourceFile):
+        paragraphs = [paragraph for chunk in iter_source_chunks(source.file_path)
+                      for paragraph in split_paragraphs(chunk)]
+
+        paragraph_tokens = {}
+        for paragraph in paragraphs:
+            tokens = source.paragraph_tokens.get(paragraph)
+            if tokens is None:
+                tokens = paragraph_tokens.get(paragraph)
+            if tokens is None:
+                # Paragraphs without kanji would only give kana words, see AnkiPackageBuilder._tokenize_source
+                tokens = self.builder.tokenizer.tokenize(paragraph) if has_kanji(paragraph) else []
+            paragraph_tokens[paragraph] = tokens
+
+        log.info('{} changed, tokenized {} of {} paragraphs'.format(
+            source.file_path, len(paragraph_tokens.keys() - source.paragraph_tokens.keys()), len(paragraphs)))
+        source.paragraph_tokens = paragraph_tokens
+        source.counts = AnkiPackageBuilder._count_vocab(token for paragraph in paragraphs
+                                                        for token in paragraph_tokens[paragraph])
+
+    def _update_graph(self):
+        counts = Counter()
+        for source in self._sources:
+            counts.update(source.counts)
+        selected = dict(AnkiPackageBuilder._select_counts(counts, min_count=self.min_count, top_k=self.top_k))
+
+        graph = self.builder.kanji_graph
+        for word, count in self._in_graph.items():
+            difference = selected.get(word, 0) - count
+            if difference < 0:
+                graph.remove(word, count=-difference)
+        for word, count in selected.items():
+            difference = count - self._in_graph.get(word, 0)
+            if difference > 0:
+                graph.add(word, count=difference)
+        self._in_graph = selected
+
+    def update(self) -> bool:
+        """
+        Reads the files that changed since the last update and brings the graph up to date.
+
+        :return: whether anything changed
+        """
+        changed = False
+        for source in self._sources:
+            stat = source.current_stat()
+            if stat is not None and stat != source.stat:
+                self._read(source)
+                source.stat = stat
+                changed = True
+
+        if changed:
+            self._update_graph()
+        return changed
+
+    def watch(self, max_updates: Optional[int] = None):
+        """
+        Writes the deck, then writes it again every time a source file changes. Runs until interrupted.
+
+        :param max_updates: stop after writing the deck this many times, runs forever if None
+        """
+        updates = 0
+        while max_updates is None or updates < max_updates:
+            if self.update():
+                start = time.monotonic()
+                self.write_deck()
+                updates += 1
+                log.info('Deck written in %.2fs', time.monotonic() - start)
+            else:
+                time.sleep(self.poll_interval)
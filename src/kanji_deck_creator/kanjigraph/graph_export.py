@@ -0,0 +1,167 @@
+import json
+import os
+
+from collections import deque
+from typing import Callable, Iterable, Iterator, Optional, Set, TextIO, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
+from kanji_deck_creator.kanjigraph.kanji_node import KanjiNode
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+
+
+GRAPH_FORMATS = ('jsonl', 'dot', 'graphml')
+
+
+def _node_id(node: KanjiNode) -> str:
+    return '{}:{}'.format(node.type.value, node.value)
+
+
+class GraphSelection(object):
+    """
+    The part of a graph to export: all of it, the nodes of some types, and/or the nodes around some words.
+
+    Nodes are streamed out of the graph one at a time. Only the subgraph around words is collected up front, it is
+    expected to be small.
+    """
+    def __init__(self, kanji_graph: KanjiGraph, kanji_types: Optional[Iterable[KanjiType]] = None,
+                 around: Optional[Iterable[Tuple[str, KanjiType]]] = None, radius=1):
+        """
+        :param kanji_types: only nodes of these types, all types if None
+        :param around: (characters, KanjiType) of the nodes to export the neighbourhood of, the whole graph if None
+        :param radius: how many dependency/contained in edges away from the around nodes nodes can be
+        """
+        self.kanji_graph = kanji_graph
+        self.kanji_types = set(kanji_types) if kanji_types is not None else None
+        self._subgraph = self._neighbourhood(around, radius) if around is not None else None
+
+    def _neighbourhood(self, around: Iterable[Tuple[str, KanjiType]], radius: int) -> Set[KanjiNode]:
+        nodes = self.kanji_graph.nodes
+        distances = {nodes[key]: 0 for key in around if key in nodes}
+        queue = deque(distances)
+        while queue:
+            node = queue.popleft()
+            if distances[node] >= radius:
+                continue
+            for neighbour in list(node.dependencies) + list(node.contained_in):
+                if neighbour not in distances and (neighbour.value, neighbour.type) in nodes:
+                    distances[neighbour] = distances[node] + 1
+                    queue.append(neighbour)
+        return set(distances)
+
+    def __contains__(self, node: KanjiNode):
+        if self.kanji_types is not None and node.type not in self.kanji_types:
+            return False
+        if self._subgraph is not None:
+            return node in self._subgraph
+        return (node.value, node.type) in self.kanji_graph.nodes
+
+    def nodes(self) -> Iterator[KanjiNode]:
+        """
+        :return: the selected nodes, with their total_num_dependencies up to date
+        """
+        candidates = self._subgraph if self._subgraph is not None else self.kanji_graph.nodes.values()
+        for node in candidates:
+            if node in self:
+                # noinspection PyProtectedMember
+                self.kanji_graph._update_total_num_dependencies(node)
+                yield node
+
+    def edges(self, node: KanjiNode) -> Iterator[KanjiNode]:
+        """
+        :return: the selected dependencies of the node
+        """
+        for dependency in node.dependencies:
+            if dependency != node and dependency in self:
+                yield dependency
+
+
+def write_jsonl(selection: GraphSelection, fp: TextIO):
+    """
+    One json object per line for every node, with its dependencies as node ids ("type:characters").
+    """
+    for node in selection.nodes():
+        fp.write(json.dumps({
+            'id': _node_id(node),
+            'characters': node.value,
+            'type': node.type.value,
+            'count': node.count,
+            'complexity': node.total_num_dependencies,
+            'dependencies': [_node_id(dependency) for dependency in selection.edges(node)],
+        }, ensure_ascii=False))
+        fp.write('\n')
+
+
+def _dot_quote(text: str) -> str:
+    return '"{}"'.format(text.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def write_dot(selection: GraphSelection, fp: TextIO):
+    """
+    Graphviz DOT, with the edges pointing from a node to its dependencies.
+    """
+    fp.write('digraph kanji_graph {\n')
+    for node in selection.nodes():
+        fp.write('  {} [label={}, type={}, count={}, complexity={}];\n'.format(
+            _dot_quote(_node_id(node)), _dot_quote(node.value), node.type.value, node.count,
+            node.total_num_dependencies))
+        for dependency in selection.edges(node):
+            fp.write('  {} -> {};\n'.format(_dot_quote(_node_id(node)), _dot_quote(_node_id(dependency))))
+    fp.write('}\n')
+
+
+_GRAPHML_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns">
+  <key id="characters" for="node" attr.name="characters" attr.type="string"/>
+  <key id="type" for="node" attr.name="type" attr.type="string"/>
+  <key id="count" for="node" attr.name="count" attr.type="int"/>
+  <key id="complexity" for="node" attr.name="complexity" attr.type="int"/>
+  <graph id="kanji_graph" edgedefault="directed">
+'''
+
+
+def write_graphml(selection: GraphSelection, fp: TextIO):
+    """
+    GraphML, with the edges pointing from a node to its dependencies. Edges are written right after their node,
+    which GraphML allows, so nothing has to be held back until all nodes are written.
+    """
+    fp.write(_GRAPHML_HEADER)
+    for node in selection.nodes():
+        node_id = quoteattr(_node_id(node))
+        fp.write('    <node id={}>'.format(node_id))
+        for key, value in (('characters', node.value), ('type', node.type.value), ('count', node.count),
+                           ('complexity', node.total_num_dependencies)):
+            fp.write('<data key="{}">{}</data>'.format(key, escape(str(value))))
+        fp.write('</node>\n')
+        for dependency in selection.edges(node):
+            fp.write('    <edge source={} target={}/>\n'.format(node_id, quoteattr(_node_id(dependency))))
+    fp.write('  </graph>\n</graphml>\n')
+
+
+_WRITERS = {
+    'jsonl': write_jsonl,
+    'dot': write_dot,
+    'graphml': write_graphml,
+}
+
+
+def graph_writer(graph_format: str) -> Callable[[GraphSelection, TextIO], None]:
+    """
+    :param graph_format: one of GRAPH_FORMATS
+    """
+    if graph_format not in _WRITERS:
+        raise ValueError('graph_format must be one of {}'.format(', '.join(GRAPH_FORMATS)))
+    return _WRITERS[graph_format]
+
+
+def export_graph(selection: GraphSelection, file_path, graph_format: Optional[str] = None):
+    """
+    Writes the selected part of the graph to a file, node by node.
+
+    :param graph_format: one of GRAPH_FORMATS, taken from the file extension if None
+    """
+    if graph_format is None:
+        graph_format = os.path.splitext(file_path)[1].lstrip('.').lower()
+    writer = graph_writer(graph_format)
+    with open(file_path, 'wt', encoding='utf-8') as fp:
+        writer(selection, fp)
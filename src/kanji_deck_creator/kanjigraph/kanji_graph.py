@@ -1,7 +1,7 @@
 import logging
-from typing import Set, Dict, Tuple, Iterable, List
+from typing import Set, Dict, Tuple, Iterable, Iterator, List
 
-from kanji_deck_creator.unicode.util import is_hiragana, is_katakana
+from kanji_deck_creator.unicode.util import is_all_kana, non_kana_characters
 from kanji_deck_creator.data.kanji_data import WaniKaniSubject
 from kanji_deck_creator.kanjigraph.kanji_node import KanjiNode
 from kanji_deck_creator.data.kanji_data import KanjiData
@@ -19,12 +19,15 @@ class KanjiGraph:
     vocabs: Set[KanjiNode]
     kanji_data = KanjiData
 
-    def __init__(self, kanji_data):
+    def __init__(self, kanji_data, known_items=None):
         """
         :type kanji_data: KanjiData
+        :param known_items: container of (characters, KanjiType) the learner already knows. Those are never
+            added to the graph, so their subjects are never resolved. See deckbuilder.known_items.KnownItems
         """
         # keys in this dict are tuples of (character (str), KanjiType)
         self.kanji_data = kanji_data
+        self.known_items = known_items
         self.nodes = {}
         self.primitives = set()
         self.vocabs = set()
@@ -37,18 +40,37 @@ class KanjiGraph:
             # as the value.
             if not text:
                 text = str(component.subject_id)
-            dependency_node = self._add(text, component.subject_type)
+            dependency_node = self._add(text, component.subject_type, subject=component)
+            if dependency_node is None:
+                continue
             dependency_node.contained_in.add(node)
             node.dependencies.add(dependency_node)
 
         return node
 
+    def _precomputed_total_num_dependencies(self, node):
+        """
+        WaniKani subjects have their complexity precomputed in the dependency index. That only matches what is in the
+        graph if none of their dependencies were left out as known items.
+
+        :type node: KanjiNode
+        :return: the total number of dependencies, or None if it has to be counted in the graph
+        """
+        if self.known_items is not None or not node.resolved or type(node.subject) is not WaniKaniSubject:
+            return None
+        return self.kanji_data.dependency_index.complexity(node.subject.subject_id)
+
     def _update_total_num_dependencies(self, node):
         """
         Counts all the dependencies this node has and stores it in self.total_num_dependencies.
-        Will also update the counts of all of its dependencies.
+        Will also update the counts of all of its dependencies that are not WaniKani subjects.
         :type node: KanjiNode
         """
+        precomputed_total = self._precomputed_total_num_dependencies(node)
+        if precomputed_total is not None:
+            node.total_num_dependencies = precomputed_total
+            return
+
         total = 0
         for dependency in node.dependencies:
             if (dependency.value, dependency.type) not in self.nodes or node == dependency:
@@ -61,13 +83,13 @@ class KanjiGraph:
         """
         :type node: KanjiNode
         """
-        subject = self.kanji_data.get_subject(node.value, node.type)
+        subject = self._resolve(node)
         if type(subject) is not WaniKaniSubject:
-            for character in node.value:
-                if is_hiragana(character) or is_katakana(character):
-                    # Skip non-kanji characters (assuming input is all japanese)
-                    continue
+            # Skip non-kanji characters (assuming input is all japanese)
+            for character in non_kana_characters(node.value):
                 dependency_node = self._add(character, KanjiType.KANJI)
+                if dependency_node is None:
+                    continue
                 dependency_node.contained_in.add(node)
                 node.dependencies.add(dependency_node)
             return node
@@ -79,12 +101,30 @@ class KanjiGraph:
         :type node: KanjiNode
         """
         # TODO handle case where the kanji is not found in database
-        subject = self.kanji_data.get_subject(node.value, node.type)
+        subject = self._resolve(node)
         if not subject:
             log.warning("[{}] as a {} not found in kanji dataset".format(node.value, node.type))
             return node
         return self._add_subject_components(subject, node)
 
+    def _resolve(self, node):
+        """
+        :type node: KanjiNode
+        :return: the subject of the node, only looking it up if it has not been resolved yet
+        """
+        if not node.resolved:
+            node.resolve(self.kanji_data.get_subject(node.value, node.type))
+        return node.subject
+
+    def resolve_subjects(self, nodes: Iterable[KanjiNode]):
+        """
+        Resolves the subjects of all the nodes that have not been resolved yet (like compound words) in one batch.
+        """
+        unresolved = [node for node in nodes if not node.resolved]
+        subjects = self.kanji_data.get_subjects((node.value, node.type) for node in unresolved)
+        for node, subject in zip(unresolved, subjects):
+            node.resolve(subject)
+
     def add_compound_word(self, component_words):
         """
         Adds the compound word made up of component words. So if you want to add
@@ -92,7 +132,7 @@ class KanjiGraph:
 
         :type component_words: Iterable[str]
         :param component_words: list of words that make up the compound word.
-        :return: The added node, or None if it was not added because the word is invalid.
+        :return: The added node, or None if it was not added because the word is invalid or already known.
         """
         assert type(component_words) is not str, 'component_words should be an Iterable of strings, not a string'
 
@@ -107,14 +147,19 @@ class KanjiGraph:
             self.nodes[compound_word, KanjiType.VOCABULARY].count += 1
             return self.nodes[compound_word, KanjiType.VOCABULARY]
 
+        if self._is_known(compound_word, KanjiType.VOCABULARY):
+            return None
+
         # Create and register node in graph
-        compound_node = KanjiNode(compound_word, KanjiType.VOCABULARY)
+        compound_node = self._new_node(compound_word, KanjiType.VOCABULARY)
         self.nodes[compound_word, KanjiType.VOCABULARY] = compound_node
         self.vocabs.add(compound_node)
 
         for component_word in component_words:
             # Create/Register/Get component
             component_node = self._add(component_word, KanjiType.VOCABULARY)
+            if component_node is None:
+                continue
 
             # Set up connections between compound node and its components.
             compound_node.dependencies.add(component_node)
@@ -122,20 +167,29 @@ class KanjiGraph:
 
         return compound_node
 
-    def _add(self, word, word_type) -> KanjiNode:
+    def _add(self, word, word_type, count=1, subject=None) -> KanjiNode:
         """
         :param word: string to add
         :param word_type: the type of the word, defaults to vocab
+        :param count: how many occurrences of the word are being added
+        :param subject: the subject of the word if the caller already has it, so it does not get looked up again
 
         :type word: str
         :type word_type: KanjiType
-        :return: the added node
+        :type count: int
+        :return: the added node, or None if the learner already knows it
         """
         if (word, word_type) in self.nodes:
-            self.nodes[word, word_type].count += 1
+            self.nodes[word, word_type].count += count
             return self.nodes[word, word_type]
 
-        node = KanjiNode(word, word_type)
+        if self._is_known(word, word_type):
+            return None
+
+        node = self._new_node(word, word_type)
+        node.count = count
+        if subject is not None:
+            node.resolve(subject)
         self.nodes[word, word_type] = node
 
         if word_type == KanjiType.KANJI:
@@ -150,49 +204,108 @@ class KanjiGraph:
 
         return node
 
+    # noinspection PyMethodMayBeStatic
+    def _new_node(self, word, word_type) -> KanjiNode:
+        return KanjiNode(word, word_type)
+
+    def _is_known(self, word, word_type):
+        return self.known_items is not None and (word, word_type) in self.known_items
+
     def _has_no_kanji(self, word):
-        return all(is_katakana(i) or is_hiragana(i) for i in word)
+        return is_all_kana(word)
 
-    def add(self, word):
+    def add(self, word, count=1):
         """"
-        Return the added node or None if the word is not kanji
+        Return the added node or None if the word is not kanji or already known
+
+        :param count: how many occurrences of the word are being added, so pre-counted tokens only need to be
+            added once.
         """
         # The kanji graph is just for kanji stuff.
         if self._has_no_kanji(word):
             return None
 
-        return self._add(word, KanjiType.VOCABULARY)
+        return self._add(word, KanjiType.VOCABULARY, count)
 
-    def sort_by_complexity(self, nodes: Iterable[KanjiNode]) -> List[KanjiNode]:
+    def remove(self, word, count=1):
         """
-        Returns vocab words by order of dependencies, ascending
+        Undoes add(word, count). When the count of the word drops to 0 its node is removed, along with the
+        dependencies nothing else needs anymore.
+
+        :return: the node if it is still in the graph, otherwise None
         """
-        class ComplexitySortableNode(object):
-            kanji_node: KanjiNode
+        return self._remove(word, KanjiType.VOCABULARY, count)
 
-            def __init__(self, kanji_node):
-                self.kanji_node = kanji_node
+    def _remove(self, word, word_type, count=1):
+        if (word, word_type) not in self.nodes:
+            # Words that were never added (kana only or known items) are not in the graph either.
+            return None
+
+        node = self.nodes[word, word_type]
+        node.count -= count
+        if node.count > 0 or node.contained_in:
+            return node
 
-            def __lt__(self, other):
-                if self.kanji_node.total_num_dependencies != other.kanji_node.total_num_dependencies:
-                    return self.kanji_node.total_num_dependencies < other.kanji_node.total_num_dependencies
-                else:
-                    return self.kanji_node.value < other.kanji_node.value
+        del self.nodes[word, word_type]
+        {
+            KanjiType.PRIMITIVE: self.primitives,
+            KanjiType.KANJI: self.kanji,
+            KanjiType.VOCABULARY: self.vocabs
+        }[word_type].discard(node)
+
+        # A dependency's count includes 1 for every node that references it (it was added again along with each of
+        # them, see _add), which is taken back here.
+        for dependency in node.dependencies:
+            dependency.contained_in.discard(node)
+            self._remove(dependency.value, dependency.type)
+        node.dependencies = set()
+        return None
 
-        for node in nodes:
+    def sort_by_complexity(self, nodes: Iterable[KanjiNode]) -> List[KanjiNode]:
+        """
+        Returns vocab words by order of dependencies, ascending
+        """
+        node_list = list(nodes)
+        for node in node_list:
             self._update_total_num_dependencies(node)
-        sortable_node_list = list(ComplexitySortableNode(node) for node in nodes)
-        sortable_node_list.sort()
-        return [i.kanji_node for i in sortable_node_list]
+        # Sorting on a key tuple compares in C instead of calling a python __lt__ for every comparison.
+        node_list.sort(key=lambda i: (i.total_num_dependencies, i.value))
+        return node_list
 
-    # noinspection PyMethodMayBeStatic
-    def sort_by_frequency(self, nodes: Iterable[KanjiNode]) -> List[KanjiNode]:
+    def ordered_by_complexity(self, kanji_type=None) -> Iterator[KanjiNode]:
+        """
+        Iterates over all the nodes (or all the nodes of kanji_type) by order of dependencies, ascending
+        """
+        if kanji_type is None:
+            nodes = self.nodes.values()
+        else:
+            nodes = {
+                KanjiType.PRIMITIVE: self.primitives,
+                KanjiType.KANJI: self.kanji,
+                KanjiType.VOCABULARY: self.vocabs
+            }[kanji_type]
+        return iter(self.sort_by_complexity(nodes))
+
+    @staticmethod
+    def _frequency_key(nodes: List[KanjiNode], frequency_source=None):
+        if frequency_source is None:
+            return lambda i: i.count
+        # One batched lookup instead of one per comparison.
+        frequencies = frequency_source.counts(node.value for node in nodes)
+        return lambda i: frequencies.get(i.value, 0)
+
+    def sort_by_frequency(self, nodes: Iterable[KanjiNode], frequency_source=None) -> List[KanjiNode]:
         """
         Returns vocab words by order of frequency, descending
+
+        :param frequency_source: something with a counts(words) method like data.frequency_store.FrequencyStore, to
+            sort by the frequency in a whole corpus instead of the counts of the nodes
         """
         node_list = list(nodes)
-        node_list.sort(key=lambda i: i.count, reverse=True)
+        node_list.sort(key=self._frequency_key(node_list, frequency_source), reverse=True)
         return node_list
 
     def __repr__(self):
-        return '\n'.join(str(node) for node in self.nodes.values())
+        # Printing every node is of no use for graphs of any size, see graph_export for looking at the nodes.
+        return '<{}: {} radicals, {} kanji, {} vocab>'.format(
+            type(self).__name__, len(self.primitives), len(self.kanji), len(self.vocabs))
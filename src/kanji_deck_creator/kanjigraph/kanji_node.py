@@ -13,6 +13,10 @@ class KanjiNode(object):
     contained_in: Set[Any]  # Set[KanjiNode]
     total_num_dependencies: int
     count: int
+    # The subject for this node, looked up once when the node is added to the graph. None either means it has not
+    # been looked up yet or that no data could be found for it, which is what resolved tells apart.
+    subject: Any  # Optional[Subject]
+    resolved: bool
 
     def __init__(self, value, node_type):
         """
@@ -28,6 +32,15 @@ class KanjiNode(object):
         self.contained_in = set()
         self.total_num_dependencies = 0
         self.count = 1
+        self.subject = None
+        self.resolved = False
+
+    def resolve(self, subject):
+        """
+        :param subject: the subject for this node, or None if it could not be found
+        """
+        self.subject = subject
+        self.resolved = True
 
     def is_encoded(self):
         return re.match(r'[A-Za-z0-9]+[A-Za-z0-9\-]+', self.value) is not None
@@ -0,0 +1,394 @@
+import logging
+import os
+import sqlite3
+import tempfile
+
+from collections import OrderedDict
+from typing import Iterator, List, Optional, Tuple
+
+from kanji_deck_creator.data.kanji_data import WaniKaniSubject
+from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
+from kanji_deck_creator.kanjigraph.kanji_node import KanjiNode
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS nodes (
+    value TEXT NOT NULL,
+    type TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    total_num_dependencies INTEGER,
+    subject_source TEXT NOT NULL,
+    subject_id INTEGER,
+    PRIMARY KEY (value, type)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS edges (
+    value TEXT NOT NULL,
+    type TEXT NOT NULL,
+    dependency_value TEXT NOT NULL,
+    dependency_type TEXT NOT NULL,
+    PRIMARY KEY (value, type, dependency_value, dependency_type)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS edges_by_dependency ON edges (dependency_value, dependency_type);
+CREATE INDEX IF NOT EXISTS nodes_by_complexity ON nodes (type, total_num_dependencies, value);
+'''
+
+# How a node's subject is stored, so nodes loaded back from disk do not have to be looked up again. Jisho subjects
+# are stored as unresolved, the responses are cached by JishoSubject so resolving them again does not go to Jisho.
+_UNRESOLVED = 'unresolved'
+_NOT_FOUND = 'not_found'
+_WANIKANI = 'wanikani'
+
+
+class _DependencySet(set):
+    """
+    The dependencies of a node in a SqliteKanjiGraph. Adding to it also records the edge on disk.
+    """
+    def __init__(self, graph, node, dependencies=()):
+        super().__init__(dependencies)
+        self._graph = graph
+        self._node = node
+
+    def add(self, dependency):
+        if dependency not in self:
+            self._graph._record_edge(self._node, dependency)
+        super().add(dependency)
+
+
+class _ContainedInView(object):
+    """
+    The nodes that contain a node in a SqliteKanjiGraph. Common kanji are contained in thousands of words, so these
+    are read from disk when needed instead of being kept on the node. Edges are recorded and deleted from the
+    dependency side, which makes add() and discard() no-ops.
+    """
+    def __init__(self, graph, node):
+        self._graph = graph
+        self._node = node
+
+    def add(self, _):
+        pass
+
+    def discard(self, _):
+        pass
+
+    def __iter__(self):
+        return self._graph._iter_contained_in(self._node)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, item):
+        return any(item == node for node in self)
+
+
+class _NodeTypeView(object):
+    """
+    Stands in for the primitives/kanji/vocabs sets of a KanjiGraph. The type is a column on disk so there is
+    nothing to keep in memory.
+    """
+    def __init__(self, graph, kanji_type: KanjiType):
+        self._graph = graph
+        self._kanji_type = kanji_type
+
+    def add(self, _):
+        pass
+
+    def discard(self, _):
+        pass
+
+    def __iter__(self):
+        return self._graph._iter_nodes(self._kanji_type)
+
+    def __len__(self):
+        return self._graph._count_nodes(self._kanji_type)
+
+    def __contains__(self, node):
+        return node.type == self._kanji_type and (node.value, node.type) in self._graph.nodes
+
+
+class _NodeMapping(object):
+    """
+    Stands in for the nodes dict of a KanjiGraph, backed by the hot cache and the database.
+    """
+    def __init__(self, graph):
+        self._graph = graph
+
+    def __contains__(self, key):
+        return self._graph._get_node(*key) is not None
+
+    def __getitem__(self, key):
+        node = self._graph._get_node(*key)
+        if node is None:
+            raise KeyError(key)
+        return node
+
+    def __setitem__(self, key, node):
+        self._graph._cache_node(node)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._graph._delete_node(*key)
+
+    def __len__(self):
+        return self._graph._count_nodes()
+
+    def __iter__(self):
+        return ((node.value, node.type) for node in self._graph._iter_nodes())
+
+    def values(self):
+        return self._graph._iter_nodes()
+
+
+class SqliteKanjiGraph(KanjiGraph):
+    """
+    A KanjiGraph that keeps its nodes, edges and counts in an SQLite database, so graphs for whole libraries
+    do not have to fit in memory. Recently used nodes are kept in a hot cache and are written to disk in batches
+    when they are evicted or when the graph is flushed.
+
+    Edges are only ever added to nodes while they are being created, which is what makes it safe to write nodes
+    back lazily.
+    """
+    def __init__(self, kanji_data, database_path: Optional[str] = None, cache_size=10000, batch_size=5000,
+                 known_items=None, clear=False):
+        """
+        :param database_path: where to store the graph. Defaults to a temporary file that is removed on close().
+        :param clear: start from an empty graph, dropping what is in the database at database_path
+        :param cache_size: how many nodes are kept in memory.
+        :param batch_size: how many edges (and totals) are buffered before they are written.
+        """
+        super().__init__(kanji_data, known_items=known_items)
+
+        self._temporary_path = None
+        if database_path is None:
+            file_descriptor, database_path = tempfile.mkstemp(suffix='.sqlite3', prefix='kanji_graph_')
+            os.close(file_descriptor)
+            self._temporary_path = database_path
+        elif clear and os.path.exists(database_path):
+            os.remove(database_path)
+
+        self._connection = sqlite3.connect(database_path)
+        # The database is a scratch space for the build, durability is not worth the fsyncs.
+        self._connection.execute('PRAGMA synchronous = OFF')
+        self._connection.execute('PRAGMA journal_mode = MEMORY')
+        self._connection.executescript(_SCHEMA)
+
+        self._cache: 'OrderedDict[Tuple[str, KanjiType], KanjiNode]' = OrderedDict()
+        self._cache_size = cache_size
+        self._pending_edges: List[Tuple[str, str, str, str]] = []
+        self._batch_size = batch_size
+        # Totals can be computed on nodes that were already evicted, so they are written separately.
+        self._unsaved_totals: List[Tuple[int, str, str]] = []
+
+        self.nodes = _NodeMapping(self)
+        self.primitives = _NodeTypeView(self, KanjiType.PRIMITIVE)
+        self.kanji = _NodeTypeView(self, KanjiType.KANJI)
+        self.vocabs = _NodeTypeView(self, KanjiType.VOCABULARY)
+
+    def _new_node(self, word, word_type) -> KanjiNode:
+        node = KanjiNode(word, word_type)
+        # Not counted yet, see _update_total_num_dependencies.
+        node.total_num_dependencies = None
+        node.dependencies = _DependencySet(self, node)
+        node.contained_in = _ContainedInView(self, node)
+        return node
+
+    def _record_edge(self, node: KanjiNode, dependency: KanjiNode):
+        self._pending_edges.append((node.value, node.type.value, dependency.value, dependency.type.value))
+        if len(self._pending_edges) >= self._batch_size:
+            self._flush_edges()
+
+    def _flush_totals(self):
+        if self._unsaved_totals:
+            self._connection.executemany('UPDATE nodes SET total_num_dependencies = ? WHERE value = ? AND type = ?',
+                                         self._unsaved_totals)
+            self._unsaved_totals = []
+
+    def _flush_edges(self):
+        if self._pending_edges:
+            self._connection.executemany('INSERT OR IGNORE INTO edges VALUES (?, ?, ?, ?)', self._pending_edges)
+            self._pending_edges = []
+
+    @staticmethod
+    def _subject_columns(node: KanjiNode):
+        if node.resolved and node.subject is None:
+            return _NOT_FOUND, None
+        if node.resolved and type(node.subject) is WaniKaniSubject:
+            return _WANIKANI, int(node.subject.subject_id)
+        # Jisho subjects and placeholders are looked up again when the node is loaded back.
+        return _UNRESOLVED, None
+
+    def _node_row(self, node: KanjiNode):
+        return (node.value, node.type.value, node.count, node.total_num_dependencies) + self._subject_columns(node)
+
+    def _write_nodes(self, nodes):
+        self._connection.executemany('INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?, ?, ?)',
+                                     [self._node_row(node) for node in nodes])
+
+    def _cache_node(self, node: KanjiNode):
+        key = (node.value, node.type)
+        self._cache[key] = node
+        self._cache.move_to_end(key)
+
+        if len(self._cache) > self._cache_size:
+            # Evict in batches so writes go through executemany instead of one row at a time.
+            eviction_count = min(max(1, self._cache_size // 10), len(self._cache) - 1)
+            self._write_nodes([self._cache.popitem(last=False)[1] for _ in range(eviction_count)])
+
+    def _get_node(self, value, kanji_type: KanjiType) -> Optional[KanjiNode]:
+        key = (value, kanji_type)
+        node = self._cache.get(key)
+        if node is not None:
+            self._cache.move_to_end(key)
+            return node
+
+        row = self._connection.execute(
+            'SELECT count, total_num_dependencies, subject_source, subject_id FROM nodes WHERE value = ? AND type = ?',
+            (value, kanji_type.value)).fetchone()
+        if row is None:
+            return None
+        return self._load_node(value, kanji_type, *row)
+
+    def _load_node(self, value, kanji_type: KanjiType, count, total, subject_source, subject_id) -> KanjiNode:
+        node = KanjiNode(value, kanji_type)
+        node.count = count
+        node.total_num_dependencies = total
+
+        if subject_source == _WANIKANI:
+            node.resolve(WaniKaniSubject(subject_id, self.kanji_data))
+        elif subject_source == _NOT_FOUND:
+            node.resolve(None)
+
+        self._flush_edges()
+        dependency_keys = self._connection.execute(
+            'SELECT dependency_value, dependency_type FROM edges WHERE value = ? AND type = ?',
+            (value, kanji_type.value)).fetchall()
+        dependencies = [self._get_node(dependency_value, KanjiType.from_string(dependency_type))
+                        for dependency_value, dependency_type in dependency_keys]
+
+        node.dependencies = _DependencySet(self, node, dependencies)
+        node.contained_in = _ContainedInView(self, node)
+        self._cache_node(node)
+        return node
+
+    def _delete_node(self, value, kanji_type: KanjiType):
+        """
+        Deletes the node along with the edges to its dependencies, from the cache and the database.
+        """
+        self._flush_edges()
+        self._cache.pop((value, kanji_type), None)
+        self._connection.execute('DELETE FROM nodes WHERE value = ? AND type = ?', (value, kanji_type.value))
+        self._connection.execute('DELETE FROM edges WHERE value = ? AND type = ?', (value, kanji_type.value))
+
+    def _iter_contained_in(self, node: KanjiNode) -> Iterator[KanjiNode]:
+        self._flush_edges()
+        keys = self._connection.execute(
+            'SELECT value, type FROM edges WHERE dependency_value = ? AND dependency_type = ?',
+            (node.value, node.type.value)).fetchall()
+        for value, kanji_type in keys:
+            yield self._get_node(value, KanjiType.from_string(kanji_type))
+
+    def _iter_keys(self, order_columns: Tuple[str, ...], kanji_type: Optional[KanjiType] = None,
+                   page_size=1000) -> Iterator[Tuple[str, KanjiType]]:
+        """
+        Pages through the (value, type) keys of the nodes in the given order using keyset pagination. Nodes that
+        get evicted while iterating are written to the same table, so each page is read completely before anything
+        else touches the database.
+
+        :param order_columns: columns to order by, must end with value and type so the ordering is unique.
+        """
+        columns = ', '.join(order_columns)
+        last = None
+        while True:
+            filters = []
+            parameters = []
+            if kanji_type is not None:
+                filters.append('type = ?')
+                parameters.append(kanji_type.value)
+            if last is not None:
+                filters.append('({}) > ({})'.format(columns, ', '.join('?' for _ in last)))
+                parameters.extend(last)
+
+            query = 'SELECT {columns} FROM nodes WHERE {where} ORDER BY {columns} LIMIT ?'.format(
+                columns=columns, where=' AND '.join(filters) or '1')
+            rows = self._connection.execute(query, parameters + [page_size]).fetchall()
+            if not rows:
+                return
+
+            for row in rows:
+                yield row[-2], KanjiType.from_string(row[-1])
+            last = rows[-1]
+
+    def _iter_nodes(self, kanji_type: Optional[KanjiType] = None) -> Iterator[KanjiNode]:
+        self.flush()
+        for key in self._iter_keys(('value', 'type'), kanji_type):
+            yield self.nodes[key]
+
+    def _count_nodes(self, kanji_type: Optional[KanjiType] = None) -> int:
+        self.flush()
+        if kanji_type is None:
+            return self._connection.execute('SELECT COUNT(*) FROM nodes').fetchone()[0]
+        return self._connection.execute('SELECT COUNT(*) FROM nodes WHERE type = ?',
+                                        (kanji_type.value,)).fetchone()[0]
+
+    def _update_total_num_dependencies(self, node):
+        """
+        Same count as KanjiGraph, but only done once per node: it is kept on the node and in its row. Edges only get
+        added to nodes while they are created, so a node's total never changes once it is known.
+        """
+        if node.total_num_dependencies is not None:
+            return
+
+        total = self._precomputed_total_num_dependencies(node)
+        if total is None:
+            total = 0
+            for dependency in node.dependencies:
+                if node == dependency:
+                    continue
+                self._update_total_num_dependencies(dependency)
+                total += dependency.total_num_dependencies + 1
+        node.total_num_dependencies = total
+        self._unsaved_totals.append((total, node.value, node.type.value))
+        if len(self._unsaved_totals) >= self._batch_size:
+            self._flush_totals()
+
+    def ordered_by_complexity(self, kanji_type=None) -> Iterator[KanjiNode]:
+        """
+        Streams the nodes by order of dependencies, ascending. The ordering is done by the database, so only the
+        hot cache is ever in memory.
+        """
+        for node in self._iter_nodes():
+            self._update_total_num_dependencies(node)
+        self.flush()
+
+        for key in self._iter_keys(('total_num_dependencies', 'value', 'type'), kanji_type):
+            node = self.nodes[key]
+            self._update_total_num_dependencies(node)
+            yield node
+
+    def flush(self):
+        """
+        Writes everything that is only in memory to the database.
+        """
+        self._flush_edges()
+        self._write_nodes(self._cache.values())
+        self._flush_totals()
+        self._connection.commit()
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+        if self._temporary_path:
+            os.remove(self._temporary_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,145 @@
+import math
+import random
+import threading
+import time
+
+from typing import Dict, List, Optional
+
+from kanji_deck_creator.data.kanji_data import KanjiData, JishoSubject
+from kanji_deck_creator.deckbuilder.deck_builder import AnkiPackageBuilder
+from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+from kanji_deck_creator.loadtest.jisho_stub import JishoStubConfig, JishoStubServer, StubJishoClient
+from kanji_deck_creator.parser.tokenizer import Tokenizer
+
+
+class TimedJishoClient(StubJishoClient):
+    """
+    Records how long every search took and how many failed.
+    """
+    def __init__(self, base_url: str):
+        super().__init__(base_url)
+        self.latencies = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def search(self, keyword):
+        start = time.perf_counter()
+        try:
+            return super().search(keyword)
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+
+
+class WhitespaceTokenizer(Tokenizer):
+    """
+    The generated corpora are already split into words. Skipping the morphological analysis keeps the measurements
+    about lookups and deck building, and makes the miss rate exact.
+    """
+    def _tokenize(self, document) -> List[str]:
+        return document.split()
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile, 0 for no values.
+
+    :param fraction: 0.5 for the median, 0.99 for p99 and so on
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def make_corpus(kanji_data: KanjiData, num_words: int, miss_rate: float, seed=0) -> str:
+    """
+    Makes up a corpus of num_words words of which a miss_rate fraction is not in WaniKani, so it has to be looked up
+    on Jisho. Missing words are made by pairing up WaniKani kanji into compounds WaniKani does not have.
+    """
+    rng = random.Random(seed)
+    vocabulary = sorted(kanji_data.character_lookup[KanjiType.VOCABULARY.value])
+    kanji = sorted(kanji_data.character_lookup[KanjiType.KANJI.value])
+    if not vocabulary or len(kanji) < 2:
+        raise ValueError('The subject data needs vocabulary and at least two kanji to make a corpus')
+
+    known_vocabulary = set(vocabulary)
+    words = []
+    for _ in range(num_words):
+        if rng.random() < miss_rate:
+            word = rng.choice(kanji) + rng.choice(kanji)
+            while word in known_vocabulary:
+                word = rng.choice(kanji) + rng.choice(kanji)
+        else:
+            word = rng.choice(vocabulary)
+        words.append(word)
+    return ' '.join(words)
+
+
+def run_load_test(kanji_data: KanjiData, config: JishoStubConfig, num_words=1000, miss_rate=0.1, workers=None,
+                  seed=0) -> Dict[str, float]:
+    """
+    Builds a deck out of a generated corpus with Jisho lookups going to a local JishoStubServer.
+
+    :return: the measurements, see the keys of the dict
+    """
+    corpus = make_corpus(kanji_data, num_words, miss_rate, seed=seed)
+
+    with JishoStubServer(config) as server:
+        client = TimedJishoClient(server.base_url)
+        # Lookups of one run must not be answered from the cache filled by the previous one.
+        JishoSubject.clear_cache()
+        run_kanji_data = KanjiData(kanji_data.data, jisho_client=client)
+        builder = AnkiPackageBuilder(tokenizer=WhitespaceTokenizer(), kanji_graph=KanjiGraph(run_kanji_data))
+
+        start = time.perf_counter()
+        package = builder.build(corpus, 'load_test', workers=workers)
+        build_seconds = time.perf_counter() - start
+
+    num_notes = sum(len(deck.notes) for deck in package.decks)
+    return {
+        'words': num_words,
+        'miss_rate': miss_rate,
+        'workers': workers or 1,
+        'notes': num_notes,
+        'build_seconds': build_seconds,
+        'notes_per_second': num_notes / build_seconds if build_seconds else 0.0,
+        'lookups': len(client.latencies),
+        'lookup_errors': client.errors,
+        'server_requests': server.request_count,
+        'lookup_p50': percentile(client.latencies, 0.5),
+        'lookup_p90': percentile(client.latencies, 0.9),
+        'lookup_p99': percentile(client.latencies, 0.99),
+        'lookup_max': max(client.latencies, default=0.0),
+    }
+
+
+def format_report(results: List[Dict[str, float]], title: Optional[str] = None) -> str:
+    """
+    Lays the results of several run_load_test calls out as a table.
+    """
+    columns = [
+        ('miss rate', 'miss_rate', '{:.0%}'), ('workers', 'workers', '{}'), ('notes', 'notes', '{}'),
+        ('build s', 'build_seconds', '{:.2f}'), ('notes/s', 'notes_per_second', '{:.1f}'),
+        ('lookups', 'lookups', '{}'), ('errors', 'lookup_errors', '{}'),
+        ('p50 ms', 'lookup_p50', '{:.1f}'), ('p90 ms', 'lookup_p90', '{:.1f}'),
+        ('p99 ms', 'lookup_p99', '{:.1f}'), ('max ms', 'lookup_max', '{:.1f}'),
+    ]
+    rows = [[header for header, _, _ in columns]]
+    for result in results:
+        rows.append([
+            value_format.format(result[key] * 1000 if key.startswith('lookup_') and key != 'lookup_errors'
+                                else result[key])
+            for _, key, value_format in columns
+        ])
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    lines = [title] if title else []
+    lines += ['  '.join(value.rjust(width) for value, width in zip(row, widths)) for row in rows]
+    return '\n'.join(lines)
@@ -0,0 +1,153 @@
+import json
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from jisho import Client as JishoClient
+
+
+class StubJishoClient(JishoClient):
+    """
+    A pyjisho client that talks to a JishoStubServer (or any other server with Jisho's api) instead of jisho.org
+    """
+    def __init__(self, base_url: str):
+        super().__init__()
+        self._base_url = base_url
+
+
+class JishoStubConfig(object):
+    """
+    How the stub server behaves.
+    """
+    def __init__(self, latency=0.05, latency_jitter=0.02, error_rate=0.0, not_found_rate=0.0,
+                 requests_per_second: Optional[float] = None, seed=0):
+        """
+        :param latency: seconds every response is delayed by on average
+        :param latency_jitter: the delay is uniformly spread by this many seconds around latency
+        :param error_rate: fraction of requests answered with a 500
+        :param not_found_rate: fraction of requests answered with an empty result, like jisho does for unknown words
+        :param requests_per_second: if set, requests over this rate are answered with a 429 like a rate limiter
+        :param seed: seed for the random latencies and errors, so runs can be repeated
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.not_found_rate = not_found_rate
+        self.requests_per_second = requests_per_second
+        self.seed = seed
+
+
+def search_response(keyword: str):
+    """
+    A response in the format of jisho's /search/words, with the fields JishoSubject reads.
+    """
+    return {
+        'meta': {'status': 200},
+        'data': [{
+            'slug': keyword,
+            'is_common': True,
+            'japanese': [{'word': keyword, 'reading': 'よみ'}],
+            'senses': [{'english_definitions': ['stub definition of ' + keyword], 'parts_of_speech': ['Noun']}],
+        }]
+    }
+
+
+class _JishoStubHandler(BaseHTTPRequestHandler):
+    server: 'JishoStubServer'
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != '/api/v1/search/words':
+            self._respond(404, {'meta': {'status': 404}})
+            return
+
+        status, body = self.server.next_response(parse_qs(url.query).get('keyword', [''])[0])
+        self._respond(status, body)
+
+    def _respond(self, status, body):
+        content = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        # Thousands of requests per run would drown everything else on stderr.
+        pass
+
+
+class JishoStubServer(ThreadingMixIn, HTTPServer):
+    """
+    A local stand-in for the jisho.org api with configurable latency, errors and rate limiting, so lookups can be
+    load tested without touching the network. Every keyword is found (unless not_found_rate says otherwise), the
+    definitions are made up.
+
+    Serves in a background thread while used as a context manager:
+
+        with JishoStubServer(JishoStubConfig(latency=0.1)) as server:
+            kanji_data = KanjiData(data, jisho_client=StubJishoClient(server.base_url))
+    """
+    daemon_threads = True
+
+    def __init__(self, config: JishoStubConfig = None, port=0):
+        """
+        :param port: 0 picks a free port
+        """
+        super().__init__(('127.0.0.1', port), _JishoStubHandler)
+        self.config = config or JishoStubConfig()
+        self.request_count = 0
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._tokens = self.config.requests_per_second
+        self._last_refill = time.monotonic()
+        self._thread = None
+
+    @property
+    def base_url(self):
+        return 'http://{}:{}/api/v1'.format(*self.server_address[:2])
+
+    def _take_rate_limit_token(self) -> bool:
+        # Token bucket holding one second worth of requests.
+        rate = self.config.requests_per_second
+        now = time.monotonic()
+        self._tokens = min(rate, self._tokens + (now - self._last_refill) * rate)
+        self._last_refill = now
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def next_response(self, keyword: str):
+        """
+        :return: (http status, json body) for a search for keyword, after waiting out the latency
+        """
+        with self._lock:
+            self.request_count += 1
+            limited = self.config.requests_per_second is not None and not self._take_rate_limit_token()
+            delay = max(0.0, self.config.latency + self._random.uniform(-1, 1) * self.config.latency_jitter)
+            roll = self._random.random()
+
+        time.sleep(delay)
+        if limited:
+            return 429, {'meta': {'status': 429, 'error_message': 'rate limited'}}
+        if roll < self.config.error_rate:
+            return 500, {'meta': {'status': 500, 'error_message': 'stub error'}}
+        if roll < self.config.error_rate + self.config.not_found_rate:
+            return 200, {'meta': {'status': 200}, 'data': []}
+        return 200, search_response(keyword)
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
@@ -0,0 +1,159 @@
+import hashlib
+import logging
+import os
+import pickle
+
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+class AhoCorasickAutomaton(object):
+    """
+    Finds every occurrence of a fixed set of words in a single pass over the text.
+
+    States are stored as plain lists indexed by state number so the whole automaton can be pickled
+    and loaded back without rebuilding it.
+    """
+    LONGEST = 'longest'
+    OVERLAPPING = 'overlapping'
+
+    _CACHE_FORMAT_VERSION = 1
+
+    goto: List[Dict[str, int]]
+    fail: List[int]
+    # Length of the word that ends at the state, 0 if no word ends there.
+    word_length: List[int]
+    # Closest state along the fail links that ends a word, 0 if there is none.
+    output_link: List[int]
+
+    def __init__(self, words: Iterable[str]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.word_length = [0]
+        self.output_link = [0]
+
+        words = sorted(set(word for word in words if word))
+        for word in words:
+            self._insert(word)
+        self._link()
+
+        self.signature = self.signature_for(words)
+
+    @staticmethod
+    def signature_for(words: Iterable[str]) -> str:
+        """
+        Identifies the word set an automaton was built from, so stale caches can be detected.
+        """
+        sha = hashlib.sha1()
+        for word in sorted(set(words)):
+            sha.update(word.encode('utf-8'))
+            sha.update(b'\n')
+        return sha.hexdigest()
+
+    def _insert(self, word):
+        state = 0
+        for character in word:
+            next_state = self.goto[state].get(character)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.word_length.append(0)
+                self.output_link.append(0)
+                self.goto[state][character] = next_state
+            state = next_state
+        self.word_length[state] = len(word)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self.goto[state].items():
+                queue.append(next_state)
+
+                fallback = self.fail[state]
+                while fallback and character not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                fail_state = self.goto[fallback].get(character, 0)
+                self.fail[next_state] = fail_state if fail_state != next_state else 0
+
+                fail_state = self.fail[next_state]
+                self.output_link[next_state] = fail_state if self.word_length[fail_state] \
+                    else self.output_link[fail_state]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        Yields (start, end) for every occurrence of every word, in order of end position.
+        """
+        goto = self.goto
+        fail = self.fail
+        word_length = self.word_length
+        output_link = self.output_link
+
+        state = 0
+        for index, character in enumerate(text):
+            while state and character not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(character, 0)
+
+            end = index + 1
+            match_state = state if word_length[state] else output_link[state]
+            while match_state:
+                yield end - word_length[match_state], end
+                match_state = output_link[match_state]
+
+    def find(self, text: str, policy=LONGEST) -> List[Tuple[int, int]]:
+        """
+        :param policy: LONGEST returns non overlapping matches, preferring the leftmost and then the longest
+            match. OVERLAPPING returns every match.
+        :return: list of (start, end) sorted by start
+        """
+        if policy == self.OVERLAPPING:
+            return sorted(self.iter_matches(text))
+        elif policy != self.LONGEST:
+            raise ValueError('policy must be one of {} or {}'.format(self.LONGEST, self.OVERLAPPING))
+
+        longest_from = {}
+        for start, end in self.iter_matches(text):
+            if end > longest_from.get(start, start):
+                longest_from[start] = end
+
+        result = []
+        covered_until = 0
+        for start in sorted(longest_from):
+            if start >= covered_until:
+                result.append((start, longest_from[start]))
+                covered_until = longest_from[start]
+        return result
+
+    @classmethod
+    def load_or_build(cls, words: Iterable[str], cache_path=None):
+        """
+        Loads the automaton from cache_path if it was built from the same words, otherwise builds it and
+        stores it there.
+        """
+        words = list(words)
+        if not cache_path:
+            return cls(words)
+
+        signature = cls.signature_for(words)
+        if os.path.isfile(cache_path):
+            try:
+                with open(cache_path, 'rb') as fp:
+                    version, automaton = pickle.load(fp)
+                if version == cls._CACHE_FORMAT_VERSION and automaton.signature == signature:
+                    return automaton
+            except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+                log.warning('Could not read cached automaton at {}, rebuilding it'.format(cache_path))
+
+        automaton = cls(words)
+        try:
+            with open(cache_path, 'wb') as fp:
+                pickle.dump((cls._CACHE_FORMAT_VERSION, automaton), fp, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            log.warning('Could not cache automaton at {}'.format(cache_path))
+        return automaton
@@ -0,0 +1,233 @@
+import codecs
+import os
+import posixpath
+import re
+import zipfile
+
+from html.parser import HTMLParser
+from typing import IO, Iterable, Iterator, List, Tuple
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+
+# Text in these elements is not part of the document.
+_SKIPPED_ELEMENTS = {'script', 'style', 'head', 'title'}
+# <rt> holds ruby readings (the furigana of 北風 in <ruby>北風<rt>きたかぜ</rt></ruby>) and <rp> the fallback
+# parentheses around them. Their end tags are optional, so they also end at the next <rt>/<rp>, at </ruby> and at
+# the end of a paragraph.
+_RUBY_TEXT_ELEMENTS = {'rt', 'rp'}
+# Elements that end a paragraph, so words on both sides of them are never joined.
+_BLOCK_ELEMENTS = {
+    'p', 'div', 'br', 'li', 'tr', 'td', 'th', 'dt', 'dd', 'blockquote', 'section', 'article', 'aside',
+    'header', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'pre', 'figcaption', 'body',
+}
+
+# The encoding an (X)HTML document declares in a BOM, its XML declaration or a <meta> charset.
+_BOMS = [(codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+_DECLARED_ENCODING = re.compile(
+    rb"""<\?xml[^>]*?encoding\s*=\s*["']([\w.:-]+)|<meta[^>]*?charset\s*=\s*["']?([\w.:-]+)""", re.IGNORECASE)
+# Declarations have to be in the first 1024 bytes of an HTML document.
+_SNIFF_SIZE = 1024
+
+_CONTAINER_NAMESPACE = {'container': 'urn:oasis:names:tc:opendocument:xmlns:container'}
+_OPF_NAMESPACE = {'opf': 'http://www.idpf.org/2007/opf'}
+
+# How much text is handed to the tokenizer at once. Large enough that the per-call overhead of the tokenizer does
+# not matter, small enough that a whole book is never in memory.
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class RubyStrippingHTMLParser(HTMLParser):
+    """
+    Extracts the text of (X)HTML as it is fed, one paragraph per line, leaving out ruby readings.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._skip_depth = 0
+        self._in_ruby_text = False
+        self._paragraph = []
+        self._paragraphs = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _RUBY_TEXT_ELEMENTS:
+            self._in_ruby_text = True
+        elif tag in _SKIPPED_ELEMENTS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_ELEMENTS:
+            self._end_paragraph()
+
+    def handle_startendtag(self, tag, attrs):
+        # Self closing tags (<br/>, <rt/>) do not open anything that has to be closed again.
+        if tag in _BLOCK_ELEMENTS:
+            self._end_paragraph()
+
+    def handle_endtag(self, tag):
+        if tag in _RUBY_TEXT_ELEMENTS or tag == 'ruby':
+            self._in_ruby_text = False
+        elif tag in _SKIPPED_ELEMENTS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_ELEMENTS:
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if not self._skip_depth and not self._in_ruby_text:
+            self._paragraph.append(data)
+
+    def _end_paragraph(self):
+        self._in_ruby_text = False
+        paragraph = ''.join(self._paragraph).strip()
+        self._paragraph = []
+        if paragraph:
+            self._paragraphs.append(paragraph)
+
+    def close(self):
+        super().close()
+        self._end_paragraph()
+
+    def pop_paragraphs(self) -> List[str]:
+        """
+        :return: the paragraphs that were completed since the last call
+        """
+        paragraphs = self._paragraphs
+        self._paragraphs = []
+        return paragraphs
+
+
+def _chunk_paragraphs(paragraphs: Iterable[str], chunk_size: int) -> Iterator[str]:
+    """
+    Joins paragraphs into chunks of about chunk_size characters. Paragraphs are never split.
+    """
+    chunk = []
+    length = 0
+    for paragraph in paragraphs:
+        chunk.append(paragraph)
+        length += len(paragraph) + 1
+        if length >= chunk_size:
+            yield '\n'.join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield '\n'.join(chunk)
+
+
+def sniff_html_encoding(head: bytes, default='utf-8') -> str:
+    """
+    :param head: the first bytes of an (X)HTML document
+    :return: the encoding the document declares, default if it does not declare one Python knows
+    """
+    for bom, encoding in _BOMS:
+        if head.startswith(bom):
+            return encoding
+
+    match = _DECLARED_ENCODING.search(head[:_SNIFF_SIZE])
+    if match is None:
+        return default
+    encoding = (match.group(1) or match.group(2)).decode('ascii')
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return default
+    return encoding
+
+
+def _iter_html_paragraphs(fp: IO[bytes], read_size=DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    parser = RubyStrippingHTMLParser()
+    data = fp.read(max(read_size, _SNIFF_SIZE))
+    # An incremental decoder so multi-byte characters split between two reads are decoded correctly.
+    decoder = codecs.getincrementaldecoder(sniff_html_encoding(data))(errors='replace')
+    while data:
+        parser.feed(decoder.decode(data))
+        yield from parser.pop_paragraphs()
+        data = fp.read(read_size)
+    parser.feed(decoder.decode(b'', final=True))
+    parser.close()
+    yield from parser.pop_paragraphs()
+
+
+def iter_html_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Streams the text of an HTML file without ruby readings, in chunks of whole paragraphs.
+    """
+    with open(file_path, 'rb') as fp:
+        yield from _chunk_paragraphs(_iter_html_paragraphs(fp), chunk_size)
+
+
+def epub_spine(epub: zipfile.ZipFile) -> List[str]:
+    """
+    :return: the names of the chapter documents in the archive, in reading order
+    """
+    container = ElementTree.fromstring(epub.read('META-INF/container.xml'))
+    rootfile = container.find('container:rootfiles/container:rootfile', _CONTAINER_NAMESPACE)
+    if rootfile is None:
+        raise ValueError('The EPUB container does not name a package document')
+    opf_path = rootfile.get('full-path')
+
+    package = ElementTree.fromstring(epub.read(opf_path))
+    opf_folder = posixpath.dirname(opf_path)
+    manifest = {
+        item.get('id'): (item.get('href'), item.get('media-type'))
+        for item in package.findall('opf:manifest/opf:item', _OPF_NAMESPACE)
+    }
+
+    chapters = []
+    for itemref in package.findall('opf:spine/opf:itemref', _OPF_NAMESPACE):
+        href, media_type = manifest.get(itemref.get('idref'), (None, None))
+        if href is None or media_type not in ('application/xhtml+xml', 'text/html'):
+            continue
+        chapters.append(posixpath.normpath(posixpath.join(opf_folder, unquote(href))))
+    return chapters
+
+
+def iter_epub_chapters(file_path, chunk_size=DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, Iterator[str]]]:
+    """
+    Streams the chapters of an EPUB in reading order as (chapter name, chunks of its text without ruby readings).
+    Chapters are read straight out of the archive, so the chunks of a chapter have to be used up before moving on
+    to the next chapter.
+    """
+    with zipfile.ZipFile(file_path) as epub:
+        for chapter in epub_spine(epub):
+            with epub.open(chapter) as fp:
+                yield (posixpath.splitext(posixpath.basename(chapter))[0],
+                       _chunk_paragraphs(_iter_html_paragraphs(fp), chunk_size))
+
+
+def iter_epub_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Streams the text of an EPUB chapter by chapter, in reading order and without ruby readings. Chapters are read
+    straight out of the archive, so neither the book nor a whole chapter is ever in memory at once.
+    """
+    for _, chunks in iter_epub_chapters(file_path, chunk_size):
+        yield from chunks
+
+
+def iter_text_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Streams a utf-8 text file in chunks of whole lines.
+    """
+    with open(file_path, 'rt', encoding='utf-8') as fp:
+        yield from _chunk_paragraphs((line.rstrip('\n') for line in fp), chunk_size)
+
+
+def iter_source_chunks(file_path, chunk_size=DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Streams the text of a source file in chunks that can be tokenized one at a time. The format is picked by the
+    file extension: .epub, .html/.htm/.xhtml or plain utf-8 text.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension == '.epub':
+        return iter_epub_chunks(file_path, chunk_size)
+    elif extension in ('.html', '.htm', '.xhtml'):
+        return iter_html_chunks(file_path, chunk_size)
+    else:
+        return iter_text_chunks(file_path, chunk_size)
+
+
+def iter_source_chapters(file_path, chunk_size=DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[str, Iterator[str]]]:
+    """
+    Same as iter_source_chunks, but split up into (chapter name, chunks) by chapter. Every document of an EPUB
+    spine is a chapter, other files are a single chapter named after the file.
+    """
+    if os.path.splitext(file_path)[1].lower() == '.epub':
+        yield from iter_epub_chapters(file_path, chunk_size)
+    else:
+        yield os.path.splitext(os.path.basename(file_path))[0], iter_source_chunks(file_path, chunk_size)
@@ -0,0 +1,62 @@
+import re
+
+from typing import Dict, Iterable, List
+
+
+# A sentence runs up to and including its closing punctuation (and closing quotes), or to the end of the line.
+_SENTENCE_PATTERN = re.compile(r'[^。！？!?\n]+[。！？!?]*[」』）)]*|[。！？!?]+')
+
+
+def split_sentences(document: str) -> List[str]:
+    """
+    Splits a document into sentences on Japanese/western sentence ending punctuation and line breaks.
+    """
+    return [sentence for sentence in (match.group().strip() for match in _SENTENCE_PATTERN.finditer(document))
+            if sentence]
+
+
+class SentenceIndex(object):
+    """
+    Sentences of the source text that words occur in, filled in while the text is tokenized (see
+    Tokenizer.tokenize) so example sentences never have to be searched for afterwards.
+
+    Only the first max_sentences_per_word sentences of every word are kept, and only sentences that are an
+    example for at least one word are stored, each once.
+    """
+    sentences: List[str]
+    _sentence_ids: Dict[str, List[int]]
+
+    def __init__(self, max_sentences_per_word=2, max_sentence_length=120):
+        """
+        :param max_sentence_length: longer sentences are not used as examples, they do not fit on a card.
+        """
+        self.max_sentences_per_word = max_sentences_per_word
+        self.max_sentence_length = max_sentence_length
+        self.sentences = []
+        self._sentence_ids = {}
+
+    def add(self, sentence: str, words: Iterable[str]):
+        """
+        Records sentence as an example for the words in it that do not have enough examples yet.
+        """
+        if len(sentence) > self.max_sentence_length:
+            return
+
+        sentence_id = None
+        for word in words:
+            sentence_ids = self._sentence_ids.setdefault(word, [])
+            if len(sentence_ids) >= self.max_sentences_per_word or sentence_id in sentence_ids:
+                continue
+            if sentence_id is None:
+                sentence_id = len(self.sentences)
+                self.sentences.append(sentence)
+            sentence_ids.append(sentence_id)
+
+    def examples(self, word: str) -> List[str]:
+        """
+        :return: up to max_sentences_per_word sentences the word occurs in, in the order they are in the text
+        """
+        return [self.sentences[sentence_id] for sentence_id in self._sentence_ids.get(word, [])]
+
+    def __contains__(self, word):
+        return bool(self._sentence_ids.get(word))
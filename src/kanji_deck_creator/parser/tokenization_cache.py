@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import unicodedata
+
+from typing import Dict, List, Optional
+
+from kanji_deck_creator.parser.tokenizer import Tokenizer
+
+
+log = logging.getLogger(__name__)
+log.setLevel(logging.INFO)
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS paragraphs (
+    key TEXT PRIMARY KEY,
+    tokens TEXT NOT NULL,
+    last_used INTEGER NOT NULL
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS paragraphs_by_last_used ON paragraphs (last_used);
+'''
+
+
+def split_paragraphs(document: str) -> List[str]:
+    """
+    Splits a document into the paragraphs that are tokenized (and cached) on their own, one per line.
+    Blank lines are left out.
+    """
+    return [paragraph for paragraph in (line.strip() for line in document.splitlines()) if paragraph]
+
+
+class CachingTokenizer(Tokenizer):
+    """
+    Remembers the tokens of every paragraph of the documents it tokenized in an SQLite database, so tokenizing a
+    document again after a small edit only runs the wrapped tokenizer on the paragraphs that changed.
+
+    Paragraphs are keyed by a hash of their normalized text and the wrapped tokenizer's config_key, so changing
+    the tokenizer (or its version) never returns stale tokens. Every document that is tokenized bumps a generation
+    counter, and when the cache is closed only the max_entries paragraphs used in the most recent generations are
+    kept.
+
+    Every paragraph is tokenized on its own, so compound nouns are never joined across line breaks.
+    """
+    def __init__(self, tokenizer: Tokenizer, database_path: str, max_entries=200000):
+        """
+        :param tokenizer: the tokenizer that does the work for paragraphs that are not cached yet
+        :param max_entries: how many paragraphs are kept, least recently used ones are evicted first.
+        """
+        self.tokenizer = tokenizer
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        # Concurrent builds can share the cache, the lock serializes the use of the connection.
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._connection.executescript(_SCHEMA)
+        self._generation = self._connection.execute(
+            'SELECT COALESCE(MAX(last_used), 0) FROM paragraphs').fetchone()[0]
+
+    def _key(self, paragraph: str) -> str:
+        sha = hashlib.sha1()
+        sha.update(self.tokenizer.config_key.encode('utf-8'))
+        sha.update(b'\0')
+        sha.update(unicodedata.normalize('NFKC', paragraph).encode('utf-8'))
+        return sha.hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[str]]:
+        found = {}
+        unique_keys = list(set(keys))
+        # Stay well below SQLite's limit on the number of query parameters.
+        for i in range(0, len(unique_keys), 500):
+            batch = unique_keys[i:i + 500]
+            rows = self._connection.execute(
+                'SELECT key, tokens FROM paragraphs WHERE key IN ({})'.format(', '.join('?' * len(batch))), batch)
+            found.update((key, json.loads(tokens)) for key, tokens in rows)
+        return found
+
+    def _tokenize(self, document) -> List[str]:
+        """
+        :type document: str
+        :return: list of vocabulary words in the document as str.
+        """
+        return [token for paragraph_tokens in self._tokenize_sentences(split_paragraphs(document))
+                for token in paragraph_tokens]
+
+    def _tokenize_sentences(self, paragraphs: List[str]) -> List[List[str]]:
+        """
+        Looks all the paragraphs (or sentences) up in one go and only tokenizes the ones that are not cached.
+        """
+        keys = [self._key(paragraph) for paragraph in paragraphs]
+        with self._lock:
+            cached = self._lookup(keys)
+
+        new_entries = {}
+        tokens = []
+        for key, paragraph in zip(keys, paragraphs):
+            paragraph_tokens = cached.get(key)
+            if paragraph_tokens is None:
+                paragraph_tokens = new_entries.get(key)
+            if paragraph_tokens is None:
+                self.misses += 1
+                paragraph_tokens = self.tokenizer.tokenize(paragraph)
+                new_entries[key] = paragraph_tokens
+            else:
+                self.hits += 1
+            tokens.append(paragraph_tokens)
+
+        with self._lock, self._connection:
+            self._generation += 1
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO paragraphs VALUES (?, ?, ?)',
+                ((key, json.dumps(paragraph_tokens, ensure_ascii=False), self._generation)
+                 for key, paragraph_tokens in new_entries.items()))
+            self._connection.executemany('UPDATE paragraphs SET last_used = ? WHERE key = ?',
+                                         ((self._generation, key) for key in cached))
+
+        log.info('Tokenized {} paragraphs, {} were cached'.format(len(paragraphs), len(paragraphs) - len(new_entries)))
+        return tokens
+
+    def evict(self, max_entries: Optional[int] = None):
+        """
+        Drops the least recently used paragraphs until at most max_entries are left.
+        """
+        max_entries = self.max_entries if max_entries is None else max_entries
+        with self._lock, self._connection:
+            self._connection.execute(
+                'DELETE FROM paragraphs WHERE key IN '
+                '(SELECT key FROM paragraphs ORDER BY last_used DESC LIMIT -1 OFFSET ?)', (max_entries,))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM paragraphs').fetchone()[0]
+
+    def close(self):
+        self.evict()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
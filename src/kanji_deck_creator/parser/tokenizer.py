@@ -1,6 +1,8 @@
 import jaconv
+import threading
+import unicodedata
 
-from typing import List, Iterator
+from typing import List, Iterator, Optional
 from abc import ABC, abstractmethod
 
 from janome.tokenizer import Token as JToken, Tokenizer as JTokenizer
@@ -8,12 +10,41 @@ from janome.analyzer import Analyzer as JAnalyzer
 from janome.charfilter import UnicodeNormalizeCharFilter, RegexReplaceCharFilter
 from janome.tokenfilter import POSStopFilter, LowerCaseFilter, TokenFilter
 
-from kanji_deck_creator.unicode.util import is_all_kana
+from kanji_deck_creator.parser.aho_corasick import AhoCorasickAutomaton
+from kanji_deck_creator.parser.sentence_index import SentenceIndex, split_sentences
+from kanji_deck_creator.parser.user_dictionary import user_dictionary_signature
+from kanji_deck_creator.unicode.util import is_all_kana, is_hiragana
 
 
 class Tokenizer(ABC):
-    def tokenize(self, document) -> List[str]:
-        return self._tokenize(document)
+    # Bump when a change to the tokenizer or its filters changes the tokens it produces, so cached tokens of the
+    # old version are not used anymore.
+    VERSION = 1
+
+    def tokenize(self, document, sentence_index: Optional[SentenceIndex] = None) -> List[str]:
+        """
+        :param sentence_index: if given, the document is tokenized sentence by sentence and the sentences are
+            recorded in the index as examples for the words in them.
+        """
+        if sentence_index is None:
+            return self._tokenize(document)
+
+        sentences = split_sentences(document)
+        tokens = []
+        for sentence, sentence_tokens in zip(sentences, self._tokenize_sentences(sentences)):
+            sentence_index.add(sentence, sentence_tokens)
+            tokens += sentence_tokens
+        return tokens
+
+    def _tokenize_sentences(self, sentences: List[str]) -> List[List[str]]:
+        return [self._tokenize(sentence) for sentence in sentences]
+
+    @property
+    def config_key(self) -> str:
+        """
+        Identifies the tokenizer and everything that changes its output, see tokenization_cache.CachingTokenizer
+        """
+        return '{}:{}'.format(type(self).__name__, self.VERSION)
 
     @abstractmethod
     def _tokenize(self, document) -> List[str]:
@@ -95,14 +126,30 @@ class InclusiveCompoundNounFilter(TokenFilter):
 
 
 class JanomeTokenizer(Tokenizer):
-
-    def _tokenize(self, document) -> List[str]:
+    """
+    Full morphological analysis with Janome. The analyzer is made once per thread and reused, setting up Janome's
+    dictionaries costs more than tokenizing a paragraph.
+    """
+    def __init__(self, user_dictionary_path: Optional[str] = None):
         """
-
-        :type document: strr
-        :return: list of vocabulary words in the document as str.
+        :param user_dictionary_path: a Janome user dictionary compiled by user_dictionary.compile_user_dictionary,
+            so WaniKani vocab Janome does not know comes out as one token instead of several.
         """
-        tokenizer = JTokenizer()
+        self.user_dictionary_path = user_dictionary_path
+        self._user_dictionary_signature = (user_dictionary_signature(user_dictionary_path)
+                                           if user_dictionary_path else None)
+        self._local = threading.local()
+
+    @property
+    def config_key(self) -> str:
+        return '{}:{}'.format(super().config_key, self._user_dictionary_signature)
+
+    def _analyzer(self) -> JAnalyzer:
+        analyzer = getattr(self._local, 'analyzer', None)
+        if analyzer is not None:
+            return analyzer
+
+        tokenizer = JTokenizer(udic=self.user_dictionary_path or '')
         char_filters = [
             UnicodeNormalizeCharFilter(),
             RegexReplaceCharFilter(
@@ -112,12 +159,79 @@ class JanomeTokenizer(Tokenizer):
         token_filters = [
             POSStopFilter(['記号', '助詞']),
             LowerCaseFilter(),
-            ConvertKatakanaWordsToHiragana(JTokenizer()),
+            # The user dictionary has no kana-only words, so it does not change what this filter sees.
+            ConvertKatakanaWordsToHiragana(tokenizer),
             InclusiveCompoundNounFilter()]
 
         analyzer = JAnalyzer(char_filters=char_filters, tokenizer=tokenizer, token_filters=token_filters)
+        self._local.analyzer = analyzer
+        return analyzer
 
-        return [token.base_form for token in analyzer.analyze(document)]
+    def _tokenize(self, document) -> List[str]:
+        """
+
+        :type document: strr
+        :return: list of vocabulary words in the document as str.
+        """
+        return [token.base_form for token in self._analyzer().analyze(document)]
+
+
+class WaniKaniTokenizer(Tokenizer):
+    """
+    Finds WaniKani vocabulary and kanji in the document with an Aho-Corasick automaton instead of doing a full
+    morphological analysis. Only words that WaniKani knows about (or single kanji) come out, which is all the deck
+    needs for the common case and is much faster on large documents.
+
+    Conjugated words (食べた) do not match their dictionary form (食べる) on their own, so when normalize_base_forms
+    is set, Janome is run on just the matched word plus the okurigana following it to recover the base form.
+    """
+    def __init__(self, kanji_data, policy=AhoCorasickAutomaton.LONGEST, normalize_base_forms=True,
+                 cache_path: Optional[str] = None):
+        """
+        :type kanji_data: kanji_deck_creator.data.kanji_data.KanjiData
+        :param policy: AhoCorasickAutomaton.LONGEST or AhoCorasickAutomaton.OVERLAPPING
+        :param cache_path: where the automaton is cached, defaults to next to the WaniKani index.
+        """
+        if cache_path is None:
+            from kanji_deck_creator.data.appdata import wanikani_automaton_cache_path
+            cache_path = wanikani_automaton_cache_path()
+
+        self._vocabulary = set(kanji_data.character_lookup['vocabulary'])
+        words = self._vocabulary | set(kanji_data.character_lookup['kanji'])
+        self._automaton = AhoCorasickAutomaton.load_or_build(words, cache_path=cache_path)
+        self._policy = policy
+        self._janome = JTokenizer() if normalize_base_forms else None
+        # The Janome tokenizer is shared by all the builds using this tokenizer.
+        self._janome_lock = threading.Lock()
+
+    @property
+    def config_key(self) -> str:
+        return '{}:{}:{}:{}'.format(super().config_key, self._policy, self._janome is not None,
+                                    self._automaton.signature)
+
+    def _base_form(self, document, start, end):
+        okurigana_end = end
+        while okurigana_end < len(document) and is_hiragana(document[okurigana_end]):
+            okurigana_end += 1
+
+        word = document[start:end]
+        if self._janome is None or okurigana_end == end:
+            return word
+
+        with self._janome_lock:
+            tokens = list(self._janome.tokenize(document[start:okurigana_end]))
+        if tokens and tokens[0].base_form in self._vocabulary:
+            return tokens[0].base_form
+        return word
+
+    def _tokenize(self, document) -> List[str]:
+        """
+        :type document: str
+        :return: list of vocabulary words in the document as str.
+        """
+        document = unicodedata.normalize('NFKC', document)
+        return [self._base_form(document, start, end)
+                for start, end in self._automaton.find(document, policy=self._policy)]
 
 
 DefaultTokenizer = JanomeTokenizer
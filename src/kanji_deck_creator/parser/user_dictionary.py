@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import jaconv
+import os
+import tempfile
+
+from typing import Dict, List, Optional
+
+from janome.dic import FILE_USER_ENTRIES_DATA, UserDictionary
+from janome.sysdic import connections
+from janome.tokenizer import Tokenizer as JTokenizer
+
+from kanji_deck_creator.unicode.util import is_all_kana
+
+
+# (part of speech, left/right context id of that part of speech in Janome's IPADIC system dictionary) for the
+# WaniKani parts of speech that can go into the dictionary, in order of precedence. Words that conjugate (verbs,
+# い adjectives) are left out, an entry would only ever match their dictionary form.
+_PARTS_OF_SPEECH = [
+    ({'suru verb'}, '名詞,サ変接続,*,*', 1283),
+    ({'na adjective', 'な adjective'}, '名詞,形容動詞語幹,*,*', 1287),
+    ({'noun', 'no adjective', 'の adjective', 'proper noun', 'pronoun', 'numeral'}, '名詞,一般,*,*', 1285),
+]
+# Low enough that the whole word beats the pieces Janome would split it into (a few thousand each, plus the
+# connection cost between them).
+_WORD_COST = 1000
+
+
+def user_dictionary_entries(data: Dict, janome: Optional[JTokenizer] = None) -> List[str]:
+    """
+    Makes IPADIC formatted user dictionary entries out of the WaniKani vocabulary that Janome splits into several
+    tokens, so they come out of Janome as one token with the reading of the subject.
+
+    :param data: the WaniKani index as loaded from wanikani_subjects_indexed.json
+    :param janome: used to find the words Janome already knows, a new one is made if not given
+    """
+    janome = janome or JTokenizer()
+    # Subject ids are str keys once the index went through json, and int keys while build_wanikani_index.py makes it.
+    subjects = {str(subject_id): subject for subject_id, subject in data['subjects'].items()}
+    entries = []
+    for characters, subject_id in sorted(data['character_lookup']['vocabulary'].items()):
+        if is_all_kana(characters) or ',' in characters:
+            continue
+        subject_data = subjects[str(subject_id)]['data']
+
+        subject_parts_of_speech = set(subject_data.get('parts_of_speech', []))
+        part_of_speech = next(((pos, context_id) for wanikani_pos, pos, context_id in _PARTS_OF_SPEECH
+                               if wanikani_pos & subject_parts_of_speech), None)
+        readings = [reading['reading'] for reading in subject_data.get('readings', []) if reading.get('primary')]
+        if part_of_speech is None or not readings:
+            continue
+        if len(list(janome.tokenize(characters))) == 1:
+            continue
+
+        pos, context_id = part_of_speech
+        reading = jaconv.hira2kata(readings[0])
+        entries.append(','.join([characters, str(context_id), str(context_id), str(_WORD_COST), pos, '*', '*',
+                                 characters, reading, reading]))
+    return entries
+
+
+def compile_user_dictionary(data: Dict, output_dir):
+    """
+    Compiles the user dictionary entries of the WaniKani index into a Janome user dictionary in output_dir, which
+    can be loaded with JanomeTokenizer(user_dictionary_path=output_dir) without compiling it again.
+
+    :return: the number of entries. Nothing is written if there are none, Janome cannot compile an empty dictionary.
+    """
+    entries = user_dictionary_entries(data)
+    if not entries:
+        return 0
+    csv_file, csv_path = tempfile.mkstemp(suffix='.csv')
+    try:
+        with os.fdopen(csv_file, 'wt', encoding='utf-8') as fp:
+            fp.write('\n'.join(entries))
+        UserDictionary(csv_path, 'utf8', 'ipadic', connections).save(output_dir)
+    finally:
+        os.remove(csv_path)
+    return len(entries)
+
+
+def user_dictionary_signature(dictionary_dir) -> str:
+    """
+    Changes when the dictionary is compiled with different entries, see Tokenizer.config_key
+    """
+    # The decompressed entries, the gzip header has the time the dictionary was compiled in it.
+    with gzip.open(os.path.join(dictionary_dir, FILE_USER_ENTRIES_DATA), 'rb') as fp:
+        return hashlib.sha1(fp.read()).hexdigest()
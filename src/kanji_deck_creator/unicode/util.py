@@ -1,3 +1,21 @@
+import re
+
+from typing import List
+
+
+_KANA = '\u3040-\u30ff'
+# Everything that is, or turns into, a kanji once the text is NFKC normalized like the tokenizers do: CJK radicals,
+# 々〆〇, enclosed and squared ideographs (㊤, ㍻), the CJK ideograph blocks and their compatibility forms.
+_KANJI = '\u2e80-\u2fdf\u3005-\u3007\u3200-\u33ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff' \
+         '\U0001f200-\U0001f2ff\U00020000-\U0003134f'
+
+# Classifying text with one precompiled pattern runs the loop over the characters in C, instead of calling
+# is_hiragana/is_katakana for every character.
+_ALL_KANA = re.compile('[{}]*'.format(_KANA))
+_NOT_KANA = re.compile('[^{}]'.format(_KANA))
+_HAS_KANJI = re.compile('[{}]'.format(_KANJI))
+# A line with something on it but no kanji, along with its line break.
+_LINE_WITHOUT_KANJI = re.compile(r'^(?=[^\n]*\S)[^\n{}]*$\n?'.format(_KANJI), re.MULTILINE)
 
 
 def is_hiragana(character):
@@ -9,4 +27,28 @@ def is_katakana(character):
 
 
 def is_all_kana(word):
-    return all(is_katakana(character) or is_hiragana(character) for character in word)
+    return _ALL_KANA.fullmatch(word) is not None
+
+
+def non_kana_characters(word) -> List[str]:
+    """
+    :return: the characters of the word that are not kana (the kanji, for Japanese words), in order
+    """
+    return _NOT_KANA.findall(word)
+
+
+def has_kanji(text) -> bool:
+    """
+    Errs on the side of True: characters that only become kanji once the text is normalized count as kanji.
+    """
+    return _HAS_KANJI.search(text) is not None
+
+
+def kanji_runs(document: str) -> List[str]:
+    """
+    Leaves out the lines of the document that have no kanji in them (kana-only dialogue, text in other languages),
+    which only ever have kana words or no Japanese words at all. Classifies the whole document in one pass.
+
+    :return: the runs of consecutive lines in between, blank lines included, as they are in the document
+    """
+    return [run for run in _LINE_WITHOUT_KANJI.split(document) if has_kanji(run)]
@@ -0,0 +1,28 @@
+from kanji_deck_creator.data.dependency_index import DependencyIndex, build_dependency_index
+
+
+def _subject(subject_id, *component_ids):
+    return {'id': subject_id, 'data': {'component_subject_ids': list(component_ids)}}
+
+
+# vocab 100 -> kanji 10, 11 -> radicals 1, 2 (radical 1 is reachable through both kanji)
+SUBJECTS = {
+    100: _subject(100, 10, 11),
+    10: _subject(10, 1),
+    11: _subject(11, 1, 2),
+    1: _subject(1),
+    2: _subject(2),
+}
+
+
+def test_build_dependency_index():
+    index = build_dependency_index(SUBJECTS)
+
+    assert index['complexity'] == {'100': 5, '10': 1, '11': 2, '1': 0, '2': 0}
+
+
+def test_dependency_index_complexity():
+    index = DependencyIndex.from_subjects(SUBJECTS)
+
+    assert index.complexity(100) == 5
+    assert index.complexity('11') == 2
@@ -0,0 +1,56 @@
+from unittest.mock import Mock
+
+from kanji_deck_creator.data.frequency_store import FrequencyStore, SourceDocument, file_document_id
+from kanji_deck_creator.deckbuilder.deck_builder import AnkiPackageBuilder
+
+
+def test_counts_accumulate_across_documents(tmp_path):
+    with FrequencyStore(str(tmp_path / 'frequency.db')) as store:
+        assert store.add_document('book 1', {'人形': 3, '人': 1})
+        assert store.add_document('book 2', {'人': 4, '形': 2})
+
+        assert store.counts(['人形', '人', '形', '山']) == {'人形': 3, '人': 5, '形': 2}
+        assert store.count('山') == 0
+        assert store.top_k(2) == [('人', 5), ('人形', 3)]
+        assert store.num_documents == 2
+        assert len(store) == 3
+
+
+def test_documents_are_only_added_once(tmp_path):
+    database_path = str(tmp_path / 'frequency.db')
+    with FrequencyStore(database_path) as store:
+        assert store.add_document('book 1', {'人形': 3})
+    with FrequencyStore(database_path) as store:
+        assert store.has_document('book 1')
+        assert not store.add_document('book 1', {'人形': 3})
+        assert store.count('人形') == 3
+
+
+def test_file_document_id_depends_on_the_content(tmp_path):
+    (tmp_path / 'a.txt').write_text('人形', encoding='utf-8')
+    (tmp_path / 'b.txt').write_text('人形', encoding='utf-8')
+    (tmp_path / 'c.txt').write_text('人', encoding='utf-8')
+
+    assert file_document_id(str(tmp_path / 'a.txt')) == file_document_id(str(tmp_path / 'b.txt'))
+    assert file_document_id(str(tmp_path / 'a.txt')) != file_document_id(str(tmp_path / 'c.txt'))
+
+
+def test_top_k_goes_by_the_corpus_frequency(tmp_path):
+    with FrequencyStore(str(tmp_path / 'frequency.db')) as store:
+        store.add_document('book 1', {'人': 10, '形': 1})
+        counts = {'人形': 3, '形': 3, '人': 1}
+
+        assert AnkiPackageBuilder._select_counts(counts, top_k=2) == [('人形', 3), ('形', 3)]
+        assert AnkiPackageBuilder._select_counts(counts, top_k=2, frequency_source=store) == [('形', 3), ('人', 1)]
+
+
+def test_source_documents_are_counted_once_whatever_they_are_built_with(tmp_path):
+    tokenizer = Mock()
+    tokenizer.tokenize.side_effect = lambda document, sentence_index=None: document.split()
+    with FrequencyStore(str(tmp_path / 'frequency.db')) as store:
+        builder = AnkiPackageBuilder(tokenizer=tokenizer, kanji_graph=Mock(), frequency_store=store)
+        builder._add_vocab([SourceDocument('book 1', ['人形 人形\n', '人 の']), SourceDocument('book 2', '人 形')])
+        builder._add_vocab([SourceDocument('book 1', ['人形 人形\n', '人 の'])])
+
+        assert store.num_documents == 2
+        assert store.counts(['人形', '人', '形', 'の']) == {'人形': 2, '人': 2, '形': 1}
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+import pytest
+import requests
+
+from kanji_deck_creator.data.kanji_data import KanjiData, JishoSubject, PlaceholderSubject
+from kanji_deck_creator.data.lookup_budget import BudgetedJishoClient, LookupBudget
+from kanji_deck_creator.deckbuilder.deck_builder import AnkiPackageBuilder
+from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+from kanji_deck_creator.loadtest.harness import WhitespaceTokenizer
+from kanji_deck_creator.loadtest.jisho_stub import JishoStubConfig, JishoStubServer, StubJishoClient
+
+
+DATA = {
+    'character_lookup': {
+        'vocabulary': {'人形': 3420},
+        'kanji': {'人': 444, '形': 589},
+        'radical': {}
+    },
+    'subjects': {
+        '3420': {'id': 3420, 'object': 'vocabulary',
+                 'data': {'characters': '人形', 'component_subject_ids': [444, 589], 'meanings': []}},
+        '444': {'id': 444, 'object': 'kanji', 'data': {'characters': '人', 'meanings': []}},
+        '589': {'id': 589, 'object': 'kanji', 'data': {'characters': '形', 'meanings': []}},
+    }
+}
+
+
+def test_slow_lookups_time_out():
+    JishoSubject.clear_cache()
+    with JishoStubServer(JishoStubConfig(latency=2, latency_jitter=0)) as server:
+        budget = LookupBudget(10, lookup_timeout=0.2)
+        kanji_data = KanjiData(DATA, jisho_client=StubJishoClient(server.base_url)).with_budget(budget)
+
+        start = time.monotonic()
+        subject = kanji_data.get_subject('形人', KanjiType.VOCABULARY)
+        elapsed = time.monotonic() - start
+
+    assert type(subject) is PlaceholderSubject
+    assert subject.characters == '形人'
+    assert elapsed < 1
+    assert budget.degraded == [('形人', KanjiType.VOCABULARY)]
+
+
+class _TricklingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _TricklingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Answers straight away, but only sends a byte of the body every 0.1s.
+        self.send_response(200)
+        self.send_header('Content-Length', '20')
+        self.end_headers()
+        for _ in range(20):
+            self.wfile.write(b' ')
+            self.wfile.flush()
+            time.sleep(0.1)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_slowly_sent_lookups_time_out():
+    server = _TricklingServer(('127.0.0.1', 0), _TricklingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = BudgetedJishoClient(LookupBudget(10, lookup_timeout=0.3),
+                                     base_url='http://127.0.0.1:{}/api/v1'.format(server.server_port))
+
+        start = time.monotonic()
+        with pytest.raises(requests.Timeout):
+            client.search('形人')
+        assert time.monotonic() - start < 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_spent_budget_only_uses_cached_responses():
+    JishoSubject.clear_cache()
+    with JishoStubServer(JishoStubConfig(latency=0, latency_jitter=0)) as server:
+        kanji_data = KanjiData(DATA, jisho_client=StubJishoClient(server.base_url))
+        kanji_data.get_subject('形人', KanjiType.VOCABULARY)
+
+        budget = LookupBudget(0, placeholders=False)
+        budgeted_data = kanji_data.with_budget(budget)
+
+        assert isinstance(budgeted_data.get_subject('形人', KanjiType.VOCABULARY), JishoSubject)
+        assert budgeted_data.get_subject('人人', KanjiType.VOCABULARY) is None
+        assert budget.degraded == [('人人', KanjiType.VOCABULARY)]
+        assert server.request_count == 1
+
+
+def test_build_with_spent_budget_has_placeholder_notes():
+    JishoSubject.clear_cache()
+    with JishoStubServer(JishoStubConfig(latency=0, latency_jitter=0)) as server:
+        kanji_data = KanjiData(DATA, jisho_client=StubJishoClient(server.base_url))
+        builder = AnkiPackageBuilder(WhitespaceTokenizer(), KanjiGraph(kanji_data))
+        budget = LookupBudget(0)
+
+        package = builder.build('人形 形人', 'budget test', mode='riffled', budget=budget)
+
+        assert server.request_count == 0
+    notes = {note.fields[0].split('<br>')[0]: note.fields[1] for note in package.decks[0].notes}
+    assert set(notes) == {'人形', '形人', '人', '形'}
+    assert 'not looked up yet' in notes['形人']
+    assert budget.degraded == [('形人', KanjiType.VOCABULARY)]
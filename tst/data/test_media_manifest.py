@@ -0,0 +1,39 @@
+import os
+
+from kanji_deck_creator.data.media_manifest import MediaManifest, build_media_manifest
+
+
+def _subject(image_name=None):
+    return {'data': {'character_images': [image_name] if image_name else []}}
+
+
+def _write(folder, name, content):
+    with open(os.path.join(folder, name), 'wb') as fp:
+        fp.write(content)
+
+
+def test_identical_images_share_a_path(tmpdir):
+    images_dir = str(tmpdir)
+    _write(images_dir, '1.svg', b'<svg>ground</svg>')
+    _write(images_dir, '2.svg', b'<svg>ground</svg>')
+    _write(images_dir, '3.svg', b'<svg>stick</svg>')
+    subjects = {1: _subject('1.svg'), 2: _subject('2.svg'), 3: _subject('3.svg'), 4: _subject()}
+
+    manifest = MediaManifest(build_media_manifest(subjects, images_dir), images_dir)
+
+    assert manifest.image_path(1) == os.path.join(images_dir, '1.svg')
+    assert manifest.image_path('2') == os.path.join(images_dir, '1.svg')
+    assert manifest.image_path(3) == os.path.join(images_dir, '3.svg')
+    assert manifest.image_path(4) == ''
+
+
+def test_validate_lists_missing_images(tmpdir):
+    images_dir = str(tmpdir)
+    _write(images_dir, '1.svg', b'<svg>ground</svg>')
+    subjects = {1: _subject('1.svg'), 2: _subject('2.png'), 3: _subject()}
+
+    # Without a manifest on disk it is built from the subjects, without hashing.
+    manifest = MediaManifest.load(subjects, None, images_dir)
+
+    assert manifest.image_path(2) == os.path.join(images_dir, '2.png')
+    assert manifest.validate([1, 2, 3]) == ['2']
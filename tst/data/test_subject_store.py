@@ -0,0 +1,45 @@
+from kanji_deck_creator.data.dependency_index import build_dependency_index
+from kanji_deck_creator.data.kanji_data import KanjiData, SharedKanjiData, WaniKaniSubject
+from kanji_deck_creator.data.subject_store import write_subject_store
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+
+
+DATA = {
+    'character_lookup': {
+        'vocabulary': {'人形': 3420, '大人': 3000},
+        'kanji': {'人': 444, '形': 589, '大': 100},
+        'radical': {'人': 9}
+    },
+    'subjects': {
+        3420: {'id': 3420, 'object': 'vocabulary',
+               'data': {'characters': '人形', 'component_subject_ids': [444, 589], 'meanings': [{'meaning': 'Doll'}]}},
+        3000: {'id': 3000, 'object': 'vocabulary', 'data': {'characters': '大人', 'component_subject_ids': [100, 444]}},
+        444: {'id': 444, 'object': 'kanji', 'data': {'characters': '人', 'component_subject_ids': [9]}},
+        589: {'id': 589, 'object': 'kanji', 'data': {'characters': '形'}},
+        100: {'id': 100, 'object': 'kanji', 'data': {'characters': '大'}},
+        9: {'id': 9, 'object': 'radical', 'data': {'characters': '人'}},
+    }
+}
+
+
+def test_shared_kanji_data_matches_the_index(tmp_path):
+    store_path = str(tmp_path / 'subjects.store')
+    write_subject_store(dict(DATA, dependency_index=build_dependency_index(DATA['subjects'])), store_path)
+
+    kanji_data = SharedKanjiData(store_path)
+    try:
+        subject = kanji_data.get_subject('人形', KanjiType.VOCABULARY)
+        assert isinstance(subject, WaniKaniSubject)
+        assert subject.meaning == 'Doll'
+        assert [i.characters for i in subject.components] == ['人', '形']
+
+        assert kanji_data.character_lookup['radical'].get('人') == 9
+        assert kanji_data.character_lookup['kanji'].get('山') is None
+        assert sorted(kanji_data.character_lookup['vocabulary']) == ['人形', '大人']
+        assert sorted(kanji_data.subjects, key=int) == ['9', '100', '444', '589', '3000', '3420']
+        assert '589' in kanji_data.subjects and '590' not in kanji_data.subjects and 'x' not in kanji_data.subjects
+        assert kanji_data.subjects[100] == DATA['subjects'][100]
+
+        assert kanji_data.dependency_index.complexity(3420) == KanjiData(DATA).dependency_index.complexity(3420) == 3
+    finally:
+        kanji_data.store.close()
@@ -0,0 +1,64 @@
+import json
+import os
+import sqlite3
+import zipfile
+
+import genanki
+
+from kanji_deck_creator.deckbuilder.apkg_writer import ApkgWriter
+from kanji_deck_creator.deckbuilder.deck_builder import KANJI_DECK_CREATOR_MODEL, NOTE_TAGS
+
+
+NOTES = [
+    ('<img src="8761.png" alt="8761.png" height="32"><br>radical', 'meaning: barb', 'guid1', '8761.png'),
+    ('人<br>kanji', 'meaning: person', 'guid2', ''),
+    ('人形<br>vocabulary', 'meaning: doll', 'guid3', ''),
+]
+
+
+def _read_apkg(apkg_path, extract_dir):
+    with zipfile.ZipFile(apkg_path) as apkg:
+        media = json.loads(apkg.read('media').decode('utf-8'))
+        collection_path = apkg.extract('collection.anki2', extract_dir)
+
+    connection = sqlite3.connect(collection_path)
+    try:
+        notes = connection.execute('SELECT guid, mid, tags, flds, sfld FROM notes ORDER BY id').fetchall()
+        cards = connection.execute('SELECT n.guid, c.did, c.ord, c.type, c.queue FROM cards c '
+                                   'JOIN notes n ON n.id = c.nid ORDER BY c.id').fetchall()
+        decks, models = connection.execute('SELECT decks, models FROM col').fetchone()
+    finally:
+        connection.close()
+
+    decks = {deck_id: deck['name'] for deck_id, deck in json.loads(decks).items()}
+    models = {model_id: (model['name'], len(model['tmpls'])) for model_id, model in json.loads(models).items()}
+    return notes, cards, decks, models, sorted(media.values())
+
+
+def test_native_apkg_matches_genanki_apkg(tmp_path):
+    tmp_path = str(tmp_path)
+    image_path = os.path.join(tmp_path, '8761.png')
+    with open(image_path, 'wb') as fp:
+        fp.write(b'not really a png')
+
+    deck = genanki.Deck(deck_id=1234, name='test deck')
+    package = genanki.Package(deck)
+    genanki_path = os.path.join(tmp_path, 'genanki.apkg')
+    native_path = os.path.join(tmp_path, 'native.apkg')
+
+    with ApkgWriter(native_path, 1234, 'test deck', KANJI_DECK_CREATOR_MODEL, batch_size=2) as writer:
+        for front, back, guid, media in NOTES:
+            media_path = os.path.join(tmp_path, media) if media else ''
+            writer.add_note(front, back, guid, NOTE_TAGS, media_path)
+
+            if media_path:
+                package.media_files.append(media_path)
+            deck.add_note(genanki.Note(model=KANJI_DECK_CREATOR_MODEL, fields=[front, back], tags=NOTE_TAGS,
+                                       guid=guid))
+    package.write_to_file(genanki_path)
+
+    genanki_contents = _read_apkg(genanki_path, os.path.join(tmp_path, 'genanki'))
+    native_contents = _read_apkg(native_path, os.path.join(tmp_path, 'native'))
+
+    assert native_contents == genanki_contents
+    assert [note[0] for note in native_contents[0]] == ['guid1', 'guid2', 'guid3']
@@ -1,8 +1,15 @@
+import zlib
+
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import Mock
 
-from kanji_deck_creator.data.kanji_data import KANJI_DATA
+from kanji_deck_creator.data.kanji_data import KANJI_DATA, JishoSubject, KanjiData, PlaceholderSubject
+from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
+from kanji_deck_creator.kanjigraph.sqlite_kanji_graph import SqliteKanjiGraph
 from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
-from kanji_deck_creator.deckbuilder.deck_builder import AnkiPackageBuilder
+from kanji_deck_creator.deckbuilder.deck_builder import AnkiPackageBuilder, write_packages
+from kanji_deck_creator.deckbuilder.known_items import KnownItems
+from kanji_deck_creator.parser.tokenizer import Tokenizer
 
 
 # noinspection PyProtectedMember
@@ -65,3 +72,217 @@ def test_subject_with_image_components():
                           'alt="idontexist.jpg" height="32">'
 
     assert expected_components in generated_back
+
+
+# noinspection PyProtectedMember
+def test_select_vocab_with_thresholds():
+    tokens = ['人形', 'ひと', '形', '人形', '人', '形', '形', '人形', '山']
+
+    assert AnkiPackageBuilder._select_vocab(tokens) == [('人形', 3), ('形', 3), ('人', 1), ('山', 1)]
+    assert AnkiPackageBuilder._select_vocab(tokens, min_count=2) == [('人形', 3), ('形', 3)]
+    assert AnkiPackageBuilder._select_vocab(tokens, top_k=3) == [('人形', 3), ('形', 3), ('人', 1)]
+    assert AnkiPackageBuilder._select_vocab(tokens, min_count=2, top_k=1) == [('人形', 3)]
+
+
+def _doll_kanji_data(jisho_client=None):
+    return KanjiData({
+        'character_lookup': {
+            'vocabulary': {'人形': 3420},
+            'kanji': {'人': 444, '形': 589},
+            'radical': {'人': 9, '开': 171, '彡': 38}
+        },
+        'subjects': {
+            '3420': {'id': 3420, 'object': 'vocabulary',
+                     'data': {'characters': '人形', 'component_subject_ids': [444, 589], 'meanings': []}},
+            '444': {'id': 444, 'object': 'kanji',
+                    'data': {'characters': '人', 'component_subject_ids': [9], 'meanings': []}},
+            '589': {'id': 589, 'object': 'kanji',
+                    'data': {'characters': '形', 'component_subject_ids': [171, 38], 'meanings': []}},
+            '9': {'id': 9, 'object': 'radical', 'data': {'characters': '人', 'meanings': []}},
+            '171': {'id': 171, 'object': 'radical', 'data': {'characters': '开', 'meanings': []}},
+            '38': {'id': 38, 'object': 'radical', 'data': {'characters': '彡', 'meanings': []}},
+        }
+    }, jisho_client=jisho_client)
+
+
+def test_parallel_rendering_matches_serial_rendering():
+    kanji_data = _doll_kanji_data()
+    tokenizer = Mock()
+    tokenizer.tokenize.return_value = ['人形', '人形']
+
+    def build(workers):
+        builder = AnkiPackageBuilder(tokenizer=tokenizer, kanji_graph=KanjiGraph(kanji_data))
+        deck = builder.build('人形', 'test_deck', workers=workers).decks[0]
+        return [(note.guid, note.fields) for note in deck.notes]
+
+    serial_notes = build(workers=None)
+
+    assert len(serial_notes) == 6
+    assert build(workers=3) == serial_notes
+
+
+def test_vocab_notes_show_example_sentences():
+    kanji_data = KanjiData({
+        'character_lookup': {'vocabulary': {'人形': 3420}, 'kanji': {}, 'radical': {}},
+        'subjects': {
+            '3420': {'id': 3420, 'object': 'vocabulary', 'data': {'characters': '人形', 'meanings': []}},
+        }
+    })
+    class WordTokenizer(Tokenizer):
+        def _tokenize(self, document):
+            return ['人形'] * document.count('人形')
+
+    builder = AnkiPackageBuilder(tokenizer=WordTokenizer(), kanji_graph=KanjiGraph(kanji_data))
+    deck = builder.build('人形を買った。山に行く。人形<です>', 'test_deck', example_sentences=1).decks[0]
+
+    back = deck.notes[0].fields[1]
+    assert 'examples: </b></font><b>人形</b>を買った。' in back
+    assert '&lt;です&gt;' not in back
+
+
+def test_concurrent_builds_match_serial_build():
+    kanji_data = _doll_kanji_data()
+    tokenizer = Mock()
+    tokenizer.tokenize.side_effect = lambda document, sentence_index=None: document.split()
+    builder = AnkiPackageBuilder(tokenizer=tokenizer, kanji_graph=KanjiGraph(kanji_data))
+
+    def build(document):
+        deck = builder.build(document, 'test_deck').decks[0]
+        return [(note.guid, note.fields) for note in deck.notes]
+
+    documents = ['人形', '人', '人形 人'] * 4
+    serial_notes = [build(document) for document in documents]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert list(executor.map(build, documents)) == serial_notes
+
+    # Builds leave the builder's own graph alone.
+    assert not builder.kanji_graph.nodes
+
+
+def test_deck_id_is_stable():
+    assert AnkiPackageBuilder.deck_id('test_deck') == zlib.crc32(b'test_deck') & 0x7fffffff
+
+
+def test_shards_keep_dependencies_in_the_same_or_an_earlier_shard(tmp_path):
+    builder = AnkiPackageBuilder(tokenizer=Mock(), kanji_graph=KanjiGraph(_doll_kanji_data()))
+    builder.tokenizer.tokenize.side_effect = lambda document, sentence_index=None: document.split()
+    chapters = [('one', 'ひと'), ('two', 'の 人形'), ('three', '人形')]
+
+    packages = builder.build_shards(chapters, 'test_deck', by_chapter=True)
+    shards = [(package.decks[0].name, [note.fields[0].split('<br>')[0] for note in package.decks[0].notes])
+              for package in packages]
+    # Chapters without notes get no shard, and the kanji and radicals of 人形 go in the shard of its chapter.
+    assert shards == [('test_deck::01 two', ['人', '人', '开', '彡', '形', '人形'])]
+
+    packages = builder.build_shards(chapters, 'test_deck', max_notes=4)
+    assert [len(package.decks[0].notes) for package in packages] == [4, 2]
+    assert packages[1].decks[0].name == 'test_deck::02'
+
+    output_paths = [str(tmp_path / 'test_deck.{}.apkg'.format(index)) for index in range(len(packages))]
+    write_packages(packages, output_paths, max_workers=2)
+    assert all((tmp_path / 'test_deck.{}.apkg'.format(index)).exists() for index in range(len(packages)))
+
+
+def test_shards_by_chapter_get_the_notes_of_their_chapter():
+    kanji_data = _doll_kanji_data()
+    kanji_data.data['character_lookup']['vocabulary'].update({'人': 4000, '形': 4001})
+    kanji_data.data['subjects'].update({
+        '4000': {'id': 4000, 'object': 'vocabulary',
+                 'data': {'characters': '人', 'component_subject_ids': [444], 'meanings': []}},
+        '4001': {'id': 4001, 'object': 'vocabulary',
+                 'data': {'characters': '形', 'component_subject_ids': [589], 'meanings': []}},
+    })
+    builder = AnkiPackageBuilder(tokenizer=Mock(), kanji_graph=KanjiGraph(kanji_data))
+    builder.tokenizer.tokenize.side_effect = lambda document, sentence_index=None: document.split()
+    # 形 comes first in the book, but 人 has fewer dependencies and comes first in the deck.
+    chapters = [('one', '形'), ('two', '人')]
+
+    for mode in ('riffled', 'layered', 'budgeted'):
+        packages = builder.build_shards(chapters, 'test_deck', mode=mode, by_chapter=True)
+        shards = [(package.decks[0].name, sorted(note.fields[0].split('<br>')[0]
+                                                 for note in package.decks[0].notes))
+                  for package in packages]
+        assert shards == [('test_deck::01 one', ['开', '彡', '形', '形']),
+                          ('test_deck::02 two', ['人', '人', '人'])], mode
+
+
+def test_jisho_notes_are_keyed_by_the_word_that_was_looked_up():
+    JishoSubject.clear_cache()
+    jisho_client = Mock()
+    jisho_client.search.return_value = {
+        'data': [{'japanese': [{'reading': 'うえ'}], 'senses': [{'english_definitions': ['above']}], 'slug': '上-1'}]}
+    subject = _doll_kanji_data(jisho_client).get_subject('上', KanjiType.VOCABULARY)
+
+    assert subject.characters == '上-1'
+    guid = AnkiPackageBuilder._render_note_fields(subject)[2]
+    # A placeholder for the word is filled in by the real note, and decks with the note mark the word as known.
+    assert guid == AnkiPackageBuilder._render_note_fields(PlaceholderSubject('上', KanjiType.VOCABULARY))[2]
+    assert ('上', KanjiType.VOCABULARY) in KnownItems(guids=[guid])
+
+
+def test_analyze_counts_notes_without_going_to_jisho():
+    jisho_client = Mock()
+    builder = AnkiPackageBuilder(tokenizer=Mock(), kanji_graph=KanjiGraph(_doll_kanji_data(jisho_client)))
+    builder.tokenizer.tokenize.side_effect = lambda document, sentence_index=None: document.split()
+
+    deck_stats = builder.analyze('人形 人形 山田 の')
+
+    jisho_client.search.assert_not_called()
+    assert deck_stats.num_tokens == 3 and deck_stats.num_words == 2
+    assert deck_stats.notes == {'radicals': 3, 'kanji': 2, 'vocab': 1}
+    # 山田 and its kanji are not in the subject data.
+    assert deck_stats.jisho_lookups == {'radicals': 0, 'kanji': 2, 'vocab': 1}
+    assert deck_stats.complexity_histogram('kanji') == {'0': 2, '1': 1, '2-3': 1}
+    assert deck_stats.to_dict()['complexity']['vocab']['max'] == 5
+
+
+def test_budgeted_order_spreads_prerequisites_over_days():
+    kanji_data = _doll_kanji_data()
+    kanji_data.character_lookup['vocabulary']['一'] = 5001
+    kanji_data.subjects['5001'] = {'id': 5001, 'object': 'vocabulary', 'data': {'characters': '一', 'meanings': []}}
+
+    def order(new_cards_per_day):
+        builder = AnkiPackageBuilder(tokenizer=Mock(), kanji_graph=KanjiGraph(kanji_data),
+                                     new_cards_per_day=new_cards_per_day)
+        builder.kanji_graph.add('人形', count=3)
+        builder.kanji_graph.add('一')
+        return [(node.value, node.type.value) for node in builder._get_ordered_nodes('budgeted')]
+
+    # Everything that leads to the more frequent 人形 comes first...
+    assert order(new_cards_per_day=100) == [
+        ('人', 'radical'), ('人', 'kanji'), ('开', 'radical'), ('彡', 'radical'), ('形', 'kanji'),
+        ('人形', 'vocabulary'), ('一', 'vocabulary')]
+    # ...unless that would fill a whole day with radicals and kanji.
+    assert order(new_cards_per_day=2) == [
+        ('人', 'radical'), ('一', 'vocabulary'), ('人', 'kanji'), ('开', 'radical'), ('彡', 'radical'),
+        ('形', 'kanji'), ('人形', 'vocabulary')]
+
+
+def test_lines_without_kanji_are_not_tokenized():
+    documents = []
+
+    class RecordingTokenizer(Tokenizer):
+        def _tokenize(self, document):
+            documents.append(document)
+            return document.split()
+
+    builder = AnkiPackageBuilder(tokenizer=RecordingTokenizer(), kanji_graph=KanjiGraph(_doll_kanji_data()))
+    stats = builder.analyze(['人形 人\nそう だね\n\n形\nhello\n', 'ええ'])
+
+    assert documents == ['人形 人\n', '\n形\n']
+    assert stats.num_tokens == 3
+
+
+def test_builds_through_a_graph_factory_start_from_an_empty_graph(tmp_path):
+    database_path = str(tmp_path / 'graph.sqlite3')
+    kanji_data = _doll_kanji_data()
+    builder = AnkiPackageBuilder(tokenizer=Mock(), kanji_graph=KanjiGraph(kanji_data),
+                                 graph_factory=lambda: SqliteKanjiGraph(kanji_data, database_path=database_path,
+                                                                        clear=True))
+    builder.tokenizer.tokenize.side_effect = lambda document, sentence_index=None: document.split()
+
+    for _ in range(2):
+        kanji_graph = builder.build_graph('人形 人形')
+        assert kanji_graph.nodes['人形', KanjiType.VOCABULARY].count == 2
+        kanji_graph.close()
+    assert len(builder.build('人形 人形', 'test_deck').decks[0].notes) == 6
@@ -0,0 +1,39 @@
+import os
+
+import genanki
+
+from kanji_deck_creator.deckbuilder.deck_builder import KANJI_DECK_CREATOR_MODEL
+from kanji_deck_creator.deckbuilder.known_items import KnownItems, note_guid
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+
+
+def test_known_items_from_list(tmp_path):
+    list_path = os.path.join(str(tmp_path), 'known.txt')
+    with open(list_path, 'wt', encoding='utf-8') as fp:
+        fp.write('# things I know\n人\n\n形 \n')
+
+    known_items = KnownItems.load(list_path)
+
+    assert ('人', KanjiType.KANJI) in known_items
+    assert ('形', KanjiType.PRIMITIVE) in known_items
+    assert ('人形', KanjiType.VOCABULARY) not in known_items
+
+
+def test_known_items_round_trip_through_apkg_and_state(tmp_path):
+    deck = genanki.Deck(deck_id=1234, name='known')
+    deck.add_note(genanki.Note(model=KANJI_DECK_CREATOR_MODEL, fields=['人', 'person'],
+                               guid=note_guid('人', KanjiType.KANJI)))
+    deck.add_note(genanki.Note(model=KANJI_DECK_CREATOR_MODEL, fields=['8761', 'radical'],
+                               guid=note_guid(8761, KanjiType.PRIMITIVE)))
+    apkg_path = os.path.join(str(tmp_path), 'known.apkg')
+    genanki.Package(deck).write_to_file(apkg_path)
+
+    known_items = KnownItems.load(apkg_path)
+    assert known_items.guids == {note.guid for note in deck.notes}
+    assert ('人', KanjiType.KANJI) in known_items
+    assert ('8761', KanjiType.PRIMITIVE) in known_items
+    assert ('人', KanjiType.VOCABULARY) not in known_items
+
+    state_path = os.path.join(str(tmp_path), 'known.json')
+    known_items.save(state_path)
+    assert KnownItems.load(state_path).guids == known_items.guids
@@ -0,0 +1,23 @@
+import os
+
+from kanji_deck_creator.deckbuilder.known_items import KnownItems
+from kanji_deck_creator.deckbuilder.text_export import TextDeckWriter
+
+
+def test_text_deck_writer(tmp_path):
+    image_path = os.path.join(str(tmp_path), '8761.png')
+    with open(image_path, 'wb') as fp:
+        fp.write(b'not really a png')
+
+    output_path = os.path.join(str(tmp_path), 'deck.tsv')
+    with TextDeckWriter(output_path) as writer:
+        writer.add_note('<img src="8761.png">', 'a\tradical', 'guid1', ['kanji_deck_creator'], image_path)
+        writer.add_note('人', 'person, "human"', 'guid2', ['kanji_deck_creator', 'kanji'])
+
+    with open(output_path, 'rt', encoding='utf-8') as fp:
+        lines = fp.read().splitlines()
+
+    assert lines[:4] == ['#separator:tab', '#html:true', '#guid column:3', '#tags column:4']
+    assert lines[5] == '人\t"person, ""human"""\tguid2\tkanji_deck_creator kanji'
+    assert os.listdir(writer.media_folder) == ['8761.png']
+    assert KnownItems.load(output_path).guids == {'guid1', 'guid2'}
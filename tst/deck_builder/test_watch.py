@@ -0,0 +1,53 @@
+from unittest.mock import Mock
+
+from kanji_deck_creator.data.kanji_data import KanjiData
+from kanji_deck_creator.deckbuilder.deck_builder import AnkiPackageBuilder
+from kanji_deck_creator.deckbuilder.watch import DeckWatcher
+from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+
+
+KANJI_DATA = KanjiData({
+    'character_lookup': {
+        'vocabulary': {'人形': 3420},
+        'kanji': {'人': 444, '形': 589},
+        'radical': {'人': 9, '开': 171, '彡': 38}
+    },
+    'subjects': {
+        '3420': {'id': 3420, 'object': 'vocabulary',
+                 'data': {'characters': '人形', 'component_subject_ids': [444, 589], 'meanings': []}},
+        '444': {'id': 444, 'object': 'kanji',
+                'data': {'characters': '人', 'component_subject_ids': [9], 'meanings': []}},
+        '589': {'id': 589, 'object': 'kanji',
+                'data': {'characters': '形', 'component_subject_ids': [171, 38], 'meanings': []}},
+        '9': {'id': 9, 'object': 'radical', 'data': {'characters': '人', 'meanings': []}},
+        '171': {'id': 171, 'object': 'radical', 'data': {'characters': '开', 'meanings': []}},
+        '38': {'id': 38, 'object': 'radical', 'data': {'characters': '彡', 'meanings': []}},
+    }
+})
+
+
+def test_watcher_only_processes_changed_paragraphs(tmp_path):
+    source_path = tmp_path / 'chapter.txt'
+    source_path.write_text('人形 人形\n\n人', encoding='utf-8')
+
+    tokenizer = Mock()
+    tokenizer.tokenize.side_effect = lambda paragraph: paragraph.split()
+    builder = AnkiPackageBuilder(tokenizer=tokenizer, kanji_graph=KanjiGraph(KANJI_DATA))
+    watcher = DeckWatcher(builder, [str(source_path)], write_deck=Mock())
+
+    assert watcher.update()
+    assert builder.kanji_graph.nodes['人形', KanjiType.VOCABULARY].count == 2
+    assert not watcher.update()
+
+    # The second paragraph is replaced, 人 disappears from the text.
+    source_path.write_text('人形 人形\n\n人形', encoding='utf-8')
+    watcher._sources[0].stat = None
+    assert watcher.update()
+
+    assert [call.args[0] for call in tokenizer.tokenize.call_args_list] == ['人形 人形', '人', '人形']
+    assert builder.kanji_graph.nodes['人形', KanjiType.VOCABULARY].count == 3
+    assert ('人', KanjiType.VOCABULARY) not in builder.kanji_graph.nodes
+
+    notes = builder.build_from_graph('test_deck').decks[0].notes
+    assert len(notes) == 6
@@ -0,0 +1,51 @@
+import io
+import json
+
+from xml.etree import ElementTree
+
+from kanji_deck_creator.data.kanji_data import KanjiData
+from kanji_deck_creator.kanjigraph.graph_export import GraphSelection, write_dot, write_graphml, write_jsonl
+from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+
+from test_kanji_graph import SIMPLE_DATA
+
+
+def _graph():
+    kanji_graph = KanjiGraph(KanjiData(SIMPLE_DATA))
+    kanji_graph.add('人形', count=2)
+    return kanji_graph
+
+
+def _export(writer, selection):
+    fp = io.StringIO()
+    writer(selection, fp)
+    return fp.getvalue()
+
+
+def test_jsonl_export():
+    lines = _export(write_jsonl, GraphSelection(_graph())).splitlines()
+    nodes = {node['id']: node for node in map(json.loads, lines)}
+
+    assert len(nodes) == 6
+    vocab = nodes['vocabulary:人形']
+    assert (vocab['characters'], vocab['type'], vocab['count'], vocab['complexity']) == ('人形', 'vocabulary', 2, 5)
+    assert sorted(vocab['dependencies']) == ['kanji:人', 'kanji:形']
+
+
+def test_export_filters():
+    kanji_only = GraphSelection(_graph(), kanji_types=[KanjiType.KANJI])
+    assert sorted(node.value for node in kanji_only.nodes()) == ['人', '形']
+    # Edges to nodes that are not exported are left out.
+    assert '->' not in _export(write_dot, kanji_only)
+
+    around = GraphSelection(_graph(), around=[('人形', KanjiType.VOCABULARY)], radius=1)
+    assert sorted(node.value for node in around.nodes()) == ['人', '人形', '形']
+
+
+def test_graphml_export_is_valid_xml():
+    root = ElementTree.fromstring(_export(write_graphml, GraphSelection(_graph())))
+    namespace = {'g': 'http://graphml.graphdrawing.org/xmlns'}
+
+    assert len(root.findall('g:graph/g:node', namespace)) == 6
+    assert len(root.findall('g:graph/g:edge', namespace)) == 5
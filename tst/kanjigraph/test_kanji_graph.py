@@ -188,3 +188,80 @@ def test_vocab_list_by_complexity():
     assert vocab_list == ['人', '人人', '形', '人形', '人形人人']
     assert kanji_list == ['人', '形']
     assert len(radical_list) == 3
+
+
+def test_add_with_count():
+    kg = KanjiGraph(KanjiData(SIMPLE_DATA))
+
+    kg.add('人形', count=3)
+    kg.add('人形')
+
+    assert kg.nodes['人形', KanjiType.VOCABULARY].count == 4
+    assert kg.nodes['人', KanjiType.KANJI].count == 1
+
+
+def test_known_items_are_not_added():
+    known_items = {('形', KanjiType.KANJI), ('人', KanjiType.PRIMITIVE)}
+    kg = KanjiGraph(KanjiData(SIMPLE_DATA), known_items=known_items)
+
+    kg.add('人形')
+
+    assert ('人形', KanjiType.VOCABULARY) in kg.nodes
+    assert ('人', KanjiType.KANJI) in kg.nodes
+    assert ('形', KanjiType.KANJI) not in kg.nodes
+    assert ('人', KanjiType.PRIMITIVE) not in kg.nodes
+    assert ('开', KanjiType.PRIMITIVE) not in kg.nodes
+    assert len(kg.nodes['人形', KanjiType.VOCABULARY].dependencies) == 1
+    assert not kg.nodes['人', KanjiType.KANJI].dependencies
+
+
+def test_subjects_are_resolved_once():
+    kanji_data = KanjiData(SIMPLE_DATA)
+    looked_up = []
+    get_subject = kanji_data.get_subject
+
+    def counting_get_subject(characters, kanji_type):
+        looked_up.append((characters, kanji_type))
+        return get_subject(characters, kanji_type)
+
+    kanji_data.get_subject = counting_get_subject
+    kg = KanjiGraph(kanji_data)
+    kg.add('人形')
+    kg.resolve_subjects(kg.nodes.values())
+
+    assert looked_up == [('人形', KanjiType.VOCABULARY)]
+    for node in kg.nodes.values():
+        assert node.resolved
+        assert node.subject.subject_type == node.type
+    assert kg.nodes['开', KanjiType.PRIMITIVE].subject.subject_id == 171
+
+
+def test_get_subjects_looks_up_each_query_once():
+    kanji_data = KanjiData(SIMPLE_DATA)
+    queries = [('人形', KanjiType.VOCABULARY), ('人', KanjiType.KANJI), ('人形', KanjiType.VOCABULARY)]
+
+    subjects = kanji_data.get_subjects(queries)
+
+    assert [subject.subject_id for subject in subjects] == [3420, 444, 3420]
+    assert subjects[0] is subjects[2]
+
+
+def test_remove_cascades_to_unused_dependencies():
+    kg = KanjiGraph(KanjiData(SIMPLE_DATA))
+
+    kg.add('人形', count=2)
+    kg.add('人')
+
+    assert kg.remove('人形') is not None
+    assert kg.nodes['人形', KanjiType.VOCABULARY].count == 1
+
+    assert kg.remove('人形') is None
+    assert ('人形', KanjiType.VOCABULARY) not in kg.nodes
+    # 形 was only needed by 人形, 人 is still needed by the vocab 人
+    assert ('形', KanjiType.KANJI) not in kg.nodes
+    assert ('开', KanjiType.PRIMITIVE) not in kg.nodes
+    assert kg.nodes['人', KanjiType.KANJI].count == 1
+    assert kg.nodes['人', KanjiType.KANJI].contained_in == {kg.nodes['人', KanjiType.VOCABULARY]}
+    assert [i.value for i in kg.ordered_by_complexity()] == ['人', '人', '人']
+
+    assert kg.remove('形') is None
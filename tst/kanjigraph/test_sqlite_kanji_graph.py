@@ -0,0 +1,109 @@
+import os
+
+from unittest.mock import Mock
+
+from kanji_deck_creator.kanjigraph.kanji_graph import KanjiGraph
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+from kanji_deck_creator.kanjigraph.sqlite_kanji_graph import SqliteKanjiGraph
+from kanji_deck_creator.data.kanji_data import JishoSubject, KanjiData
+
+from test_kanji_graph import SIMPLE_DATA
+
+
+def _build(kg):
+    for word in ["人形", "人", "形", "人形"]:
+        kg.add(word)
+    kg.add_compound_word(['人形', '人人'])
+    return kg
+
+
+def test_sqlite_graph_matches_in_memory_graph():
+    expected = _build(KanjiGraph(KanjiData(SIMPLE_DATA)))
+
+    # A tiny cache makes sure nodes are evicted to disk and loaded back while building.
+    with SqliteKanjiGraph(KanjiData(SIMPLE_DATA), cache_size=2, batch_size=1) as kg:
+        _build(kg)
+
+        assert len(kg.nodes) == len(expected.nodes)
+        assert len(kg.vocabs) == len(expected.vocabs)
+        assert len(kg.kanji) == len(expected.kanji)
+        assert len(kg.primitives) == len(expected.primitives)
+
+        for key, expected_node in expected.nodes.items():
+            node = kg.nodes[key]
+            assert node.count == expected_node.count
+            assert node.dependencies == expected_node.dependencies
+            assert set(node.contained_in) == expected_node.contained_in
+
+        vocab_list = [i.value for i in kg.ordered_by_complexity(KanjiType.VOCABULARY)]
+        assert vocab_list == ['人', '人人', '形', '人形', '人形人人']
+
+        complexity = [(i.value, i.type.value, i.total_num_dependencies) for i in kg.ordered_by_complexity()]
+        expected_complexity = [(i.value, i.type.value, i.total_num_dependencies)
+                               for i in expected.sort_by_complexity(expected.nodes.values())]
+        assert sorted(complexity) == sorted(expected_complexity)
+        assert [i[2] for i in complexity] == sorted(i[2] for i in complexity)
+
+
+def test_sqlite_graph_persists(tmp_path):
+    database_path = os.path.join(str(tmp_path), 'graph.sqlite3')
+    with SqliteKanjiGraph(KanjiData(SIMPLE_DATA), database_path=database_path) as kg:
+        kg.add('人形', count=2)
+
+    with SqliteKanjiGraph(KanjiData(SIMPLE_DATA), database_path=database_path) as kg:
+        kg.add('人形')
+
+        node = kg.nodes['人形', KanjiType.VOCABULARY]
+        assert node.count == 3
+        assert node.resolved and node.subject.subject_id == 3420
+        assert {i.value for i in node.dependencies} == {'人', '形'}
+
+
+def test_sqlite_graph_keeps_totals_in_the_database(tmp_path):
+    database_path = os.path.join(str(tmp_path), 'graph.sqlite3')
+    with SqliteKanjiGraph(KanjiData(SIMPLE_DATA), database_path=database_path, batch_size=1) as kg:
+        _build(kg)
+        expected_complexity = {(i.value, i.type): i.total_num_dependencies for i in kg.ordered_by_complexity()}
+
+    with SqliteKanjiGraph(KanjiData(SIMPLE_DATA), database_path=database_path) as kg:
+        for key, total in expected_complexity.items():
+            assert kg.nodes[key].total_num_dependencies == total
+
+
+def test_sqlite_graph_resolves_jisho_subjects_again_from_the_cached_responses(tmp_path):
+    JishoSubject.clear_cache()
+    jisho_client = Mock()
+    jisho_client.search.side_effect = lambda query: {
+        'data': [{'japanese': [{'reading': 'よみ'}], 'senses': [{'english_definitions': ['def ' + query]}],
+                  'slug': query}]}
+    database_path = os.path.join(str(tmp_path), 'graph.sqlite3')
+    with SqliteKanjiGraph(KanjiData(SIMPLE_DATA, jisho_client=jisho_client), database_path=database_path) as kg:
+        kg.add('形人')
+
+    with SqliteKanjiGraph(KanjiData(SIMPLE_DATA, jisho_client=jisho_client), database_path=database_path) as kg:
+        node = kg.nodes['形人', KanjiType.VOCABULARY]
+        kg.resolve_subjects([node])
+
+        assert isinstance(node.subject, JishoSubject) and node.subject.characters == '形人'
+        assert jisho_client.search.call_count == 1
+
+
+def test_sqlite_graph_remove_matches_in_memory_graph():
+    expected = _build(KanjiGraph(KanjiData(SIMPLE_DATA)))
+    with SqliteKanjiGraph(KanjiData(SIMPLE_DATA), cache_size=2, batch_size=1) as kg:
+        _build(kg)
+
+        for word in ['人形人人', '人形', '人形']:
+            assert (kg.remove(word) is None) == (expected.remove(word) is None)
+
+        assert set(kg.nodes) == set(expected.nodes)
+        assert len(kg.vocabs) == len(expected.vocabs)
+        assert len(kg.kanji) == len(expected.kanji)
+        assert len(kg.primitives) == len(expected.primitives)
+        for key, expected_node in expected.nodes.items():
+            node = kg.nodes[key]
+            assert node.count == expected_node.count
+            assert node.dependencies == expected_node.dependencies
+            assert set(node.contained_in) == expected_node.contained_in
+        assert [i.value for i in kg.ordered_by_complexity()] == \
+            [i.value for i in expected.sort_by_complexity(expected.nodes.values())]
@@ -0,0 +1,59 @@
+from kanji_deck_creator.data.kanji_data import KanjiData, JishoSubject
+from kanji_deck_creator.kanjigraph.kanji_type import KanjiType
+from kanji_deck_creator.loadtest.harness import make_corpus, percentile, run_load_test
+from kanji_deck_creator.loadtest.jisho_stub import JishoStubConfig, JishoStubServer, StubJishoClient
+
+
+DATA = {
+    'character_lookup': {
+        'vocabulary': {'人形': 3420},
+        'kanji': {'人': 444, '形': 589},
+        'radical': {}
+    },
+    'subjects': {
+        '3420': {'id': 3420, 'object': 'vocabulary',
+                 'data': {'characters': '人形', 'component_subject_ids': [444, 589], 'meanings': []}},
+        '444': {'id': 444, 'object': 'kanji', 'data': {'characters': '人', 'meanings': []}},
+        '589': {'id': 589, 'object': 'kanji', 'data': {'characters': '形', 'meanings': []}},
+    }
+}
+
+
+def test_lookups_go_to_the_stub_server():
+    JishoSubject.clear_cache()
+    with JishoStubServer(JishoStubConfig(latency=0, latency_jitter=0)) as server:
+        kanji_data = KanjiData(DATA, jisho_client=StubJishoClient(server.base_url))
+        subject = kanji_data.get_subject('形人', KanjiType.VOCABULARY)
+
+    assert isinstance(subject, JishoSubject)
+    assert subject.characters == '形人'
+    assert subject.meaning == 'stub definition of 形人'
+    assert server.request_count == 1
+
+
+def test_failed_lookups_leave_the_subject_out():
+    JishoSubject.clear_cache()
+    with JishoStubServer(JishoStubConfig(latency=0, latency_jitter=0, error_rate=1)) as server:
+        kanji_data = KanjiData(DATA, jisho_client=StubJishoClient(server.base_url))
+        assert kanji_data.get_subject('人人', KanjiType.VOCABULARY) is None
+
+
+def test_run_load_test():
+    corpus = make_corpus(KanjiData(DATA), 20, miss_rate=0.5)
+    assert len(corpus.split()) == 20
+
+    result = run_load_test(KanjiData(DATA), JishoStubConfig(latency=0, latency_jitter=0), num_words=20,
+                           miss_rate=0.5)
+
+    # Every distinct missing word is looked up once, the 3 other combinations of the 2 kanji are all missing.
+    assert result['lookups'] == result['server_requests'] == 3
+    assert result['notes'] == 6
+    assert result['lookup_errors'] == 0
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([], 0.5) == 0
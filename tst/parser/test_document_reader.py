@@ -0,0 +1,85 @@
+import zipfile
+
+from kanji_deck_creator.parser.document_reader import iter_epub_chunks, iter_html_chunks, iter_source_chapters, \
+    iter_source_chunks
+
+
+CHAPTER = '''<?xml version="1.0" encoding="utf-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head><title>第一章</title><style>p {{ margin: 0 }}</style></head>
+<body>
+<p><ruby>北風<rp>(</rp><rt>きたかぜ</rt><rp>)</rp></ruby>と<ruby>太陽<rt>たいよう</rt></ruby>。</p>
+<p>{}&amp;人形<br/>大人</p>
+</body>
+</html>
+'''
+
+CONTAINER = '''<?xml version="1.0"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles>
+    <rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+  </rootfiles>
+</container>
+'''
+
+PACKAGE = '''<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0">
+  <manifest>
+    <item id="c1" href="text/chapter1.xhtml" media-type="application/xhtml+xml"/>
+    <item id="c2" href="text/chapter2.xhtml" media-type="application/xhtml+xml"/>
+    <item id="css" href="style.css" media-type="text/css"/>
+  </manifest>
+  <spine>
+    <itemref idref="c2"/>
+    <itemref idref="c1"/>
+  </spine>
+</package>
+'''
+
+
+def test_html_ruby_is_left_out(tmp_path):
+    html_path = tmp_path / 'chapter.html'
+    html_path.write_text(CHAPTER.format('一'), encoding='utf-8')
+
+    assert list(iter_html_chunks(str(html_path))) == ['北風と太陽。\n一&人形\n大人']
+    assert list(iter_html_chunks(str(html_path), chunk_size=1)) == ['北風と太陽。', '一&人形', '大人']
+
+
+def test_epub_chapters_are_read_in_spine_order(tmp_path):
+    epub_path = tmp_path / 'book.epub'
+    with zipfile.ZipFile(str(epub_path), 'w') as epub:
+        epub.writestr('mimetype', 'application/epub+zip')
+        epub.writestr('META-INF/container.xml', CONTAINER)
+        epub.writestr('OEBPS/content.opf', PACKAGE)
+        epub.writestr('OEBPS/text/chapter1.xhtml', CHAPTER.format('一'))
+        epub.writestr('OEBPS/text/chapter2.xhtml', CHAPTER.format('二'))
+        epub.writestr('OEBPS/style.css', 'p { margin: 0 }')
+
+    assert list(iter_epub_chunks(str(epub_path))) == ['北風と太陽。\n二&人形\n大人', '北風と太陽。\n一&人形\n大人']
+    assert list(iter_source_chunks(str(epub_path))) == list(iter_epub_chunks(str(epub_path)))
+    assert [(name, list(chunks)) for name, chunks in iter_source_chapters(str(epub_path))] == [
+        ('chapter2', ['北風と太陽。\n二&人形\n大人']), ('chapter1', ['北風と太陽。\n一&人形\n大人'])]
+
+
+def test_ruby_text_without_end_tags_is_left_out(tmp_path):
+    html_path = tmp_path / 'chapter.html'
+    html_path.write_text('<p><ruby>北<rt>きた</ruby>風が吹く。</p><p>人形が好きだ。</p>'
+                         '<p><ruby>太陽<rp>(<rt>たいよう<rp>)</ruby>と<ruby>月<rt>つき</p><p>大人</p>',
+                         encoding='utf-8')
+
+    assert list(iter_html_chunks(str(html_path), chunk_size=1)) == ['北風が吹く。', '人形が好きだ。', '太陽と月', '大人']
+
+
+def test_html_is_decoded_with_its_declared_encoding(tmp_path):
+    xml_path = tmp_path / 'declared.xhtml'
+    xml_path.write_bytes('<?xml version="1.0" encoding="Shift_JIS"?><html><body><p>人形</p></body></html>'
+                         .encode('shift_jis'))
+    meta_path = tmp_path / 'meta.html'
+    meta_path.write_bytes('<html><head><meta charset="euc-jp"></head><body><p>大人</p></body></html>'
+                          .encode('euc_jp'))
+    bom_path = tmp_path / 'bom.html'
+    bom_path.write_bytes('<p>人形</p>'.encode('utf-16'))
+
+    assert list(iter_html_chunks(str(xml_path))) == ['人形']
+    assert list(iter_html_chunks(str(meta_path))) == ['大人']
+    assert list(iter_html_chunks(str(bom_path))) == ['人形']
@@ -1,4 +1,11 @@
-from kanji_deck_creator.parser.tokenizer import DefaultTokenizer
+import os
+
+from kanji_deck_creator.data.kanji_data import KanjiData
+from kanji_deck_creator.parser.aho_corasick import AhoCorasickAutomaton
+from kanji_deck_creator.parser.sentence_index import SentenceIndex, split_sentences
+from kanji_deck_creator.parser.tokenization_cache import CachingTokenizer
+from kanji_deck_creator.parser.tokenizer import DefaultTokenizer, JanomeTokenizer, Tokenizer, WaniKaniTokenizer
+from kanji_deck_creator.parser.user_dictionary import compile_user_dictionary, user_dictionary_entries
 
 
 DOCUMENT = '''
@@ -19,3 +26,110 @@ def test_default_tokenizer():
                       'いる', 'これから', 'ぼく', '読む', 'ない', 'いける', 'ない', 'の', 'ニューヨーク']
 
     assert expected_words == actual_words
+
+
+def test_user_dictionary_keeps_wanikani_vocab_in_one_token(tmp_path):
+    data = {
+        'character_lookup': {'vocabulary': {'鉄道会社': 1, '人形': 2, '食べる': 3}},
+        'subjects': {
+            '1': {'data': {'parts_of_speech': ['noun'],
+                           'readings': [{'reading': 'てつどうがいしゃ', 'primary': True}]}},
+            '2': {'data': {'parts_of_speech': ['noun'],
+                           'readings': [{'reading': 'にんぎょう', 'primary': True}]}},
+            '3': {'data': {'parts_of_speech': ['ichidan verb'],
+                           'readings': [{'reading': 'たべる', 'primary': True}]}},
+        }
+    }
+    # Janome already knows 人形, and verbs would only match their dictionary form.
+    assert user_dictionary_entries(data) == [
+        '鉄道会社,1285,1285,1000,名詞,一般,*,*,*,*,鉄道会社,テツドウガイシャ,テツドウガイシャ']
+
+    dictionary_path = str(tmp_path / 'user_dictionary')
+    assert compile_user_dictionary(data, dictionary_path) == 1
+
+    assert JanomeTokenizer().tokenize('鉄道会社で働く') == ['鉄道', '会社', '働く', '鉄道会社']
+    tokenizer = JanomeTokenizer(user_dictionary_path=dictionary_path)
+    assert tokenizer.tokenize('鉄道会社で働く') == ['鉄道会社', '働く']
+    assert tokenizer.config_key != JanomeTokenizer().config_key
+
+
+WANIKANI_DATA = KanjiData({
+    'character_lookup': {
+        'vocabulary': {'人形': 1, '大人': 2, '食べる': 3, '人': 4},
+        'kanji': {'人': 5, '形': 6, '大': 7, '食': 8},
+        'radical': {}
+    },
+    'subjects': {}
+})
+
+
+def test_aho_corasick_policies():
+    automaton = AhoCorasickAutomaton(['大人', '人形', '人', '形'])
+
+    assert automaton.find('大人形だ') == [(0, 2), (2, 3)]
+    assert automaton.find('大人形だ', policy=AhoCorasickAutomaton.OVERLAPPING) == [(0, 2), (1, 2), (1, 3), (2, 3)]
+
+
+def test_wanikani_tokenizer(tmp_path):
+    cache_path = os.path.join(str(tmp_path), 'automaton.pickle')
+    tokenizer = WaniKaniTokenizer(WANIKANI_DATA, cache_path=cache_path)
+
+    assert tokenizer.tokenize('大人が人形を食べた。') == ['大人', '人形', '食べる']
+    assert os.path.isfile(cache_path)
+
+    cached_tokenizer = WaniKaniTokenizer(WANIKANI_DATA, cache_path=cache_path, normalize_base_forms=False)
+    assert cached_tokenizer.tokenize('大人が人形を食べた。') == ['大人', '人形', '食']
+
+
+class _CountingTokenizer(Tokenizer):
+    def __init__(self):
+        self.documents = []
+
+    def _tokenize(self, document):
+        self.documents.append(document)
+        return document.split()
+
+
+def test_caching_tokenizer_only_tokenizes_changed_paragraphs(tmp_path):
+    tokenizer = _CountingTokenizer()
+    database_path = str(tmp_path / 'tokens.sqlite')
+
+    with CachingTokenizer(tokenizer, database_path) as caching_tokenizer:
+        assert caching_tokenizer.tokenize('大人 人形\n\n食べる') == ['大人', '人形', '食べる']
+
+    with CachingTokenizer(tokenizer, database_path) as caching_tokenizer:
+        assert caching_tokenizer.tokenize('大人 人形\n\n食べる 人') == ['大人', '人形', '食べる', '人']
+        assert caching_tokenizer.hits == 1
+
+    assert tokenizer.documents == ['大人 人形', '食べる', '食べる 人']
+
+
+def test_caching_tokenizer_evicts_least_recently_used(tmp_path):
+    tokenizer = _CountingTokenizer()
+
+    with CachingTokenizer(tokenizer, str(tmp_path / 'tokens.sqlite'), max_entries=2) as caching_tokenizer:
+        caching_tokenizer.tokenize('大人')
+        caching_tokenizer.tokenize('人形')
+        caching_tokenizer.tokenize('食べる')
+        caching_tokenizer.evict()
+
+        assert len(caching_tokenizer) == 2
+        caching_tokenizer.tokenize('食べる\n人形\n大人')
+        # Only the least recently used paragraph was evicted and has to be tokenized again.
+        assert tokenizer.documents == ['大人', '人形', '食べる', '大人']
+
+
+def test_sentence_index_is_filled_while_tokenizing():
+    document = '人形を買った。大人は人形が好きだ！\n人形です'
+    assert split_sentences(document) == ['人形を買った。', '大人は人形が好きだ！', '人形です']
+
+    tokenizer = _CountingTokenizer()
+    sentence_index = SentenceIndex(max_sentences_per_word=2)
+    tokens = tokenizer.tokenize('人形 を 買った。大人 は 人形 人形！\n人形 です', sentence_index=sentence_index)
+
+    assert tokens == ['人形', 'を', '買った。', '大人', 'は', '人形', '人形！', '人形', 'です']
+    assert sentence_index.examples('人形') == ['人形 を 買った。', '大人 は 人形 人形！']
+    assert sentence_index.examples('大人') == ['大人 は 人形 人形！']
+    assert sentence_index.examples('山') == []
+    # Every sentence is stored once, however many words it is an example for.
+    assert len(sentence_index.sentences) == 3